@@ -4,11 +4,16 @@ import json
 import time
 import logging
 import signal
+import shutil
+import tarfile
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from docker import from_env, errors
 import requests
 
-__version__ = "1.3.0"
+__version__ = "1.4.0"
 
 # Configure logging
 logging.basicConfig(
@@ -24,6 +29,18 @@ logger = logging.getLogger(__name__)
 # Global variable to track current operation
 current_operation = None
 
+# Sidecar index of tar members written next to every volume archive
+INDEX_SUFFIX = ".index.jsonl"
+
+# Multi-part archives: <archive>.part001, .part002, ... listed in <archive>.parts.json
+PARTS_MANIFEST_SUFFIX = ".parts.json"
+# Written to the staging directory before a new archive is moved into place
+COMMIT_JOURNAL = ".commit.json"
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Base URL docker-py gives a client connected through a unix socket
+UNIX_SOCKET_BASE_URL = "http+docker://localhost"
+
 def signal_handler(signum, frame):
     global current_operation
     logger.warning(f"Received signal {signum} (KeyboardInterrupt)")
@@ -87,7 +104,375 @@ def stop_container_with_retry(container, webhook_url, max_retries=3, stop_timeou
         send_error(webhook_url, error_msg)
         return False
 
-def backup_volume(volume_name: str, backup_path: str, webhook_url: str):
+class TarIndexWriter:
+    """Writes a TAR stream to a file and indexes its members on the fly.
+
+    The stream is teed into a pipe read by tarfile in streaming mode, so member
+    offsets are collected while the archive is written, without a second pass.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.entries = []
+        read_fd, write_fd = os.pipe()
+        self._pipe = os.fdopen(write_fd, "wb")
+        self._thread = threading.Thread(target=self._index_members, args=(read_fd,), daemon=True)
+        self._thread.start()
+
+    def write(self, chunk):
+        self.out.write(chunk)
+        self._pipe.write(chunk)
+
+    def close(self):
+        self._pipe.close()
+        self._thread.join()
+        return self.entries
+
+    def _index_members(self, read_fd):
+        with os.fdopen(read_fd, "rb") as pipe:
+            try:
+                with tarfile.open(fileobj=pipe, mode="r|") as tar:
+                    for member in tar:
+                        self.entries.append({
+                            "path": normalize_member_path(member.name),
+                            "offset": member.offset,
+                            "offset_data": member.offset_data,
+                            "size": member.size,
+                            "mtime": member.mtime,
+                            "type": member.type.decode("ascii", errors="replace"),
+                        })
+            except tarfile.TarError as e:
+                logger.warning(f"Failed to index TAR stream: {e}")
+            # Drain the rest so the writer never blocks on a full pipe
+            while pipe.read(65536):
+                pass
+
+def normalize_member_path(path: str) -> str:
+    path = path.strip("/")
+    while path.startswith("./"):
+        path = path[2:]
+    return "" if path == "." else path
+
+def write_archive_index(backup_path: str, entries):
+    index_path = backup_path + INDEX_SUFFIX
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, index_path)
+    logger.info(f"Archive index written: {index_path} ({len(entries)} members)")
+
+def load_archive_index(backup_path: str):
+    index_path = backup_path + INDEX_SUFFIX
+    if not os.path.isfile(index_path):
+        return None
+    with open(index_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def select_index_entries(entries, member: str):
+    wanted = normalize_member_path(member)
+    if not wanted:
+        return [e for e in entries if e["path"]]
+    return [e for e in entries if e["path"] == wanted or e["path"].startswith(wanted + "/")]
+
+def parse_size(value):
+    if value is None or isinstance(value, int):
+        return value
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    value = str(value).strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+def part_path(backup_path: str, number: int) -> str:
+    return f"{backup_path}.part{number:03d}"
+
+def load_parts_manifest(backup_path: str):
+    manifest_path = backup_path + PARTS_MANIFEST_SUFFIX
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def archive_exists(backup_path: str) -> bool:
+    return os.path.isfile(backup_path) or load_parts_manifest(backup_path) is not None
+
+def archive_size(backup_path: str) -> int:
+    manifest = load_parts_manifest(backup_path)
+    if manifest is not None:
+        return manifest["total_size"]
+    return os.path.getsize(backup_path)
+
+def archive_files(backup_path: str):
+    # Files of an archive in either layout with its member index, the parts manifest last
+    manifest = load_parts_manifest(backup_path)
+    paths = []
+    if manifest is not None:
+        for part in manifest["parts"]:
+            part_file = os.path.join(os.path.dirname(backup_path), part["name"])
+            paths.extend([part_file, part_file + ".sha256"])
+    paths.extend([backup_path + INDEX_SUFFIX, backup_path, backup_path + PARTS_MANIFEST_SUFFIX])
+    return [path for path in paths if os.path.isfile(path)]
+
+def staging_archive_path(backup_path: str) -> str:
+    # New archives are written to a hidden sibling directory under the same name, so part
+    # names in the manifest stay valid and the final move is a rename on the same filesystem
+    directory, name = os.path.split(backup_path)
+    return os.path.join(directory, f".{name}.new", name)
+
+def commit_journal_path(staging_path: str) -> str:
+    return os.path.join(os.path.dirname(staging_path), COMMIT_JOURNAL)
+
+def prepare_staging_archive(backup_path: str) -> str:
+    staging_path = staging_archive_path(backup_path)
+    if os.path.isfile(commit_journal_path(staging_path)):
+        logger.warning(f"Finishing interrupted replacement of {backup_path}")
+        replay_commit(staging_path, backup_path)
+    discard_staging_archive(staging_path)  # leftovers of an interrupted run
+    os.makedirs(os.path.dirname(staging_path))
+    return staging_path
+
+def discard_staging_archive(staging_path: str):
+    # Once the journal is written the staging directory may hold the only copy of some files
+    if os.path.isfile(commit_journal_path(staging_path)):
+        return
+    shutil.rmtree(os.path.dirname(staging_path), ignore_errors=True)
+
+def commit_archive(staging_path: str, backup_path: str):
+    # The new files are renamed over the old ones before stale files of the previous archive
+    # are removed; the journal lets the next run finish a commit interrupted halfway
+    new_names = [os.path.basename(path) for path in archive_files(staging_path)]
+    stale = [os.path.basename(path) for path in archive_files(backup_path)
+             if os.path.basename(path) not in new_names]
+    journal_path = commit_journal_path(staging_path)
+    with open(journal_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"move": new_names, "remove": stale}, f)
+    os.replace(journal_path + ".tmp", journal_path)
+    replay_commit(staging_path, backup_path)
+
+def replay_commit(staging_path: str, backup_path: str):
+    staging_dir = os.path.dirname(staging_path)
+    directory = os.path.dirname(backup_path)
+    with open(commit_journal_path(staging_path), "r", encoding="utf-8") as f:
+        journal = json.load(f)
+    for name in journal["move"]:
+        if os.path.isfile(os.path.join(staging_dir, name)):
+            os.replace(os.path.join(staging_dir, name), os.path.join(directory, name))
+    for name in journal["remove"]:
+        if os.path.isfile(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+class PartWriter:
+    """Splits a stream into numbered part files, each with its own SHA-256 sidecar."""
+
+    def __init__(self, backup_path: str, max_part_size: int):
+        self.backup_path = backup_path
+        self.max_part_size = max_part_size
+        self.parts = []
+        self._file = None
+        self._hash = None
+        self._written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(write_manifest=exc_type is None)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written >= self.max_part_size:
+                self._next_part()
+            take = min(len(view), self.max_part_size - self._written)
+            self._file.write(view[:take])
+            self._hash.update(view[:take])
+            self._written += take
+            view = view[take:]
+        return len(data)
+
+    def _next_part(self):
+        self._finish_part()
+        path = part_path(self.backup_path, len(self.parts) + 1)
+        self._file = open(path, "wb")
+        self._hash = hashlib.sha256()
+        self._written = 0
+
+    def _finish_part(self):
+        if self._file is None:
+            return
+        self._file.close()
+        name = os.path.basename(self._file.name)
+        digest = self._hash.hexdigest()
+        with open(self._file.name + ".sha256", "w", encoding="utf-8") as f:
+            f.write(f"{digest}  {name}\n")
+        self.parts.append({"name": name, "size": self._written, "sha256": digest})
+        logger.info(f"Archive part written: {name} ({self._written} bytes)")
+        self._file = None
+
+    def close(self, write_manifest=True):
+        self._finish_part()
+        if not write_manifest:
+            return
+        manifest = {
+            "max_part_size": self.max_part_size,
+            "total_size": sum(part["size"] for part in self.parts),
+            "parts": self.parts,
+        }
+        manifest_path = self.backup_path + PARTS_MANIFEST_SUFFIX
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+def open_archive_output(backup_path: str, max_part_size=None):
+    if max_part_size:
+        return PartWriter(backup_path, max_part_size)
+    return open(backup_path, "wb")
+
+class MultiPartReader:
+    """Read-only, seekable view of archive parts as one continuous stream."""
+
+    def __init__(self, backup_path: str, manifest):
+        directory = os.path.dirname(backup_path)
+        self._parts = []
+        start = 0
+        for part in manifest["parts"]:
+            self._parts.append((start, part["size"], os.path.join(directory, part["name"])))
+            start += part["size"]
+        self._size = start
+        self._pos = 0
+        self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._size - self._pos
+        chunks = []
+        while size > 0 and self._pos < self._size:
+            start, length, path = next(p for p in self._parts if p[0] <= self._pos < p[0] + p[1])
+            if self._current is None or self._current.name != path:
+                self.close()
+                self._current = open(path, "rb")
+            self._current.seek(self._pos - start)
+            data = self._current.read(min(size, start + length - self._pos))
+            if not data:
+                break
+            chunks.append(data)
+            self._pos += len(data)
+            size -= len(data)
+        return b"".join(chunks)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+def open_archive_input(backup_path: str):
+    manifest = load_parts_manifest(backup_path)
+    if manifest is not None:
+        return MultiPartReader(backup_path, manifest)
+    return open(backup_path, "rb")
+
+def iter_archive_chunks(backup_path: str):
+    with open_archive_input(backup_path) as f:
+        while True:
+            chunk = f.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def verify_part(directory: str, part):
+    digest = hashlib.sha256()
+    with open(os.path.join(directory, part["name"]), "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == part["sha256"]
+
+def verify_archive(backup_path: str, webhook_url: str, max_workers: int = 4) -> bool:
+    manifest = load_parts_manifest(backup_path)
+    if manifest is None:
+        logger.info(f"{backup_path} is not a multi-part archive, nothing to verify")
+        return os.path.isfile(backup_path)
+
+    directory = os.path.dirname(backup_path)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(verify_part, directory, part): part["name"] for part in manifest["parts"]}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                logger.error(f"Failed to verify {name}: {e}")
+                ok = False
+            if not ok:
+                failed.append(name)
+
+    if failed:
+        send_error(webhook_url, f"Niepoprawne sumy kontrolne części archiwum {backup_path}: {', '.join(sorted(failed))}")
+        return False
+    logger.info(f"Archive verified: {backup_path} ({len(manifest['parts'])} parts)")
+    return True
+
+def get_local_mountpoint(client, volume):
+    # Only a daemon on the local unix socket shares our filesystem; docker-py also uses
+    # http+docker:// for SSH (http+docker://ssh) and named pipe (http+docker://localnpipe) daemons
+    if getattr(client.api, "base_url", "") != UNIX_SOCKET_BASE_URL:
+        return None
+    mountpoint = volume.attrs.get("Mountpoint")
+    if not mountpoint or not os.path.isdir(mountpoint):
+        return None
+    if not os.access(mountpoint, os.R_OK | os.X_OK):
+        return None
+    return mountpoint
+
+def finish_volume_backup(volume_name: str, backup_path: str, entries, webhook_url: str):
+    file_size = archive_size(backup_path)
+    logger.info(f"Volume backup completed: {volume_name} -> {backup_path} ({file_size} bytes, {len(entries)} members indexed)")
+    send_info(webhook_url, f"Volume backup completed: {volume_name} ({file_size} bytes)")
+
+def backup_volume_from_host(volume_name: str, mountpoint: str, backup_path: str, webhook_url: str, max_part_size=None):
+    global current_operation
+    current_operation = f"archiving volume {volume_name} from host path {mountpoint} to {backup_path}"
+    logger.info(f"Archiving volume {volume_name} directly from host path {mountpoint}")
+    try:
+        staging_path = prepare_staging_archive(backup_path)
+        try:
+            with open_archive_output(staging_path, max_part_size) as f:
+                writer = TarIndexWriter(f)
+                try:
+                    with tarfile.open(fileobj=writer, mode="w|") as tar:
+                        tar.add(mountpoint, arcname=".")
+                finally:
+                    entries = writer.close()
+            # The index is committed together with the archive it describes
+            write_archive_index(staging_path, entries)
+            commit_archive(staging_path, backup_path)
+        finally:
+            discard_staging_archive(staging_path)
+        finish_volume_backup(volume_name, backup_path, entries, webhook_url)
+    except Exception as e:
+        error_msg = f"Błąd podczas archiwizacji wolumenu {volume_name} z katalogu hosta {mountpoint}: {e}"
+        send_error(webhook_url, error_msg)
+
+def backup_volume(volume_name: str, backup_path: str, webhook_url: str, use_host_path: bool = False, max_part_size=None):
     global current_operation
     current_operation = f"backing up volume {volume_name}"
     logger.info(f"Starting backup of volume: {volume_name}")
@@ -106,6 +491,16 @@ def backup_volume(volume_name: str, backup_path: str, webhook_url: str):
         send_error(webhook_url, error_msg)
         return
 
+    if use_host_path:
+        mountpoint = get_local_mountpoint(client, volume)
+        if mountpoint:
+            try:
+                backup_volume_from_host(volume_name, mountpoint, backup_path, webhook_url, max_part_size)
+            finally:
+                current_operation = None
+            return
+        logger.info(f"Mountpoint of volume {volume_name} is not readable locally, falling back to helper container")
+
     tmp_container_name = f"temp-backup-{volume_name}"
     logger.info(f"Creating temporary container {tmp_container_name} for volume backup")
     
@@ -125,30 +520,40 @@ def backup_volume(volume_name: str, backup_path: str, webhook_url: str):
         return
 
     try:
-        current_operation = f"creating TAR archive for volume {volume_name}"
-        logger.info(f"Creating TAR archive for volume {volume_name}")
-        exec_result = container.exec_run("tar -cf /data_backup.tar -C /data .")
-        if exec_result.exit_code != 0:
-            error_msg = f"Błąd tworzenia archiwum TAR w kontenerze backupującym wolumen {volume_name}"
-            send_error(webhook_url, error_msg)
-            container.kill()
-            return
-
-        current_operation = f"copying volume data for {volume_name} to {backup_path}"
-        logger.info(f"TAR archive created successfully, copying to {backup_path}")
-        bits, stat = container.get_archive("/data_backup.tar")
-
-        with open(backup_path, "wb") as f:
-            chunk_count = 0
-            for chunk in bits:
-                f.write(chunk)
-                chunk_count += 1
-                if chunk_count % 100 == 0:  # Log every 100 chunks
-                    logger.info(f"Volume {volume_name}: processed {chunk_count} chunks")
+        current_operation = f"streaming TAR archive for volume {volume_name} to {backup_path}"
+        logger.info(f"Streaming TAR archive for volume {volume_name} to {backup_path}")
+        exec_id = client.api.exec_create(container.id, "tar -cf - -C /data .")["Id"]
+        stream = client.api.exec_start(exec_id, stream=True, demux=True)
 
-        file_size = os.path.getsize(backup_path)
-        logger.info(f"Volume backup completed: {volume_name} -> {backup_path} ({file_size} bytes)")
-        send_info(webhook_url, f"Volume backup completed: {volume_name} ({file_size} bytes)")
+        stderr_tail = b""
+        staging_path = prepare_staging_archive(backup_path)
+        try:
+            with open_archive_output(staging_path, max_part_size) as f:
+                writer = TarIndexWriter(f)
+                try:
+                    chunk_count = 0
+                    for stdout_chunk, stderr_chunk in stream:
+                        if stdout_chunk:
+                            writer.write(stdout_chunk)
+                            chunk_count += 1
+                            if chunk_count % 100 == 0:  # Log every 100 chunks
+                                logger.info(f"Volume {volume_name}: processed {chunk_count} chunks")
+                        if stderr_chunk:
+                            stderr_tail = (stderr_tail + stderr_chunk)[-4096:]
+                finally:
+                    entries = writer.close()
+
+            exit_code = client.api.exec_inspect(exec_id).get("ExitCode")
+            if exit_code != 0:
+                error_msg = f"Błąd tworzenia archiwum TAR w kontenerze backupującym wolumen {volume_name}: {stderr_tail.decode(errors='replace')}"
+                send_error(webhook_url, error_msg)
+                return
+            write_archive_index(staging_path, entries)
+            commit_archive(staging_path, backup_path)
+        finally:
+            discard_staging_archive(staging_path)
+
+        finish_volume_backup(volume_name, backup_path, entries, webhook_url)
 
     except Exception as e:
         error_msg = f"Błąd podczas kopiowania archiwum wolumenu {volume_name}: {e}"
@@ -167,7 +572,7 @@ def restore_volume(volume_name: str, backup_path: str, webhook_url: str):
     send_info(webhook_url, f"Starting restore of volume: {volume_name}")
     
     client = from_env()
-    if not os.path.isfile(backup_path):
+    if not archive_exists(backup_path):
         error_msg = f"Backup wolumenu {volume_name} nie istnieje pod ścieżką {backup_path}"
         send_error(webhook_url, error_msg)
         return
@@ -207,12 +612,8 @@ def restore_volume(volume_name: str, backup_path: str, webhook_url: str):
         return
 
     try:
-        logger.info(f"Reading backup file: {backup_path}")
-        with open(backup_path, "rb") as f:
-            data = f.read()
-        
-        logger.info(f"Restoring data to volume {volume_name}")
-        success = container.put_archive(path="/data", data=data)
+        logger.info(f"Restoring data to volume {volume_name} from {backup_path}")
+        success = container.put_archive(path="/data", data=iter_archive_chunks(backup_path))
         if not success:
             error_msg = f"Nie udało się przywrócić plików do wolumenu {volume_name}"
             send_error(webhook_url, error_msg)
@@ -229,7 +630,54 @@ def restore_volume(volume_name: str, backup_path: str, webhook_url: str):
         except Exception:
             pass
 
-def backup_container_snapshot(container_name: str, backup_path: str, webhook_url: str):
+def list_volume_backup(volume_name: str, backup_path: str, member: str = ""):
+    entries = load_archive_index(backup_path)
+    if entries is None:
+        print(f"Brak indeksu archiwum dla wolumenu {volume_name}: {backup_path}{INDEX_SUFFIX}")
+        return False
+
+    for entry in select_index_entries(entries, member):
+        mtime = datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{entry['type']} {entry['size']:>12} {mtime} {entry['path']}")
+    return True
+
+def restore_file_from_volume_backup(volume_name: str, backup_path: str, member: str, target_dir: str, webhook_url: str):
+    logger.info(f"Starting single-file restore of {member} from volume backup: {volume_name}")
+    entries = load_archive_index(backup_path)
+    if entries is None:
+        error_msg = f"Brak indeksu archiwum wolumenu {volume_name} ({backup_path}{INDEX_SUFFIX}), nie można przywrócić pojedynczego pliku"
+        send_error(webhook_url, error_msg)
+        return False
+
+    selected = select_index_entries(entries, member)
+    if not selected:
+        error_msg = f"Plik {member} nie występuje w archiwum wolumenu {volume_name}"
+        send_error(webhook_url, error_msg)
+        return False
+
+    os.makedirs(target_dir, exist_ok=True)
+    extract_kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+    try:
+        with open_archive_input(backup_path) as f:
+            for entry in selected:
+                # Seek straight to the member header instead of reading the archive from the start
+                f.seek(entry["offset"])
+                with tarfile.open(fileobj=f, mode="r:") as tar:
+                    info = tar.next()
+                    if info is None:
+                        raise tarfile.TarError(f"no member at offset {entry['offset']}")
+                    tar.extract(info, path=target_dir, **extract_kwargs)
+                logger.info(f"Restored {entry['path']} ({entry['size']} bytes) to {target_dir}")
+    except Exception as e:
+        error_msg = f"Błąd podczas przywracania pliku {member} z archiwum wolumenu {volume_name}: {e}"
+        send_error(webhook_url, error_msg)
+        return False
+
+    logger.info(f"Single-file restore completed: {len(selected)} members from {volume_name} -> {target_dir}")
+    send_info(webhook_url, f"Single-file restore completed: {member} from {volume_name} ({len(selected)} members)")
+    return True
+
+def backup_container_snapshot(container_name: str, backup_path: str, webhook_url: str, max_part_size=None):
     global current_operation
     current_operation = f"backing up container {container_name}"
     logger.info(f"Starting backup of container: {container_name}")
@@ -265,17 +713,22 @@ def backup_container_snapshot(container_name: str, backup_path: str, webhook_url
         logger.info(f"Saving container snapshot to file: {backup_path}")
         image_tar_stream = image.save(named=True)
         
-        with open(backup_path, "wb") as f:
-            chunk_count = 0
-            bytes_written = 0
-            for chunk in image_tar_stream:
-                f.write(chunk)
-                chunk_count += 1
-                bytes_written += len(chunk)
-                if chunk_count % 50 == 0:  # Log every 50 chunks
-                    logger.info(f"Container {container_name}: processed {chunk_count} chunks, {bytes_written} bytes")
-
-        file_size = os.path.getsize(backup_path)
+        staging_path = prepare_staging_archive(backup_path)
+        try:
+            with open_archive_output(staging_path, max_part_size) as f:
+                chunk_count = 0
+                bytes_written = 0
+                for chunk in image_tar_stream:
+                    f.write(chunk)
+                    chunk_count += 1
+                    bytes_written += len(chunk)
+                    if chunk_count % 50 == 0:  # Log every 50 chunks
+                        logger.info(f"Container {container_name}: processed {chunk_count} chunks, {bytes_written} bytes")
+            commit_archive(staging_path, backup_path)
+        finally:
+            discard_staging_archive(staging_path)
+
+        file_size = archive_size(backup_path)
         logger.info(f"Container backup completed: {container_name} -> {backup_path} ({file_size} bytes)")
         send_info(webhook_url, f"Container backup completed: {container_name} ({file_size} bytes)")
 
@@ -296,15 +749,14 @@ def restore_container_snapshot(container_name: str, backup_path: str, webhook_ur
     send_info(webhook_url, f"Starting restore of container: {container_name}")
     
     client = from_env()
-    if not os.path.isfile(backup_path):
+    if not archive_exists(backup_path):
         error_msg = f"Backup snapshotu kontenera {container_name} nie istnieje pod ścieżką {backup_path}"
         send_error(webhook_url, error_msg)
         return
 
     try:
         logger.info(f"Loading container snapshot from: {backup_path}")
-        with open(backup_path, "rb") as f:
-            images = client.images.load(f.read())
+        images = client.images.load(iter_archive_chunks(backup_path))
         logger.info(f"Container snapshot loaded successfully")
     except Exception as e:
         error_msg = f"Błąd ładowania snapshotu kontenera {container_name}: {e}"
@@ -354,8 +806,12 @@ def load_config(config_path: str):
 def main():
     logger.info(f"Starting backup-dockers script v{__version__}")
     
-    if len(sys.argv) < 3 or sys.argv[1] not in {"backup", "restore"}:
-        print(f"Użycie: {sys.argv[0]} [backup|restore] <ścieżka_do_konfigu>")
+    if (len(sys.argv) < 3 or sys.argv[1] not in {"backup", "restore", "verify", "ls", "restore-file"}
+            or (sys.argv[1] == "ls" and len(sys.argv) < 4)
+            or (sys.argv[1] == "restore-file" and len(sys.argv) < 5)):
+        print(f"Użycie: {sys.argv[0]} [backup|restore|verify] <ścieżka_do_konfigu>")
+        print(f"        {sys.argv[0]} ls <ścieżka_do_konfigu> <wolumen> [ścieżka_w_archiwum]")
+        print(f"        {sys.argv[0]} restore-file <ścieżka_do_konfigu> <wolumen> <ścieżka_w_archiwum> [katalog_docelowy]")
         sys.exit(1)
 
     mode = sys.argv[1]
@@ -364,10 +820,23 @@ def main():
     
     config = load_config(config_path)
 
+    if mode in {"ls", "restore-file"}:
+        volume = sys.argv[3]
+        backup_path = os.path.join(config.get("backup_dir", "/mnt/pendrak"), f"{volume}.tar")
+        if mode == "ls":
+            ok = list_volume_backup(volume, backup_path, sys.argv[4] if len(sys.argv) > 4 else "")
+        else:
+            target_dir = sys.argv[5] if len(sys.argv) > 5 else os.path.join(os.getcwd(), f"restored-{volume}")
+            ok = restore_file_from_volume_backup(volume, backup_path, sys.argv[4], target_dir, config.get("webhook_url"))
+        sys.exit(0 if ok else 1)
+
     volumes = config.get("volumes", [])
     containers = config.get("containers", [])
     backup_dir = config.get("backup_dir", "/mnt/pendrak")
     webhook_url = config.get("webhook_url")
+    use_host_path = config.get("use_host_path", False)
+    max_part_size = parse_size(config.get("max_part_size"))
+    parallel_parts = config.get("parallel_parts", 4)
 
     logger.info(f"Found {len(volumes)} volumes and {len(containers)} containers to process")
     logger.info(f"Backup directory: {backup_dir}")
@@ -381,12 +850,12 @@ def main():
         for i, volume in enumerate(volumes, 1):
             logger.info(f"Processing volume {i}/{len(volumes)}: {volume}")
             backup_path = os.path.join(backup_dir, f"{volume}.tar")
-            backup_volume(volume, backup_path, webhook_url)
+            backup_volume(volume, backup_path, webhook_url, use_host_path, max_part_size)
 
         for i, container in enumerate(containers, 1):
             logger.info(f"Processing container {i}/{len(containers)}: {container}")
             backup_path = os.path.join(backup_dir, f"{container}.tar")
-            backup_container_snapshot(container, backup_path, webhook_url)
+            backup_container_snapshot(container, backup_path, webhook_url, max_part_size)
             
         logger.info("Backup process completed")
         send_info(webhook_url, "Backup process completed successfully")
@@ -408,5 +877,18 @@ def main():
         logger.info("Restore process completed")
         send_info(webhook_url, "Restore process completed successfully")
 
+    elif mode == "verify":
+        logger.info("Starting verification of archive parts")
+        failed = []
+        for name in volumes + containers:
+            backup_path = os.path.join(backup_dir, f"{name}.tar")
+            if not verify_archive(backup_path, webhook_url, parallel_parts):
+                failed.append(name)
+
+        if failed:
+            logger.error(f"Verification failed for: {', '.join(failed)}")
+            sys.exit(1)
+        logger.info("Verification completed successfully")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Stała usługa zadań backupu z API HTTP (np. dla webhooka n8n).
+
+Zadania trafiają do kolejki i są wykonywane po kolei w tym samym procesie - bez
+uruchamiania nowego interpretera. Wyklucza je z backupami z CLI/crona ta sama
+blokada flock (backup.lock), której używa db_backup_restore.py.
+
+Użycie: python backup_service.py
+
+API (JSON, opcjonalnie z nagłówkiem "Authorization: Bearer <token>"):
+  POST /jobs            {"command": "backup", "databases": ["freshrss"]} - dodaje zadanie
+  GET  /jobs            lista zadań
+  GET  /jobs/<id>       zadanie z postępem każdej bazy
+  GET  /jobs/<id>/log   strukturalne logi zadania
+  GET  /status          stan usługi: bieżące zadanie, kolejka, ostatni wynik
+"""
+import asyncio
+import collections
+import contextvars
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List, Any, Tuple
+
+import db_backup_restore as backup
+
+DEFAULT_LISTEN = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVICE_LOG_FILE = "backup_service.jsonl"  # Strukturalne logi usługi (JSON, jedna linia na wpis)
+LOCK_RETRY = 5  # Co ile sekund ponawiać próbę zajęcia blokady zajętej przez backup z CLI/crona
+JOB_LOG_LINES = 500  # Ile ostatnich wpisów logu trzymać w pamięci dla każdego zadania
+MAX_FINISHED_JOBS = 50  # Ile zakończonych zadań pamiętać
+JOB_COMMANDS = ("backup", "verify-restore", "upload")
+
+# Identyfikator zadania wykonywanego w bieżącym kontekście (dziedziczony przez zadania asyncio i wątki)
+current_job: contextvars.ContextVar = contextvars.ContextVar("current_job", default=None)
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobStore:
+    """Kolejka i historia zadań współdzielona przez wątki HTTP i wątek wykonujący zadania."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        self.logs: Dict[int, collections.deque] = {}
+        self.queue: queue.Queue = queue.Queue()
+        self.ids = itertools.count(1)
+
+    def submit(self, command: str, databases: List[str]) -> Tuple[Dict[str, Any], bool]:
+        """Dodaje zadanie; identyczne zadanie oczekujące lub w toku jest zwracane zamiast nowego."""
+        with self.lock:
+            for job in self.jobs.values():
+                if job["status"] in ("queued", "waiting", "running") and \
+                        job["command"] == command and job["databases"] == databases:
+                    return dict(job), False
+            job_id = next(self.ids)
+            job = {"id": job_id, "command": command, "databases": databases, "status": "queued",
+                   "created": now(), "started": None, "finished": None, "progress": {}, "result": None}
+            self.jobs[job_id] = job
+            self.logs[job_id] = collections.deque(maxlen=JOB_LOG_LINES)
+            self.forget_finished()
+        self.queue.put(job_id)
+        return dict(job), True
+
+    def forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished"]]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job_id]
+            del self.logs[job_id]
+
+    def update(self, job_id: int, **fields: Any) -> None:
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def update_progress(self, job_id: int, database: str, fields: Dict[str, Any]) -> None:
+        with self.lock:
+            self.jobs[job_id]["progress"].setdefault(database, {}).update(fields)
+
+    def add_log(self, job_id: int, entry: Dict[str, Any]) -> None:
+        with self.lock:
+            if job_id in self.logs:
+                self.logs[job_id].append(entry)
+
+    def snapshot(self, job_id: Optional[int] = None) -> Any:
+        """Kopia zadania (lub listy zadań) do serializacji poza blokadą."""
+        with self.lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return json.loads(json.dumps(job)) if job else None
+            return [json.loads(json.dumps(job)) for job in self.jobs.values()]
+
+    def job_log(self, job_id: int) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            return list(self.logs[job_id]) if job_id in self.logs else None
+
+
+class StructuredLogHandler(logging.Handler):
+    """Zapisuje logi jako JSON (czas, poziom, zadanie, baza) i aktualizuje postęp zadania."""
+
+    def __init__(self, store: JobStore, path: str):
+        super().__init__(logging.INFO)
+        self.store = store
+        self.file = open(path, "a", encoding="utf-8")
+        self.write_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            job_id = current_job.get()
+            database = backup.current_database.get()
+            entry = {"time": datetime.fromtimestamp(record.created).isoformat(timespec="seconds"),
+                     "level": record.levelname, "job": job_id, "database": database,
+                     "message": record.getMessage()}
+            with self.write_lock:
+                self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.file.flush()
+            if job_id is not None:
+                self.store.add_log(job_id, entry)
+                if database is not None:
+                    # Ostatni komunikat bazy - m.in. postęp narzędzia logowany co PROGRESS_INTERVAL
+                    self.store.update_progress(job_id, database, {"message": entry["message"],
+                                                                   "updated": entry["time"]})
+        except Exception:
+            self.handleError(record)
+
+
+def run_job(store: JobStore, job: Dict[str, Any]) -> Any:
+    """Wykonuje zadanie w bieżącym wątku; zwraca wynik do zapisania w zadaniu."""
+    config = backup.select_databases(backup.load_config(), job["databases"])
+    if job["command"] == "verify-restore":
+        results = asyncio.run(backup.run_verifications(config, job["databases"]))
+        return {"success": all(result["success"] for result in results), "databases": results}
+
+    if job["command"] == "upload":
+        for db in config["databases"]:
+            if backup.remote_settings(db):
+                backup.current_database.set(db["name"])
+                asyncio.run(backup.upload_pending(db))
+        backup.current_database.set(None)
+        return {"success": True}
+
+    for db in config["databases"]:
+        store.update_progress(job["id"], db.get("name", "N/A"), {"state": "queued"})
+    results = backup.backup_databases(
+        config, lambda database, fields: store.update_progress(job["id"], database, fields)
+    )
+    return {"success": all(result["success"] for result in results),
+            "succeeded": sum(1 for result in results if result["success"]),
+            "total": len(results),
+            "failed": [result["name"] for result in results if not result["success"]],
+            "skipped": [result["name"] for result in results if result.get("skipped")]}
+
+
+def worker(store: JobStore) -> None:
+    """Wykonuje zadania z kolejki po kolei, każde pod blokadą backup.lock."""
+    while True:
+        job_id = store.queue.get()
+        current_job.set(job_id)
+        job = store.snapshot(job_id)
+        if job is None:
+            continue
+        lock = backup.acquire_backup_lock()
+        while lock is None:
+            if job["status"] != "waiting":
+                logging.info(f"Zadanie {job_id}: czekam na zwolnienie blokady {backup.LOCK_FILE}")
+                store.update(job_id, status="waiting")
+                job["status"] = "waiting"
+            time.sleep(LOCK_RETRY)
+            lock = backup.acquire_backup_lock()
+
+        store.update(job_id, status="running", started=now())
+        logging.info(f"Zadanie {job_id}: start ({job['command']} {' '.join(job['databases']) or 'wszystkie bazy'})")
+        try:
+            with lock:
+                result = run_job(store, job)
+            status = "success" if result["success"] else "failed"
+        except BaseException as e:
+            # SystemExit z load_config (błędna konfiguracja) nie może zatrzymać usługi
+            logging.error(f"Zadanie {job_id}: wyjątek {e!r}")
+            result, status = {"success": False, "error": str(e)}, "failed"
+        store.update(job_id, status=status, finished=now(), result=result)
+        logging.info(f"Zadanie {job_id}: koniec ({status})")
+        current_job.set(None)
+
+
+def make_handler(store: JobStore, token: Optional[str]) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "backup-service/1"
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logging.debug(f"HTTP {self.address_string()} {format % args}")
+
+        def reply(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False, indent=2).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def authorized(self) -> bool:
+            if token and self.headers.get("Authorization") != f"Bearer {token}":
+                self.reply(401, {"status": "error", "message": "Unauthorized"})
+                return False
+            return True
+
+        def do_GET(self) -> None:
+            if not self.authorized():
+                return
+            parts = [part for part in self.path.split("?")[0].split("/") if part]
+            if parts == ["status"]:
+                jobs = store.snapshot()
+                active = [job for job in jobs if job["status"] in ("waiting", "running")]
+                finished = [job for job in jobs if job["finished"]]
+                self.reply(200, {
+                    "status": "running" if active else "idle",
+                    "current_job": active[0] if active else None,
+                    "queued": sum(1 for job in jobs if job["status"] == "queued"),
+                    "last_job": finished[-1] if finished else None,
+                    "timestamp": now(),
+                })
+            elif parts == ["jobs"]:
+                self.reply(200, store.snapshot())
+            elif len(parts) in (2, 3) and parts[0] == "jobs" and parts[1].isdigit() and parts[2:] in ([], ["log"]):
+                payload = store.snapshot(int(parts[1])) if len(parts) == 2 else store.job_log(int(parts[1]))
+                if payload is None:
+                    self.reply(404, {"status": "error", "message": "Job not found"})
+                else:
+                    self.reply(200, payload)
+            else:
+                self.reply(404, {"status": "error", "message": "Not found"})
+
+        def do_POST(self) -> None:
+            if not self.authorized():
+                return
+            if self.path.split("?")[0].rstrip("/") != "/jobs":
+                self.reply(404, {"status": "error", "message": "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                command = request.get("command", "backup")
+                databases = request.get("databases", [])
+                if command not in JOB_COMMANDS or not isinstance(databases, list):
+                    raise ValueError(f"command must be one of {', '.join(JOB_COMMANDS)}, databases a list")
+            except (ValueError, AttributeError) as e:
+                self.reply(400, {"status": "error", "message": str(e)})
+                return
+            job, created = store.submit(command, sorted(databases))
+            if created:
+                status = "queued"
+            else:
+                status = "already_running" if job["status"] in ("waiting", "running") else "already_queued"
+            self.reply(202, {"status": status, "job": job, "timestamp": now()})
+
+    return Handler
+
+
+def main() -> None:
+    config = backup.load_config()
+    settings = config.get("service", {})
+    token = settings.get("token") or os.environ.get(settings.get("token_env", ""), "") or None
+    store = JobStore()
+    logging.getLogger("").addHandler(StructuredLogHandler(store, settings.get("log_file", SERVICE_LOG_FILE)))
+
+    threading.Thread(target=worker, args=(store,), daemon=True, name="backup-worker").start()
+    address = (settings.get("listen", DEFAULT_LISTEN), int(settings.get("port", DEFAULT_PORT)))
+    server = ThreadingHTTPServer(address, make_handler(store, token))
+    logging.info(f"Usługa backupu nasłuchuje na http://{address[0]}:{address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Zatrzymano usługę backupu.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Zastępnik narzędzi bazodanowych do benchmarku (pg_dump, mariadb-dump, mongodump, docker, ...).
+
+run_bench.py tworzy do tego pliku dowiązania o nazwach narzędzi i umieszcza je na
+początku PATH. Zachowanie zależy od nazwy, pod którą skrypt został wywołany:
+  - narzędzia dumpa wypisują syntetyczne dane na stdout (lub do --out/--file),
+    mariadb-dump/mysqldump z nagłówkami sekcji tabel i stopką jak prawdziwy dump,
+  - narzędzia przywracania i klienci czytają stdin do końca,
+  - docker exec uruchamia wskazane narzędzie (również zastępnik), docker restart nic nie robi.
+
+Parametry (zmienne środowiskowe):
+  BENCH_SIZE_MB          rozmiar dumpa (domyślnie 64)
+  BENCH_RATE_MBPS        tempo wypisywania danych, 0 = bez limitu (domyślnie 0)
+  BENCH_STDERR_PER_MB    ile linii "postępu" na stderr na każdy MB danych (domyślnie 10)
+  BENCH_DATA             "text" (dobrze się kompresuje) lub "random" (domyślnie text)
+"""
+import os
+import sys
+import time
+
+CHUNK_SIZE = 64 * 1024
+DUMP_TOOLS = ("pg_dump", "mariadb-dump", "mysqldump", "mongodump")
+PROGRESS_LINES = {
+    "pg_dump": "pg_dump: dumping contents of table \"public.table_{n}\"",
+    "mariadb-dump": "-- Retrieving table structure for table `table_{n}`...",
+    "mysqldump": "-- Retrieving table structure for table `table_{n}`...",
+    "mongodump": "2024-05-01T03:00:00.000+0000\t[########................]  bench.collection_{n}  {n}/1000",
+}
+MARIADB_TABLES = 4  # Liczba sekcji tabel w dumpie mariadb-dump
+MARIADB_PROLOGUE = "-- MariaDB dump 10.19  Distrib 10.11.6-MariaDB\n--\n-- Host: localhost    Database: bench\n\n"
+MARIADB_SECTION = ("\n--\n-- Table structure for table `table_{n}`\n--\n\n"
+                   "CREATE TABLE `table_{n}` (`id` int(11) NOT NULL);\n\n"
+                   "--\n-- Dumping data for table `table_{n}`\n--\n\n")
+MARIADB_EPILOGUE = ("\n--\n-- Dumping routines for database 'bench'\n--\n"
+                    "/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n\n-- Dump completed\n")
+
+
+def data_block() -> bytes:
+    """Blok danych powtarzany w dumpie (1 MiB)."""
+    if os.environ.get("BENCH_DATA", "text") == "random":
+        return os.urandom(1024 * 1024)
+    row = b"INSERT INTO `table` VALUES (1,'2024-05-01 03:00:00','lorem ipsum dolor sit amet',42.5);\n"
+    return (row * (1024 * 1024 // len(row) + 1))[:1024 * 1024]
+
+
+def emit_dump(name: str, out) -> None:
+    size = int(float(os.environ.get("BENCH_SIZE_MB", "64")) * 1024 * 1024)
+    rate = float(os.environ.get("BENCH_RATE_MBPS", "0")) * 1024 * 1024
+    stderr_per_mb = float(os.environ.get("BENCH_STDERR_PER_MB", "10"))
+    block = memoryview(data_block())
+    progress = PROGRESS_LINES.get(name, name + ": progress {n}")
+    # Dane MariaDB dzielone na sekcje tabel, żeby spis tabel backupu miał co zapisać
+    sections = MARIADB_TABLES if name in ("mariadb-dump", "mysqldump") else 1
+    started = time.monotonic()
+    written = 0
+    lines = 0
+    if sections > 1:
+        out.write(MARIADB_PROLOGUE.encode())
+    for section in range(sections):
+        if sections > 1:
+            out.write(MARIADB_SECTION.format(n=section + 1).encode())
+        section_end = size * (section + 1) // sections
+        while written < section_end:
+            offset = written % len(block)
+            chunk = block[offset:offset + min(CHUNK_SIZE, section_end - written)]
+            out.write(chunk)
+            written += len(chunk)
+            while stderr_per_mb and lines < written * stderr_per_mb / (1024 * 1024):
+                lines += 1
+                sys.stderr.write(progress.format(n=lines) + "\n")
+            if rate:
+                delay = written / rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+    if sections > 1:
+        out.write(MARIADB_EPILOGUE.encode())
+    out.flush()
+    sys.stderr.flush()
+
+
+def output_target(args: list):
+    """Plik wyjściowy dla narzędzi zapisujących poza stdout (mongodump --out, pg_dump -f)."""
+    for i, arg in enumerate(args):
+        if arg == "--out":
+            database = args[args.index("--db") + 1] if "--db" in args else "bench"
+            directory = os.path.join(args[i + 1], database)
+            os.makedirs(directory, exist_ok=True)
+            return os.path.join(directory, "collection.bson")
+        if arg == "-f":
+            return args[i + 1]
+        if arg.startswith("--file="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def main() -> None:
+    name = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+
+    if name == "docker":
+        if args and args[0] == "exec":
+            rest = args[1:]
+            while rest and rest[0].startswith("-"):
+                rest = rest[2:] if rest[0] in ("-e", "-w", "-u") else rest[1:]
+            os.execvp(rest[1], rest[1:])  # rest[0] to nazwa kontenera
+        sys.exit(0)
+
+    if name in DUMP_TOOLS:
+        target = output_target(args)
+        if target:
+            with open(target, "wb") as f:
+                emit_dump(name, f)
+        else:
+            emit_dump(name, sys.stdout.buffer)
+        sys.exit(0)
+
+    # Narzędzia przywracania, klienci i sprawdzanie gotowości - czytają stdin, jeśli coś na nim jest
+    if not sys.stdin.isatty():
+        while sys.stdin.buffer.read(1024 * 1024):
+            pass
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Benchmark db_backup_restore.py bez prawdziwych baz danych.
+
+Tworzy tymczasowy katalog z config.json, na początek PATH wstawia zastępniki narzędzi
+(fake_tool.py) i mierzy fazy: backup (kilka rund), restore (--latest każdej bazy)
+oraz cleanup (retencja do jednego backupu). Dla każdej fazy zapisuje czas, przepustowość,
+szczytowe RSS orkiestratora i narzędzi oraz czasy etapów z logu ("czas: pg_dump 0.4s, ...").
+
+Użycie:
+  python bench/run_bench.py --databases 6 --size-mb 64 --rounds 3 --output wynik.json
+  python bench/run_bench.py --compression zstd --compare wynik.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Any
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(os.path.dirname(BENCH_DIR), "db_backup_restore.py")
+FAKE_TOOL = os.path.join(BENCH_DIR, "fake_tool.py")
+TOOL_NAMES = ["pg_dump", "pg_restore", "psql", "pg_isready", "mariadb-dump", "mysqldump", "mariadb", "mysql",
+              "mariadb-admin", "mongodump", "mongorestore", "mongosh", "docker"]
+DB_TYPES = ["postgresql", "mariadb", "mongodb"]
+DB_PORTS = {"postgresql": 5432, "mariadb": 3306, "mongodb": 27017}
+
+# Uruchamia skrypt jak z wiersza poleceń i na wyjściu zapisuje własne zużycie zasobów oraz
+# szczytowe RSS największego z procesów potomnych (narzędzi) tego uruchomienia
+RUSAGE_WRAPPER = """
+import atexit, json, resource, runpy, sys
+def dump_rusage(path):
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(path, "w") as f:
+        json.dump({"max_rss_kb": usage.ru_maxrss, "user": usage.ru_utime, "system": usage.ru_stime,
+                   "largest_tool_max_rss_kb": children.ru_maxrss}, f)
+atexit.register(dump_rusage, sys.argv[1])
+script, sys.argv = sys.argv[2], sys.argv[2:]
+runpy.run_path(script, run_name="__main__")
+"""
+
+# Faza cleanup: sama retencja z katalogu, bez dumpów
+CLEANUP_SNIPPET = """
+import sys
+sys.argv = [sys.argv[0]]
+sys.path.insert(0, {script_dir!r})
+import db_backup_restore as backup
+for db in backup.load_config()["databases"]:
+    backup.cleanup_old_backups({{**db, "keep_backups": 1}})
+"""
+
+STAGE_PATTERN = re.compile(r"Pomyślnie wykonano: .* \(czas: (.*)\)$")
+
+
+def install_tools(bin_dir: str) -> None:
+    os.makedirs(bin_dir, exist_ok=True)
+    for name in TOOL_NAMES:
+        os.symlink(FAKE_TOOL, os.path.join(bin_dir, name))
+
+
+def write_config(work_dir: str, args: argparse.Namespace) -> List[str]:
+    databases = []
+    for i in range(args.databases):
+        db_type = args.types[i % len(args.types)]
+        db = {
+            "name": f"bench_{db_type}_{i}",
+            "type": db_type,
+            "host": "localhost",
+            "port": DB_PORTS[db_type],
+            "user": "bench",
+            "password": "bench",
+            "database": f"bench_{db_type}_{i}",
+            "backup_path": os.path.join(work_dir, "backups", db_type),
+            "docker_container": f"bench_{db_type}",
+            "use_docker_exec": not args.host_tools,
+            "keep_backups": args.rounds + 1,
+            "restart_after_restore": False,
+        }
+        if args.compression:
+            db["compression"] = args.compression
+        if db_type == "mongodb":
+            db["mongo_mode"] = "archive"
+        databases.append(db)
+    config = {
+        "concurrency": {"max_parallel": args.max_parallel, "max_per_server": args.max_per_server},
+        "databases": databases,
+    }
+    with open(os.path.join(work_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return [db["name"] for db in databases]
+
+
+def run_phase(work_dir: str, env: Dict[str, str], cmd: List[str]) -> Dict[str, Any]:
+    """Uruchamia polecenie w katalogu benchmarku i zwraca czas oraz zużycie zasobów orkiestratora."""
+    rusage_file = os.path.join(work_dir, "rusage.json")
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", RUSAGE_WRAPPER, rusage_file] + cmd,
+                          cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - started
+    with open(rusage_file, "r", encoding="utf-8") as f:
+        usage = json.load(f)
+    return {"seconds": elapsed, "returncode": proc.returncode, **usage}
+
+
+def log_stage_times(log_file: str, offset: int) -> Dict[str, float]:
+    """Suma czasów etapów potoków (z linii "Pomyślnie wykonano ... (czas: ...)") od podanego miejsca logu."""
+    totals: Dict[str, float] = defaultdict(float)
+    with open(log_file, "r", encoding="utf-8", errors="replace") as f:
+        f.seek(offset)
+        for line in f:
+            match = STAGE_PATTERN.search(line.rstrip())
+            if not match:
+                continue
+            for stage in match.group(1).split(", "):
+                tool, _, seconds = stage.rpartition(" ")
+                totals[tool] += float(seconds.rstrip("s"))
+    return {tool: round(seconds, 2) for tool, seconds in sorted(totals.items())}
+
+
+def summarize(runs: List[Dict[str, Any]], payload_mb: float, log_file: str, offsets: List[int]) -> Dict[str, Any]:
+    seconds = [run["seconds"] for run in runs]
+    best = min(seconds)
+    return {
+        "runs": len(runs),
+        "seconds_best": round(best, 3),
+        "seconds_mean": round(sum(seconds) / len(seconds), 3),
+        "throughput_mb_s": round(payload_mb / best, 1) if payload_mb else None,
+        "orchestrator_max_rss_mb": round(max(run["max_rss_kb"] for run in runs) / 1024, 1),
+        "orchestrator_cpu_seconds": round(sum(run["user"] + run["system"] for run in runs) / len(runs), 3),
+        # Szczyt pojedynczego procesu narzędzia w fazie, nie suma równoległych procesów
+        "largest_tool_max_rss_mb": round(max(run["largest_tool_max_rss_kb"] for run in runs) / 1024, 1),
+        "failed_runs": sum(1 for run in runs if run["returncode"] != 0),
+        "stage_seconds": log_stage_times(log_file, offsets[0]) if os.path.exists(log_file) else {},
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="db_backup_bench_")
+    try:
+        install_tools(os.path.join(work_dir, "bin"))
+        names = write_config(work_dir, args)
+        env = {
+            **os.environ,
+            "PATH": os.path.join(work_dir, "bin") + os.pathsep + os.environ.get("PATH", ""),
+            "BENCH_SIZE_MB": str(args.size_mb),
+            "BENCH_RATE_MBPS": str(args.rate_mbps),
+            "BENCH_STDERR_PER_MB": str(args.stderr_per_mb),
+            "BENCH_DATA": args.data,
+        }
+        log_file = os.path.join(work_dir, "backup.log")
+        payload_mb = args.size_mb * len(names)
+        phases: Dict[str, Any] = {}
+
+        def log_offset() -> int:
+            return os.path.getsize(log_file) if os.path.exists(log_file) else 0
+
+        offsets = [log_offset()]
+        runs = []
+        for _ in range(args.rounds):
+            runs.append(run_phase(work_dir, env, [SCRIPT, "backup"]))
+            time.sleep(1.1)  # Nazwy backupów mają sekundową rozdzielczość
+        phases["backup"] = summarize(runs, payload_mb, log_file, offsets)
+        phases["backup"]["disk_mb"] = round(sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(os.path.join(work_dir, "backups")) for name in files
+        ) / (1024 * 1024) / args.rounds, 1)
+
+        offsets = [log_offset()]
+        runs = [run_phase(work_dir, env, [SCRIPT, "restore", name, "--latest"]) for name in names]
+        phases["restore"] = summarize(runs, args.size_mb, log_file, offsets)
+        phases["restore"]["seconds_total"] = round(sum(run["seconds"] for run in runs), 3)
+
+        offsets = [log_offset()]
+        snippet = CLEANUP_SNIPPET.format(script_dir=os.path.dirname(SCRIPT))
+        cleanup_file = os.path.join(work_dir, "cleanup.py")
+        with open(cleanup_file, "w", encoding="utf-8") as f:
+            f.write(snippet)
+        runs = [run_phase(work_dir, env, [cleanup_file])]
+        phases["cleanup"] = summarize(runs, 0, log_file, offsets)
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "parameters": {
+                "databases": args.databases, "types": args.types, "size_mb": args.size_mb,
+                "rate_mbps": args.rate_mbps, "stderr_per_mb": args.stderr_per_mb, "data": args.data,
+                "compression": args.compression, "rounds": args.rounds, "host_tools": args.host_tools,
+                "max_parallel": args.max_parallel, "max_per_server": args.max_per_server,
+            },
+            "phases": phases,
+        }
+    finally:
+        if args.keep:
+            print(f"Katalog benchmarku: {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Wypisuje zmiany kluczowych metryk względem wcześniejszego wyniku."""
+    if result["parameters"] != baseline["parameters"]:
+        print("Uwaga: parametry benchmarku różnią się od wyniku bazowego", file=sys.stderr)
+    for phase, metrics in result["phases"].items():
+        old = baseline.get("phases", {}).get(phase, {})
+        for metric in ("seconds_best", "throughput_mb_s", "orchestrator_max_rss_mb", "orchestrator_cpu_seconds"):
+            new_value, old_value = metrics.get(metric), old.get(metric)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value * 100
+            print(f"{phase:<8} {metric:<26} {old_value:>10} -> {new_value:>10}  ({change:+.1f}%)", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark db_backup_restore.py z zastępnikami narzędzi")
+    parser.add_argument("--databases", type=int, default=6, help="liczba baz w konfiguracji")
+    parser.add_argument("--types", default=",".join(DB_TYPES), type=lambda value: value.split(","),
+                        help="typy baz (po kolei), np. postgresql,mariadb")
+    parser.add_argument("--size-mb", type=float, default=64, help="rozmiar dumpa każdej bazy")
+    parser.add_argument("--rate-mbps", type=float, default=0, help="tempo narzędzi dumpa (0 = bez limitu)")
+    parser.add_argument("--stderr-per-mb", type=float, default=10, help="linie postępu na stderr na MB")
+    parser.add_argument("--data", choices=["text", "random"], default="text", help="rodzaj danych dumpa")
+    parser.add_argument("--compression", choices=["zstd", "gzip"], help="kompresja backupów")
+    parser.add_argument("--rounds", type=int, default=3, help="liczba rund backupu")
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument("--max-per-server", type=int, default=2)
+    parser.add_argument("--host-tools", action="store_true", help="narzędzia na hoście zamiast docker exec")
+    parser.add_argument("--output", help="zapisz wynik JSON do pliku")
+    parser.add_argument("--compare", help="porównaj z wcześniejszym wynikiem JSON")
+    parser.add_argument("--keep", action="store_true", help="nie usuwaj katalogu benchmarku")
+    args = parser.parse_args()
+    for db_type in args.types:
+        if db_type not in DB_TYPES:
+            parser.error(f"nieznany typ bazy: {db_type}")
+
+    result = run_benchmark(args)
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
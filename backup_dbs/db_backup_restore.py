@@ -1,14 +1,68 @@
 #!/usr/bin/env python3
+import asyncio
+import collections
+import contextvars
+import fcntl
+import hashlib
+import hmac
+import http.client
 import subprocess
 import os
+import re
+import signal
+import sqlite3
+import statistics
 import sys
 import json
+import shutil
+import tempfile
+import time
+import threading
 import logging
-from datetime import datetime
-from typing import Optional, Dict, List, Any
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, closing, contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Tuple, Callable
+from urllib.parse import quote, urlsplit
 
 CONFIG_FILE = "config.json"
 LOG_FILE = "backup.log"
+STATE_FILE = "backup_state.json"  # Znaczniki zmian z ostatnich udanych backupów
+CATALOG_FILE = "backup_catalog.sqlite"  # Katalog wszystkich wykonanych backupów
+LOCK_FILE = "backup.lock"  # Blokada wykluczająca równoczesne backupy (CLI, cron, backup_service.py)
+DEFAULT_KEEP_BACKUPS = 3
+DEFAULT_TIMEOUT = 3600  # 1 godzina timeout (gdy brak historii backupów bazy)
+HISTORY_RUNS = 10  # Ile ostatnich przebiegów brać pod uwagę przy planowaniu
+TIMEOUT_MARGIN = 3  # Timeout = margines x najdłuższy udany przebieg z historii
+MIN_ADAPTIVE_TIMEOUT = 300
+MAX_ADAPTIVE_TIMEOUT = 6 * 3600
+ANOMALY_FACTOR = 3  # Przebieg ANOMALY_FACTOR razy dłuższy/większy od mediany to anomalia
+ANOMALY_MIN_SECONDS = 5  # Krótszych backupów nie oznaczamy jako anomalie czasu
+DEFAULT_MAX_PARALLEL = 4
+DEFAULT_MAX_PER_SERVER = 2
+DEFAULT_MAX_VERIFY_PARALLEL = 2
+DEFAULT_READINESS_TIMEOUT = 120
+READINESS_INTERVAL = 1
+STREAM_CHUNK_SIZE = 64 * 1024
+SINK_CHUNK_SIZE = 1024 * 1024
+OUTPUT_TAIL_LINES = 50  # Ile ostatnich linii wyjścia procesu trzymać do raportu błędu
+OUTPUT_LINE_LIMIT = 1000  # Dłuższe linie są obcinane
+PROGRESS_INTERVAL = 10  # Co ile sekund logować bieżący postęp narzędzia
+TERMINATE_GRACE = 5  # Czas na zakończenie po SIGTERM zanim grupa procesów dostanie SIGKILL
+WAL_RECEIVE_RETRY = 10  # Przerwa przed ponownym uruchomieniem pg_receivewal po błędzie
+REMOTE_PART_SIZE_MB = 16
+REMOTE_MIN_PART_SIZE = 5 * 1024 * 1024  # Minimalny rozmiar części multipart w S3 (poza ostatnią)
+REMOTE_PARALLEL_PARTS = 4
+REMOTE_RETRIES = 3
+REMOTE_TIMEOUT = 300
+UPLOAD_STATE_SUFFIX = ".upload.json"  # Stan niedokończonego wysyłania (upload_id, wysłane części)
+TOC_SUFFIX = ".toc.json"  # Spis tabel backupu (przywracanie wybranych tabel)
+
+# Timeout poleceń bieżącego backupu - ustawiany z historii dla każdej bazy (None = bez limitu)
+dump_timeout: contextvars.ContextVar = contextvars.ContextVar("dump_timeout", default=DEFAULT_TIMEOUT)
+# Nazwa bazy, której dotyczy bieżące zadanie - pozwala przypisać logi do bazy (backup_service.py)
+current_database: contextvars.ContextVar = contextvars.ContextVar("current_database", default=None)
 
 logging.basicConfig(
     filename=LOG_FILE,
@@ -42,6 +96,13 @@ def load_config() -> Dict[str, Any]:
         if not isinstance(config["databases"], list):
             logging.error("Sekcja 'databases' musi być listą")
             sys.exit(1)
+
+        # Wspólne ustawienia kopii zdalnej; baza może je nadpisać słownikiem lub wyłączyć przez "remote": false
+        if config.get("remote"):
+            for db in config["databases"]:
+                if db.get("remote", True) is not False:
+                    overrides = db["remote"] if isinstance(db.get("remote"), dict) else {}
+                    db["remote"] = {**config["remote"], **overrides}
         
         return config
     except json.JSONDecodeError as e:
@@ -52,51 +113,366 @@ def load_config() -> Dict[str, Any]:
         sys.exit(1)
 
 
+def select_databases(config: Dict[str, Any], names: List[str]) -> Dict[str, Any]:
+    """Kopia konfiguracji ograniczona do baz o podanych nazwach (pusta lista = wszystkie)."""
+    if not names:
+        return config
+    known = {db.get("name") for db in config["databases"]}
+    for name in names:
+        if name not in known:
+            logging.error(f"Nie znaleziono bazy o nazwie '{name}' w konfiguracji.")
+    return {**config, "databases": [db for db in config["databases"] if db.get("name") in names]}
+
+
+def acquire_backup_lock() -> Optional[Any]:
+    """Zakłada blokadę flock na LOCK_FILE - zwalnia ją zamknięcie pliku, także gdy proces zginie.
+
+    Zwraca otwarty plik blokady albo None, gdy blokadę trzyma inny backup.
+    """
+    lock_file = open(LOCK_FILE, "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    lock_file.truncate(0)
+    lock_file.write(f"{os.getpid()}\n")
+    lock_file.flush()
+    return lock_file
+
+
 def run_cmd(cmd: List[str], env: Optional[Dict[str, str]] = None) -> bool:
     """Uruchamia proces i loguje wyjście, zwraca True jeśli zakończony sukcesem."""
-    # Nie logujemy pełnej komendy w przypadku haseł w zmiennych środowiskowych
-    safe_cmd = " ".join(cmd)
+    return run_pipeline([cmd], env)
+
+
+OPENSSL_FLAGS = ("-pass", "-pbkdf2")  # Nie mylić z hasłem MariaDB podanym jako -p<hasło>
+
+
+def mask_cmd(cmd: List[str]) -> str:
+    """Zwraca polecenie do logów z ukrytymi hasłami przekazanymi jako parametry."""
+    masked = []
+    for i, arg in enumerate(cmd):
+        if i > 0 and cmd[i - 1] == "--password":
+            masked.append("***")
+        elif arg in OPENSSL_FLAGS:
+            masked.append(arg)
+        elif i > 0 and cmd[i - 1] == "-pass" and arg.startswith("pass:"):
+            masked.append("pass:***")
+        elif arg.startswith("-p") and len(arg) > 2 and not arg[2:].isdigit():
+            masked.append("-p***")
+        else:
+            masked.append(arg)
+    return " ".join(masked)
+
+
+class OutputTail:
+    """Bufor pierścieniowy z ostatnimi liniami wyjścia procesu - pamięć nie rośnie z ilością logów."""
+
+    def __init__(self, max_lines: int = OUTPUT_TAIL_LINES):
+        self.lines: collections.deque = collections.deque(maxlen=max_lines)
+        self.partial = b""
+        self.total_lines = 0
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """Dodaje fragment strumienia, zwraca kompletne linie z tego fragmentu."""
+        *complete, partial = (self.partial + chunk).split(b"\n")
+        self.partial = partial[:OUTPUT_LINE_LIMIT]
+        lines = [line[:OUTPUT_LINE_LIMIT].decode(errors="replace").rstrip("\r") for line in complete]
+        self.lines.extend(lines)
+        self.total_lines += len(lines)
+        return lines
+
+    def close(self) -> None:
+        if self.partial:
+            self.feed(b"\n")
+
+    def text(self) -> str:
+        skipped = self.total_lines - len(self.lines)
+        prefix = f"(pominięto {skipped} wcześniejszych linii)\n" if skipped else ""
+        return prefix + "\n".join(self.lines)
+
+
+def process_label(cmd: List[str]) -> str:
+    """Krótka nazwa narzędzia do logów postępu (dla docker exec - program w kontenerze)."""
+    if len(cmd) > 2 and cmd[0] == "docker" and cmd[1] == "exec":
+        args = [arg for arg in cmd[2:] if not arg.startswith("-")]
+        if len(args) > 1:
+            return os.path.basename(args[1])
+    return os.path.basename(cmd[0])
+
+
+async def pump_output(stream: asyncio.StreamReader, tail: OutputTail, label: str, progress: bool) -> None:
+    """Czyta strumień procesu kawałkami do bufora; co PROGRESS_INTERVAL loguje ostatnią linię."""
+    last_progress = time.monotonic()
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = tail.feed(chunk)
+        for line in lines:
+            logging.debug(f"[{label}] {line}")
+        if progress and lines and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            logging.info(f"[{label}] {lines[-1]}")
+            last_progress = time.monotonic()
+    tail.close()
+
+
+async def copy_output(stream: asyncio.StreamReader, file: Any, digest: Any,
+                      upload: Optional["RemoteUpload"] = None) -> None:
+    """Przepisuje strumień do pliku, w tym samym przebiegu licząc sumę kontrolną i wysyłając go do S3."""
+    while True:
+        chunk = await stream.read(SINK_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        file.write(chunk)
+        if upload is not None:
+            await upload.write(chunk)
+
+
+def signal_process_group(proc: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def terminate_processes(procs: List[asyncio.subprocess.Process]) -> None:
+    """Kończy całe grupy procesów: SIGTERM, a po TERMINATE_GRACE sekundach SIGKILL."""
+    running = [proc for proc in procs if proc.returncode is None]
+    for proc in running:
+        signal_process_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(asyncio.gather(*(proc.wait() for proc in running)), TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        for proc in running:
+            signal_process_group(proc, signal.SIGKILL)
+        await asyncio.gather(*(proc.wait() for proc in running))
+
+
+async def run_pipeline_async(cmds: List[List[str]], env: Optional[Dict[str, str]] = None,
+                             stdin_file: Optional[Any] = None, stdout_file: Optional[Any] = None,
+                             timeout: Optional[float] = None, digest: Optional[Any] = None,
+                             upload: Optional["RemoteUpload"] = None, partial_read: bool = False) -> bool:
+    """Uruchamia potok procesów (cmd1 | cmd2 | ...) bez kopiowania danych przez Pythona.
+
+    Procesy są łączone bezpośrednio przez os.pipe(), stdin pierwszego procesu
+    może być plikiem, a stdout ostatniego trafia do stdout_file.
+    stderr czytany jest strumieniowo: do logów trafia bieżący postęp, a przy błędzie
+    ostatnie linie z bufora. Każdy proces działa we własnej grupie, więc przy timeoucie
+    kończone są także jego procesy potomne. Bez podanego timeoutu obowiązuje dump_timeout.
+    Z podanym digest (np. hashlib.sha256()) wyjście trafia do stdout_file przez Pythona,
+    który liczy sumę kontrolną bez ponownego czytania pliku (i opcjonalnie wysyła je do S3).
+    Zwraca True tylko jeśli wszystkie procesy zakończyły się sukcesem. Z partial_read ostatni
+    proces może skończyć czytanie wcześniej - błędy zapisu wcześniejszych procesów są wtedy pomijane.
+    """
+    if timeout is None:
+        timeout = dump_timeout.get()
+    safe_cmd = " | ".join(mask_cmd(cmd) for cmd in cmds)
     logging.info(f"Uruchamiam polecenie: {safe_cmd}")
-    
+
+    procs = []
+    next_stdin = stdin_file if stdin_file is not None else asyncio.subprocess.DEVNULL
+    started = time.monotonic()
     try:
-        result = subprocess.run(
-            cmd, 
-            stdout=subprocess.PIPE, 
-            stderr=subprocess.PIPE, 
-            env=env, 
-            text=True,
-            timeout=3600  # 1 godzina timeout
-        )
-        
-        if result.returncode == 0:
-            logging.info(f"Pomyślnie wykonano: {safe_cmd}")
-            if result.stdout:
-                logging.debug(f"stdout: {result.stdout}")
-            return True
-        else:
-            logging.error(f"Błąd wykonania: {safe_cmd}")
-            logging.error(f"Kod wyjścia: {result.returncode}")
-            if result.stdout:
-                logging.error(f"stdout: {result.stdout}")
-            if result.stderr:
-                logging.error(f"stderr: {result.stderr}")
-            return False
-    except subprocess.TimeoutExpired:
-        logging.error(f"Timeout podczas wykonywania komendy: {safe_cmd}")
-        return False
-    except FileNotFoundError:
-        logging.error(f"Nie znaleziono programu: {cmd[0]}")
+        for i, cmd in enumerate(cmds):
+            last = i == len(cmds) - 1
+            read_fd, write_fd = (None, None) if last else os.pipe()
+            if last:
+                stdout = stdout_file if stdout_file is not None and digest is None else asyncio.subprocess.PIPE
+            else:
+                stdout = write_fd
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=next_stdin, stdout=stdout, stderr=asyncio.subprocess.PIPE, env=env,
+                    start_new_session=True
+                )
+            finally:
+                # Deskryptory potoku należą już do procesów potomnych
+                if write_fd is not None:
+                    os.close(write_fd)
+                if isinstance(next_stdin, int) and next_stdin >= 0:
+                    os.close(next_stdin)
+            procs.append(proc)
+            next_stdin = read_fd
+    except FileNotFoundError as e:
+        logging.error(f"Nie znaleziono programu: {e.filename or cmds[len(procs)][0]}")
+        await terminate_processes(procs)
         return False
     except Exception as e:
         logging.error(f"Wyjątek podczas wykonywania komendy {safe_cmd}: {e}")
+        await terminate_processes(procs)
         return False
 
+    stderr_tails = [OutputTail() for _ in procs]
+    stdout_tail = OutputTail()
+    finished_at: List[Optional[float]] = [None] * len(procs)
+
+    async def supervise(index: int, proc: asyncio.subprocess.Process) -> None:
+        label = process_label(cmds[index])
+        readers = [pump_output(proc.stderr, stderr_tails[index], label, progress=True)]
+        if proc.stdout is not None and digest is not None and stdout_file is not None:
+            readers.append(copy_output(proc.stdout, stdout_file, digest, upload))
+        elif proc.stdout is not None:
+            readers.append(pump_output(proc.stdout, stdout_tail, label, progress=False))
+        await asyncio.gather(*readers)
+        await proc.wait()
+        finished_at[index] = time.monotonic() - started
+
+    tasks = [asyncio.ensure_future(supervise(i, proc)) for i, proc in enumerate(procs)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        await terminate_processes(procs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        logging.error(f"Timeout ({timeout}s) podczas wykonywania komendy: {safe_cmd}")
+        for cmd, tail in zip(cmds, stderr_tails):
+            if tail.lines:
+                logging.error(f"stderr {process_label(cmd)} (ostatnie linie):\n{tail.text()}")
+        return False
+
+    success = True
+    for cmd, proc, tail in zip(cmds, procs, stderr_tails):
+        if proc.returncode == 0:
+            continue
+        if partial_read and proc is not procs[-1] and procs[-1].returncode == 0:
+            continue
+        success = False
+        logging.error(f"Błąd wykonania: {mask_cmd(cmd)}")
+        logging.error(f"Kod wyjścia: {proc.returncode}")
+        if proc is procs[-1] and stdout_tail.lines:
+            logging.error(f"stdout (ostatnie linie):\n{stdout_tail.text()}")
+        if tail.lines:
+            logging.error(f"stderr (ostatnie linie):\n{tail.text()}")
+
+    if success:
+        stages = ", ".join(f"{process_label(cmd)} {seconds:.1f}s" for cmd, seconds in zip(cmds, finished_at))
+        logging.info(f"Pomyślnie wykonano: {safe_cmd} (czas: {stages})")
+    return success
+
+
+async def run_cmd_async(cmd: List[str], env: Optional[Dict[str, str]] = None,
+                        stdout_file: Optional[Any] = None, timeout: Optional[float] = None) -> bool:
+    """Asynchroniczny odpowiednik run_cmd - pozwala uruchamiać wiele dumpów jednocześnie.
+
+    Jeśli podano stdout_file, wyjście procesu trafia bezpośrednio do pliku.
+    """
+    return await run_pipeline_async([cmd], env, stdout_file=stdout_file, timeout=timeout)
+
+
+def run_pipeline(cmds: List[List[str]], env: Optional[Dict[str, str]] = None,
+                 stdin_file: Optional[Any] = None, stdout_file: Optional[Any] = None,
+                 timeout: Optional[float] = None, partial_read: bool = False) -> bool:
+    """Synchroniczna wersja run_pipeline_async dla przywracania."""
+    return asyncio.run(run_pipeline_async(cmds, env, stdin_file, stdout_file, timeout, partial_read=partial_read))
+
+
+COMPRESSION_EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def get_compression(db: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Zwraca ustawienia kompresji bazy ("zstd"/"gzip" lub słownik z method/level/threads)."""
+    compression = db.get("compression")
+    if not compression:
+        return None
+    if isinstance(compression, str):
+        compression = {"method": compression}
+    method = compression.get("method", "zstd").lower()
+    if method not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Nieobsługiwana metoda kompresji: {method}")
+    return {
+        "method": method,
+        "level": compression.get("level", 3 if method == "zstd" else 6),
+        "threads": compression.get("threads", 0),
+    }
+
+
+def compress_cmd(compression: Dict[str, Any]) -> List[str]:
+    """Polecenie kompresujące stdin na stdout."""
+    if compression["method"] == "zstd":
+        # -T0 = wszystkie rdzenie
+        return ["zstd", "-q", f"-{compression['level']}", f"-T{compression['threads']}", "-c"]
+    if shutil.which("pigz"):
+        cmd = ["pigz", f"-{compression['level']}", "-c"]
+        if compression["threads"]:
+            cmd[1:1] = ["-p", str(compression["threads"])]
+        return cmd
+    return ["gzip", f"-{compression['level']}", "-c"]
+
+
+def compression_of_file(path: str) -> Optional[str]:
+    """Rozpoznaje metodę kompresji pliku backupu po rozszerzeniu."""
+    if path.endswith(ENCRYPTION_EXTENSION):
+        path = path[:-len(ENCRYPTION_EXTENSION)]
+    for method, extension in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(extension):
+            return method
+    return None
+
+
+def decompress_cmd(path: str, from_stdin: bool = False) -> Optional[List[str]]:
+    """Polecenie dekompresujące plik backupu (lub stdin) na stdout (None dla plików bez kompresji)."""
+    method = compression_of_file(path)
+    source = [] if from_stdin else [path]
+    if method == "zstd":
+        return ["zstd", "-q", "-d", "-c"] + source
+    if method == "gzip":
+        return ["pigz" if shutil.which("pigz") else "gzip", "-d", "-c"] + source
+    return None
+
+
+ENCRYPTION_EXTENSION = ".enc"
+CHECKSUM_SUFFIX = ".sha256"
+# AES-256 w trybie strumieniowym, klucz wyprowadzany z hasła/pliku klucza przez PBKDF2
+OPENSSL_ENC_ARGS = ["-aes-256-ctr", "-pbkdf2", "-iter", "200000", "-md", "sha256"]
+
+
+def encryption_pass(db: Dict[str, Any]) -> Optional[str]:
+    """Źródło hasła dla openssl (-pass) z ustawienia encryption: key_file albo passphrase_env."""
+    encryption = db.get("encryption")
+    if not encryption:
+        return None
+    if encryption.get("key_file"):
+        return f"file:{encryption['key_file']}"
+    if encryption.get("passphrase_env"):
+        return f"env:{encryption['passphrase_env']}"
+    raise ValueError("Ustawienie 'encryption' wymaga 'key_file' lub 'passphrase_env'")
+
+
+def encrypt_cmd(password: str) -> List[str]:
+    """Polecenie szyfrujące stdin na stdout."""
+    return ["openssl", "enc", "-e", "-salt"] + OPENSSL_ENC_ARGS + ["-pass", password]
+
+
+def read_backup_cmds(db: Dict[str, Any], path: str, from_stdin: bool = False) -> List[List[str]]:
+    """Polecenia odtwarzające surowy strumień dumpa z pliku lub stdin (odszyfrowanie, dekompresja).
+
+    Pusta lista oznacza zwykły plik, który można podać bezpośrednio na stdin.
+    """
+    cmds = []
+    if path.endswith(ENCRYPTION_EXTENSION):
+        password = encryption_pass(db)
+        if password is None:
+            raise ValueError(f"Backup {path} jest zaszyfrowany, a baza nie ma ustawienia 'encryption'")
+        source = [] if from_stdin else ["-in", path]
+        cmds.append(["openssl", "enc", "-d"] + OPENSSL_ENC_ARGS + ["-pass", password] + source)
+    decompress = decompress_cmd(path, from_stdin=from_stdin or bool(cmds))
+    if decompress:
+        cmds.append(decompress)
+    return cmds
+
+
+REQUIRED_DB_FIELDS = ["name", "type", "host", "port", "database", "backup_path"]
+
 
 def validate_db_config(db: Dict[str, Any]) -> bool:
     """Waliduje konfigurację bazy danych."""
-    required_fields = ["name", "type", "host", "port", "database", "backup_path"]
-    
-    for field in required_fields:
+    for field in REQUIRED_DB_FIELDS:
         if field not in db:
             logging.error(f"Brak wymaganego pola '{field}' w konfiguracji bazy {db.get('name', 'unknown')}")
             return False
@@ -108,473 +484,2910 @@ def validate_db_config(db: Dict[str, Any]) -> bool:
     return True
 
 
-def backup_mariadb(db: Dict[str, Any]) -> bool:
+def backup_file_path(db: Dict[str, Any], extension: str) -> str:
+    """Ścieżka nowego pliku backupu, z rozszerzeniem kompresji jeśli jest włączona."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    compression = get_compression(db)
+    if compression:
+        extension += COMPRESSION_EXTENSIONS[compression["method"]]
+    if encryption_pass(db):
+        extension += ENCRYPTION_EXTENSION
+    return os.path.join(db['backup_path'], f"{db['database']}_{timestamp}{extension}")
+
+
+def table_exclusion_args(db: Dict[str, Any]) -> List[str]:
+    """Natywne opcje narzędzi dumpa dla exclude_tables (całe tabele) i exclude_table_data (tylko dane)."""
+    exclude_tables = db.get("exclude_tables", [])
+    exclude_data = db.get("exclude_table_data", [])
+    db_type = db["type"].lower()
+    if db_type == "postgresql":
+        # Wzorce pg_dump, np. "public.spend_logs" lub '"LiteLLM_SpendLogs"'
+        return ([f"--exclude-table={table}" for table in exclude_tables]
+                + [f"--exclude-table-data={table}" for table in exclude_data])
+    if db_type == "mariadb":
+        return ([f"--ignore-table={db['database']}.{table}" for table in exclude_tables]
+                + [f"--ignore-table-data={db['database']}.{table}" for table in exclude_data])
+    # MongoDB nie ma schematu poza indeksami - wykluczenie danych wyklucza całą kolekcję
+    return [f"--excludeCollection={collection}" for collection in exclude_tables + exclude_data]
+
+
+async def write_dump(db: Dict[str, Any], cmd: List[str], backup_file: str,
+                     env: Optional[Dict[str, str]] = None, remote: bool = True,
+                     index: Optional["MariadbDumpIndex"] = None) -> bool:
+    """Zapisuje stdout dumpa do pliku w jednym przebiegu: kompresja, szyfrowanie i suma kontrolna.
+
+    Każdy etap to osobny proces (zstd -T0 używa wielu rdzeni), a SHA-256 zapisanego
+    pliku liczone jest w locie i trafia do pliku <backup>.sha256. Przy ustawieniu
+    'remote' te same dane są równolegle wysyłane do S3 w częściach multipart.
+    Podany index dostaje zapisywane dane (tylko dla pliku bez kompresji i szyfrowania).
+    """
+    cmds = [cmd]
+    compression = get_compression(db)
+    if compression:
+        cmds.append(compress_cmd(compression))
+    password = encryption_pass(db)
+    if password:
+        cmds.append(encrypt_cmd(password))
+
+    upload = None
+    if remote and remote_settings(db):
+        upload = RemoteUpload(db, backup_file)
+        await upload.start()
+
+    digest = hashlib.sha256()
+    success = False
+    try:
+        with open(backup_file, "wb") as f:
+            sink = index.chained(digest) if index is not None and len(cmds) == 1 else digest
+            success = await run_pipeline_async(cmds, env, stdout_file=f, digest=sink, upload=upload)
+    finally:
+        if upload is not None and not success:
+            await upload.abort()
+    if success:
+        with open(backup_file + CHECKSUM_SUFFIX, "w", encoding="utf-8") as f:
+            f.write(f"{digest.hexdigest()}  {os.path.basename(backup_file)}\n")
+        if upload is not None:
+            # Błąd wysyłania nie unieważnia backupu lokalnego - zostanie wznowione z pliku
+            await upload.finish()
+    return success
+
+
+async def finish_backup(db: Dict[str, Any], backup_file: str, success: bool) -> bool:
+    """Loguje wynik backupu, rejestruje go w katalogu i czyści stare backupy lub usuwa niepełny plik."""
+    if success:
+        file_size = os.path.getsize(backup_file)
+        logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar pliku: {file_size} bajtów")
+        await register_backup(db, backup_file)
+        return True
+
+    logging.error(f"Błąd podczas backupu bazy {db['database']}")
+    # Usuń niepełny plik backup
+    if os.path.exists(backup_file):
+        os.remove(backup_file)
+    return False
+
+
+def restore_from_file(db: Dict[str, Any], cmd: List[str], backup_file: str,
+                      env: Optional[Dict[str, str]] = None, stdout_file: Optional[Any] = None,
+                      filters: Optional[List[List[str]]] = None, partial_read: bool = False) -> bool:
+    """Przekazuje plik backupu na stdin klienta, odszyfrowując i dekompresując go w locie jeśli trzeba.
+
+    filters to dodatkowe procesy między odczytem backupu a klientem (np. wybór tabel).
+    """
+    if is_remote(backup_file):
+        return restore_from_remote(db, cmd, backup_file, env, stdout_file, filters, partial_read)
+    read_cmds = read_backup_cmds(db, backup_file)
+    cmds = read_cmds + (filters or []) + [cmd]
+    if read_cmds:
+        return run_pipeline(cmds, env, stdout_file=stdout_file, partial_read=partial_read)
+    with open(backup_file, "rb") as f:
+        return run_pipeline(cmds, env, stdin_file=f, stdout_file=stdout_file, partial_read=partial_read)
+
+
+# --- Profil szybkiego przywracania (fast_restore) ---
+#
+# Ustawienia sesji klienta (PGOPTIONS / --init-command) oraz - opcjonalnie - serwera na czas
+# przywracania. Ustawienia serwera są zawsze przywracane po zakończeniu, także po błędzie.
+
+FAST_RESTORE_DEFAULTS = {"maintenance_work_mem": "1GB", "server_settings": True}
+# Przeładowywane bez restartu (SIGHUP); mniej checkpointów w trakcie ładowania danych
+PG_FAST_SERVER_SETTINGS = {"max_wal_size": "16GB", "checkpoint_timeout": "30min"}
+# Zapis logu InnoDB raz na sekundę zamiast przy każdym commicie, bez fsync binlogu
+MARIADB_FAST_SERVER_SETTINGS = {"innodb_flush_log_at_trx_commit": "2", "sync_binlog": "0"}
+MARIADB_FAST_SESSION = "SET SESSION foreign_key_checks=0, unique_checks=0"
+
+# Ustawienia serwera są wspólne dla równoległych przywracań na tym samym serwerze:
+# pierwsze przywracanie je włącza i zapamiętuje poprzednie wartości, ostatnie je przywraca.
+_fast_profiles_lock = threading.Lock()
+_fast_profiles: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+
+def fast_restore_settings(db: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Ustawienia profilu fast_restore (true lub słownik nadpisujący wartości domyślne), None gdy wyłączony."""
+    fast = db.get("fast_restore")
+    if not fast:
+        return None
+    return {**FAST_RESTORE_DEFAULTS, **(fast if isinstance(fast, dict) else {})}
+
+
+def pg_fast_session_env(db: Dict[str, Any], env: Dict[str, str], cmd: List[str]) -> List[str]:
+    """Ustawia PGOPTIONS sesji pg_restore (bez czekania na zapis WAL, więcej pamięci na indeksy).
+
+    Przy docker exec zmienna jest przekazywana do kontenera przez -e PGOPTIONS.
+    """
+    settings = fast_restore_settings(db)
+    env["PGOPTIONS"] = f"-c synchronous_commit=off -c maintenance_work_mem={settings['maintenance_work_mem']}"
+    if cmd[:2] == ["docker", "exec"]:
+        return cmd[:2] + ["-e", "PGOPTIONS"] + cmd[2:]
+    return cmd
+
+
+def mariadb_fast_session_args(db: Dict[str, Any]) -> List[str]:
+    """Opcje klienta MariaDB dla profilu fast_restore (sesja bez sprawdzania FK i unikalności)."""
+    return [f"--init-command={MARIADB_FAST_SESSION}"] if fast_restore_settings(db) else []
+
+
+async def pg_server_settings(db: Dict[str, Any], env: Dict[str, str],
+                             settings: Dict[str, Optional[str]]) -> bool:
+    """ALTER SYSTEM SET/RESET podanych ustawień i przeładowanie konfiguracji (każde polecenie osobno)."""
+    statements = [f"ALTER SYSTEM SET {name} = '{value}'" if value is not None else f"ALTER SYSTEM RESET {name}"
+                  for name, value in settings.items()]
+    cmd = pg_query_cmd(db, statements[0])
+    for statement in statements[1:] + ["SELECT pg_reload_conf()"]:
+        cmd += ["-c", statement]
+    return await run_query_async(cmd, env, timeout=60) is not None
+
+
+async def pg_apply_fast_settings(db: Dict[str, Any], env: Dict[str, str]) -> Optional[Dict[str, Optional[str]]]:
+    """Włącza ustawienia serwera PostgreSQL; zwraca poprzednie wartości z postgresql.auto.conf."""
+    names = ", ".join(f"'{name}'" for name in PG_FAST_SERVER_SETTINGS)
+    output = await run_query_async(pg_query_cmd(
+        db, "SELECT name, setting FROM pg_file_settings "
+            f"WHERE sourcefile LIKE '%postgresql.auto.conf' AND name IN ({names})"
+    ), env, timeout=60)
+    if output is None:
+        return None
+    previous: Dict[str, Optional[str]] = {name: None for name in PG_FAST_SERVER_SETTINGS}
+    previous.update(line.split("|", 1) for line in output.splitlines() if "|" in line)
+    if not await pg_server_settings(db, env, PG_FAST_SERVER_SETTINGS):
+        return None
+    return previous
+
+
+async def mariadb_apply_fast_settings(db: Dict[str, Any], env: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Włącza ustawienia globalne MariaDB; zwraca ich poprzednie wartości."""
+    names = list(MARIADB_FAST_SERVER_SETTINGS)
+    output = await run_query_async(mariadb_cmd(db, "client", [
+        "--batch", "--skip-column-names", "-e", "SELECT " + ", ".join(f"@@GLOBAL.{name}" for name in names)
+    ]), env, timeout=60)
+    values = output.strip().split("\t") if output else []
+    if len(values) != len(names):
+        return None
+    if not await mariadb_server_settings(db, env, MARIADB_FAST_SERVER_SETTINGS):
+        return None
+    return dict(zip(names, values))
+
+
+async def mariadb_server_settings(db: Dict[str, Any], env: Dict[str, str], settings: Dict[str, str]) -> bool:
+    statement = "SET " + ", ".join(f"GLOBAL {name} = {value}" for name, value in settings.items())
+    return await run_query_async(mariadb_cmd(db, "client", ["-e", statement]), env, timeout=60) is not None
+
+
+@contextmanager
+def fast_restore_profile(db: Dict[str, Any], env: Dict[str, str]):
+    """Ustawienia serwera profilu fast_restore na czas bloku (wymagają uprawnień superużytkownika).
+
+    Bez uprawnień przywracanie korzysta tylko z ustawień sesji. Równoległe przywracania na jednym
+    serwerze współdzielą ustawienia - poprzednie wartości wracają po zakończeniu ostatniego z nich.
+    """
+    settings = fast_restore_settings(db)
+    if not (settings and settings["server_settings"]):
+        yield
+        return
+
+    key = server_key(db)
+    postgresql = db["type"].lower() == "postgresql"
+    with _fast_profiles_lock:
+        profile = _fast_profiles.get(key)
+        if profile is not None:
+            profile["users"] += 1
+        else:
+            apply = pg_apply_fast_settings if postgresql else mariadb_apply_fast_settings
+            previous = asyncio.run(apply(db, env))
+            if previous is None:
+                logging.warning(f"Nie udało się zmienić ustawień serwera dla bazy {db['name']} - używam tylko ustawień sesji")
+            else:
+                logging.info(f"Profil szybkiego przywracania: ustawienia serwera "
+                             f"{PG_FAST_SERVER_SETTINGS if postgresql else MARIADB_FAST_SERVER_SETTINGS}")
+                profile = _fast_profiles[key] = {"users": 1, "previous": previous}
+    try:
+        yield
+    finally:
+        if profile is not None:
+            with _fast_profiles_lock:
+                profile["users"] -= 1
+                if profile["users"] == 0:
+                    del _fast_profiles[key]
+                    revert = pg_server_settings if postgresql else mariadb_server_settings
+                    if asyncio.run(revert(db, env, profile["previous"])):
+                        logging.info(f"Przywrócono poprzednie ustawienia serwera dla bazy {db['name']}")
+                    else:
+                        logging.error(f"Nie udało się przywrócić ustawień serwera dla bazy {db['name']}: "
+                                      f"{profile['previous']}")
+
+
+async def analyze_database(db: Dict[str, Any], env: Dict[str, str]) -> bool:
+    """Odświeża statystyki planera po przywróceniu (ANALYZE / ANALYZE TABLE)."""
+    if db["type"].lower() == "postgresql":
+        return await run_query_async(pg_query_cmd(db, "ANALYZE"), env) is not None
+    output = await run_query_async(mariadb_cmd(db, "client", [
+        "--batch", "--skip-column-names", "-e",
+        f"SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db['database']}' "
+        "AND TABLE_TYPE = 'BASE TABLE'"
+    ]), env)
+    if output is None:
+        return False
+    tables = [line.split("\t")[0] for line in output.splitlines() if line]
+    if not tables:
+        return True
+    statement = "ANALYZE TABLE " + ", ".join(f"`{table}`" for table in tables)
+    return await run_query_async(mariadb_cmd(db, "client", [db['database'], "-e", statement]), env) is not None
+
+
+def timed_phase(phases: List[Tuple[str, float]], name: str, action: Callable[[], bool]) -> bool:
+    """Wykonuje etap przywracania i zapisuje jego czas."""
+    started = time.monotonic()
+    success = action()
+    phases.append((name, time.monotonic() - started))
+    return success
+
+
+def log_phases(db: Dict[str, Any], phases: List[Tuple[str, float]]) -> None:
+    logging.info(f"Przywracanie bazy {db['database']}: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in phases))
+
+
+def mariadb_env(db: Dict[str, Any]) -> Dict[str, str]:
+    """Środowisko z hasłem dla narzędzi MariaDB na hoście."""
+    # Bezpieczne przekazanie hasła przez zmienną środowiskową
+    env = os.environ.copy()
+    env['MYSQL_PWD'] = db.get('password', '')
+    return env
+
+
+def mariadb_cmd(db: Dict[str, Any], tool: str, args: List[str]) -> List[str]:
+    """Buduje polecenie narzędzia MariaDB ("dump" lub "client") na hoście lub przez docker exec."""
+    # Sprawdź czy używać docker exec
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        # Dla docker exec musimy przekazać hasło jako parametr -p (niebezpieczne ale w kontenerze)
+        # W nowszych wersjach MariaDB, mysqldump jest aliasem dla mariadb-dump
+        return [
+            "docker", "exec", "-i",
+            db['docker_container'],
+            "mariadb-dump" if tool == "dump" else "mariadb",
+            "-h", "localhost",  # w kontenerze używamy localhost
+            "-P", str(db['port']),
+            "-u", db['user'],
+            f"-p{db.get('password', '')}",  # Hasło jako parametr
+        ] + args
+
+    # Standardowe wywołanie mysqldump/mysql na hoście
+    return [
+        "mysqldump" if tool == "dump" else "mysql",
+        f"--host={db['host']}",
+        f"--port={db['port']}",
+        f"--user={db['user']}",
+    ] + args
+
+
+async def run_query_async(cmd: List[str], env: Optional[Dict[str, str]] = None,
+                          timeout: int = DEFAULT_TIMEOUT) -> Optional[str]:
+    """Uruchamia zapytanie klientem bazy i zwraca jego stdout (None w razie błędu)."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, env=env, start_new_session=True
+        )
+    except FileNotFoundError:
+        logging.error(f"Nie znaleziono programu: {cmd[0]}")
+        return None
+
+    # Wynik zapytania jest potrzebny w całości, stderr trzymamy tylko w ograniczonym buforze
+    stderr_tail = OutputTail()
+    stderr_task = asyncio.ensure_future(pump_output(proc.stderr, stderr_tail, process_label(cmd), progress=False))
+    try:
+        stdout = await asyncio.wait_for(proc.stdout.read(), timeout)
+        await asyncio.wait_for(asyncio.gather(stderr_task, proc.wait()), timeout)
+    except asyncio.TimeoutError:
+        await terminate_processes([proc])
+        stderr_task.cancel()
+        logging.error(f"Timeout podczas wykonywania zapytania: {mask_cmd(cmd)}")
+        return None
+
+    if proc.returncode != 0:
+        logging.error(f"Błąd zapytania: {mask_cmd(cmd)}: {stderr_tail.text()}")
+        return None
+    return stdout.decode(errors="replace")
+
+
+async def backup_mariadb(db: Dict[str, Any]) -> bool:
     """Wykonuje backup bazy MariaDB."""
     if not validate_db_config(db):
         return False
     
     try:
         os.makedirs(db['backup_path'], exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}.sql")
 
-        # Bezpieczne przekazanie hasła przez zmienną środowiskową
-        env = os.environ.copy()
-        env['MYSQL_PWD'] = db.get('password', '')
-        
-        # Sprawdź czy używać docker exec
+        if db.get("mariadb_mode") == "parallel":
+            return await backup_mariadb_parallel(db)
+
+        backup_file = backup_file_path(db, ".sql")
+        cmd = mariadb_cmd(db, "dump", [
+            "--single-transaction",
+            "--routines",
+            "--triggers",
+        ] + table_exclusion_args(db) + [db['database']])
+
         if db.get('use_docker_exec') and db.get('docker_container'):
-            # Dla docker exec musimy przekazać hasło jako parametr -p (niebezpieczne ale w kontenerze)
-            # W nowszych wersjach MariaDB, mysqldump jest aliasem dla mariadb-dump
-            cmd = [
-                "docker", "exec", "-i",
-                db['docker_container'],
-                "mariadb-dump",  # W kontenerze MariaDB używamy mariadb-dump
-                "-h", "localhost",  # w kontenerze używamy localhost
-                "-P", str(db['port']),
-                "-u", db['user'],
-                f"-p{db.get('password', '')}",  # Hasło jako parametr
-                "--single-transaction",
-                "--routines",
-                "--triggers",
-                db['database']
-            ]
-            
             logging.info(f"Backup MariaDB bazy {db['database']} do pliku {backup_file} (używając Docker exec)")
-            
-            # Dla docker exec, przekierujemy stdout do pliku
-            with open(backup_file, "w", encoding="utf-8") as f:
-                result = subprocess.run(
-                    cmd, 
-                    stdout=f, 
-                    stderr=subprocess.PIPE, 
-                    text=True,
-                    timeout=3600
-                )
-            
-            if result.returncode == 0:
-                file_size = os.path.getsize(backup_file)
-                logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar pliku: {file_size} bajtów")
-                cleanup_old_backups(db['backup_path'], db['database'])
-                return True
-            else:
-                logging.error(f"Błąd podczas backupu bazy {db['database']}: {result.stderr}")
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)
-                return False
         else:
-            # Standardowe wywołanie mysqldump na hoście
-            cmd = [
-                "mysqldump",
-                f"--host={db['host']}",
-                f"--port={db['port']}",
-                f"--user={db['user']}",
-                "--single-transaction",
-                "--routines",
-                "--triggers",
-                db['database']
-            ]
-
             logging.info(f"Backup MariaDB bazy {db['database']} do pliku {backup_file}")
+
+        # Wyjście dumpa (binarnie, bez ponownego kodowania) trafia przez kompresor do pliku.
+        # Spis sekcji tabel powstaje w locie tylko dla niezakodowanego pliku - przesunięcia
+        # w skompresowanym pliku są bezużyteczne, wybrane tabele filtruje wtedy awk
+        index = None if get_compression(db) or encryption_pass(db) else MariadbDumpIndex()
+        success = await write_dump(db, cmd, backup_file, mariadb_env(db), index=index)
+        if success and index is not None:
+            write_mariadb_table_of_contents(db, backup_file, index)
+        return await finish_backup(db, backup_file, success)
             
-            with open(backup_file, "w", encoding="utf-8") as f:
-                result = subprocess.run(
-                    cmd, 
-                    stdout=f, 
-                    stderr=subprocess.PIPE, 
-                    env=env, 
-                    text=True,
-                    timeout=3600
-                )
-            
-            if result.returncode == 0:
-                file_size = os.path.getsize(backup_file)
-                logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar pliku: {file_size} bajtów")
-                cleanup_old_backups(db['backup_path'], db['database'])
-                return True
-            else:
-                logging.error(f"Błąd podczas backupu bazy {db['database']}: {result.stderr}")
-                # Usuń niepełny plik backup
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)
-                return False
-            
-    except subprocess.TimeoutExpired:
-        logging.error(f"Timeout podczas backupu bazy {db['database']}")
-        return False
     except Exception as e:
         logging.error(f"Wyjątek podczas backupu MariaDB: {e}")
         return False
 
 
-def restore_mariadb(db: Dict[str, Any], backup_file: str) -> bool:
-    """Przywraca bazę MariaDB z pliku backup."""
+def restore_mariadb(db: Dict[str, Any], backup_file: str, tables: Optional[List[str]] = None) -> bool:
+    """Przywraca bazę MariaDB (lub tylko wybrane tabele) z pliku backup."""
     if not validate_db_config(db):
         return False
     
-    if not os.path.exists(backup_file):
+    if not is_remote(backup_file) and not os.path.exists(backup_file):
         logging.error(f"Plik backup {backup_file} nie istnieje")
         return False
     
     logging.info(f"Przywracanie MariaDB z pliku {backup_file} do bazy {db['database']}")
     
-    env = os.environ.copy()
-    env['MYSQL_PWD'] = db.get('password', '')
-    
-    # Sprawdź czy używać docker exec
     if db.get('use_docker_exec') and db.get('docker_container'):
-        cmd = [
-            "docker", "exec", "-i",
-            db['docker_container'],
-            "mariadb",  # W kontenerze MariaDB używamy mariadb zamiast mysql
-            "-h", "localhost",
-            "-P", str(db['port']),
-            "-u", db['user'],
-            f"-p{db.get('password', '')}",  # Hasło jako parametr
-            db['database']
-        ]
-        
         logging.info(f"Przywracanie MariaDB używając Docker exec")
-        
-        try:
-            with open(backup_file, "r", encoding="utf-8") as f:
-                result = subprocess.run(
-                    cmd, 
-                    stdin=f, 
-                    stderr=subprocess.PIPE, 
-                    env=env, 
-                    text=True,
-                    timeout=3600
-                )
-            
-            if result.returncode == 0:
-                logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
-                restart_container(db.get("docker_container"))
-                return True
-            else:
-                logging.error(f"Błąd podczas przywracania bazy {db['database']}: {result.stderr}")
-                return False
-        except subprocess.TimeoutExpired:
-            logging.error(f"Timeout podczas przywracania bazy {db['database']}")
-            return False
-        except Exception as e:
-            logging.error(f"Wyjątek podczas przywracania MariaDB: {e}")
-            return False
-    else:
-        # Standardowe wywołanie mysql na hoście
-        cmd = [
-            "mysql",
-            f"--host={db['host']}",
-            f"--port={db['port']}",
-            f"--user={db['user']}",
-            db['database']
-        ]
-        
-        try:
-            with open(backup_file, "r", encoding="utf-8") as f:
-                result = subprocess.run(
-                    cmd, 
-                    stdin=f, 
-                    stderr=subprocess.PIPE, 
-                    env=env, 
-                    text=True,
-                    timeout=3600
-                )
-            
-            if result.returncode == 0:
-                logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
-                restart_container(db.get("docker_container"))
-                return True
-            else:
-                logging.error(f"Błąd podczas przywracania bazy {db['database']}: {result.stderr}")
-                return False
-        except subprocess.TimeoutExpired:
-            logging.error(f"Timeout podczas przywracania bazy {db['database']}")
-            return False
-        except Exception as e:
-            logging.error(f"Wyjątek podczas przywracania MariaDB: {e}")
-            return False
 
+    try:
+        env = mariadb_env(db)
+        with fast_restore_profile(db, env):
+            if os.path.isdir(backup_file):
+                success = asyncio.run(restore_mariadb_parallel(db, backup_file, tables))
+            else:
+                client = mariadb_cmd(db, "client", mariadb_fast_session_args(db) + [db['database']])
+                phases: List[Tuple[str, float]] = []
+                success = timed_phase(phases, "przywracanie", lambda: (
+                    restore_mariadb_tables(db, backup_file, tables, client, env) if tables
+                    else restore_from_file(db, client, backup_file, env)
+                ))
+                if success and fast_restore_settings(db):
+                    success = timed_phase(phases, "analyze", lambda: asyncio.run(analyze_database(db, env)))
+                    log_phases(db, phases)
 
-def backup_postgresql(db: Dict[str, Any]) -> bool:
-    """Wykonuje backup bazy PostgreSQL."""
-    if not validate_db_config(db):
+        if success:
+            logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
+            restart_after_restore(db)
+            return True
+        logging.error(f"Błąd podczas przywracania bazy {db['database']}")
+        return False
+    except Exception as e:
+        logging.error(f"Wyjątek podczas przywracania MariaDB: {e}")
         return False
-    
-    try:
-        os.makedirs(db['backup_path'], exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Używamy rozszerzenia .dump dla formatu binarnego
-        backup_file = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}.dump")
 
-        env = os.environ.copy()
-        env['PGPASSWORD'] = db.get('password', '')
 
-        # Sprawdź czy używać docker exec
-        if db.get('use_docker_exec') and db.get('docker_container'):
-            cmd = [
-                "docker", "exec", "-i",
-                db['docker_container'],
-                "pg_dump",
-                "-h", "localhost",  # w kontenerze używamy localhost
-                "-p", str(db['port']),
-                "-U", db.get('user', 'postgres'),
-                "-F", "c",  # format custom (binary)
-                "-b",       # include blobs
-                "-v",       # verbose
-                db['database']
-            ]
-            
+# --- Równoległy backup MariaDB (układ podobny do mydumper/myloader) ---
+#
+# <database>_<timestamp>.mydump/
+#   metadata.json       - lista tabel, rozmiary, czasy
+#   schema-pre.sql      - CREATE TABLE bez indeksów wtórnych i kluczy obcych
+#   data/<tabela>.sql   - dane tabel (opcjonalnie .zst/.gz)
+#   schema-post.sql     - ALTER TABLE ... ADD KEY/CONSTRAINT, jedna linia na tabelę
+#   routines.sql        - procedury, funkcje i triggery (po danych)
+
+MARIADB_DATA_MARKER = b"\n-- Dumping data for table `"
+MARIADB_START_TIMEOUT = 60
+MARIADB_TRX_POLL_INTERVAL = 0.05  # Sprawdzanie INNODB_TRX, gdy zapis jest zablokowany
+
+
+def split_create_table(statement: str) -> Tuple[str, Optional[str]]:
+    """Dzieli CREATE TABLE na wersję bez indeksów wtórnych/FK oraz ALTER TABLE dodający je po danych."""
+    lines = statement.split("\n")
+    header = lines[0]
+    table = header[header.index("`"):header.rindex("`") + 1]
+    close_index = max(i for i, line in enumerate(lines) if line.startswith(")"))
+    body = [line.rstrip().rstrip(",") for line in lines[1:close_index]]
+
+    auto_increment_columns = [line.split("`")[1] for line in body
+                              if line.lstrip().startswith("`") and "AUTO_INCREMENT" in line.upper()]
+    kept, deferred = [], []
+    for line in body:
+        stripped = line.strip()
+        is_key = stripped.startswith(("KEY ", "UNIQUE KEY ", "FULLTEXT KEY ", "SPATIAL KEY "))
+        is_foreign_key = stripped.startswith("CONSTRAINT ") and " FOREIGN KEY " in stripped
+        # Kolumna AUTO_INCREMENT musi mieć indeks już przy CREATE TABLE
+        needs_key = is_key and any(f"(`{column}`" in stripped for column in auto_increment_columns)
+        if (is_key and not needs_key) or is_foreign_key:
+            deferred.append(stripped)
+        else:
+            kept.append(line)
+
+    create = "\n".join([header, ",\n".join(kept)] + lines[close_index:])
+    if not deferred:
+        return create, None
+    return create, f"ALTER TABLE {table} " + ", ".join(f"ADD {definition}" for definition in deferred) + ";"
+
+
+def split_schema(schema_sql: str) -> Tuple[str, List[str]]:
+    """Przetwarza dump --no-data: zwraca schemat bez indeksów wtórnych i listę ALTER TABLE na potem."""
+    pre_lines: List[str] = []
+    post: List[str] = []
+    statement: Optional[List[str]] = None
+    for line in schema_sql.split("\n"):
+        if statement is None and line.startswith("CREATE TABLE "):
+            statement = [line]
+            continue
+        if statement is not None:
+            statement.append(line)
+            if line.rstrip().endswith(";"):
+                create, alter = split_create_table("\n".join(statement))
+                pre_lines.append(create)
+                if alter:
+                    post.append(alter)
+                statement = None
+            continue
+        pre_lines.append(line)
+    return "\n".join(pre_lines), post
+
+
+def balance_tables(tables: List[Tuple[str, int]], jobs: int) -> List[List[str]]:
+    """Przydziela tabele do procesów zaczynając od największych (LPT)."""
+    groups: List[Tuple[int, List[str]]] = [(0, []) for _ in range(min(jobs, len(tables)))]
+    for name, size in sorted(tables, key=lambda table: table[1], reverse=True):
+        index = min(range(len(groups)), key=lambda i: groups[i][0])
+        total, members = groups[index]
+        groups[index] = (total + size, members + [name])
+    return [members for _, members in groups]
+
+
+class TableFileWriter:
+    """Zapisuje dane jednej tabeli do pliku, opcjonalnie przez proces kompresora."""
+
+    def __init__(self, path: str, compression: Optional[Dict[str, Any]]):
+        self.path = path
+        self.compression = compression
+        self.file = None
+        self.proc = None
+
+    async def open(self) -> None:
+        self.file = open(self.path, "wb")
+        if self.compression:
+            self.proc = await asyncio.create_subprocess_exec(
+                *compress_cmd(self.compression), stdin=asyncio.subprocess.PIPE, stdout=self.file
+            )
+
+    async def write(self, data: bytes) -> None:
+        if self.proc:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+        else:
+            self.file.write(data)
+
+    async def close(self) -> bool:
+        ok = True
+        if self.proc:
+            self.proc.stdin.close()
+            ok = await self.proc.wait() == 0
+        self.file.close()
+        return ok
+
+
+class TableStreamSplitter:
+    """Rozdziela strumień mariadb-dump --no-create-info na osobne pliki per tabela."""
+
+    def __init__(self, data_dir: str, compression: Optional[Dict[str, Any]]):
+        self.data_dir = data_dir
+        self.compression = compression
+        self.extension = ".sql" + (COMPRESSION_EXTENSIONS[compression["method"]] if compression else "")
+        self.header = b""
+        self.buffer = b""
+        self.current: Optional[TableFileWriter] = None
+        self.ok = True
+
+    async def feed(self, data: bytes) -> None:
+        self.buffer += data
+        while True:
+            index = self.buffer.find(MARIADB_DATA_MARKER)
+            if index == -1:
+                # Zostaw końcówkę bufora - znacznik może być przecięty między kawałkami
+                keep = len(MARIADB_DATA_MARKER) + 512
+                if len(self.buffer) > keep:
+                    await self._emit(self.buffer[:-keep])
+                    self.buffer = self.buffer[-keep:]
+                return
+            name_start = index + len(MARIADB_DATA_MARKER)
+            name_end = self.buffer.find(b"`\n", name_start)
+            if name_end == -1:
+                return
+            await self._emit(self.buffer[:index + 1])
+            await self._switch_table(self.buffer[name_start:name_end].decode())
+            self.buffer = self.buffer[index + 1:]
+
+    async def _emit(self, data: bytes) -> None:
+        if self.current:
+            await self.current.write(data)
+        else:
+            # Nagłówek dumpa (SET NAMES, FOREIGN_KEY_CHECKS=0...) trafia na początek każdego pliku
+            self.header += data
+
+    async def _switch_table(self, table: str) -> None:
+        if self.current:
+            self.ok = await self.current.close() and self.ok
+        self.current = TableFileWriter(os.path.join(self.data_dir, table + self.extension), self.compression)
+        await self.current.open()
+        await self.current.write(self.header)
+
+    async def finish(self) -> bool:
+        await self._emit(self.buffer)
+        self.buffer = b""
+        if self.current:
+            self.ok = await self.current.close() and self.ok
+        return self.ok
+
+
+async def run_table_dump_worker(db: Dict[str, Any], tables: List[str], data_dir: str) -> bool:
+    """Jeden proces mariadb-dump dla grupy tabel, wyjście dzielone na pliki per tabela."""
+    cmd = mariadb_cmd(db, "dump", [
+        "--single-transaction", "--no-create-info", "--skip-triggers", "--quick",
+        db['database']
+    ] + tables)
+    splitter = TableStreamSplitter(data_dir, get_compression(db))
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE, env=mariadb_env(db), start_new_session=True
+    )
+    stderr_tail = OutputTail()
+    stderr_task = asyncio.ensure_future(pump_output(proc.stderr, stderr_tail, process_label(cmd), progress=True))
+    try:
+        while True:
+            chunk = await proc.stdout.read(1024 * 1024)
+            if not chunk:
+                break
+            await splitter.feed(chunk)
+        ok = await splitter.finish()
+        returncode = await proc.wait()
+    except asyncio.CancelledError:
+        await terminate_processes([proc])
+        stderr_task.cancel()
+        raise
+    await stderr_task
+    if returncode != 0:
+        logging.error(f"Błąd procesu dumpa tabel {', '.join(tables)}: {stderr_tail.text()}")
+    return ok and returncode == 0
+
+
+class MariaDBLockSession:
+    """Sesja klienta trzymająca FLUSH TABLES WITH READ LOCK do czasu startu transakcji procesów dumpa.
+
+    Start transakcji sprawdzany jest po stronie serwera (INNODB_TRX połączeń nawiązanych po założeniu
+    blokady), bo stdout mariadb-dump jest buforowany i znacznik pierwszej tabeli przychodzi z opóźnieniem.
+    Wymaga uprawnienia PROCESS.
+    """
+
+    def __init__(self, db: Dict[str, Any]):
+        self.db = db
+        self.proc = None
+        self.last_connection = 0  # Najwyższy identyfikator połączenia w chwili założenia blokady
+
+    async def lock(self) -> bool:
+        cmd = mariadb_cmd(self.db, "client", ["--batch", "--skip-column-names", "--unbuffered", self.db['database']])
+        self.proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, env=mariadb_env(self.db)
+        )
+        line = await self.query("FLUSH TABLES WITH READ LOCK;\n"
+                                "SELECT 'locked', MAX(ID) FROM information_schema.PROCESSLIST;")
+        fields = (line or "").split("\t")
+        if fields[0] != "locked" or not fields[-1].isdigit():
+            return False
+        self.last_connection = int(fields[-1])
+        return True
+
+    async def query(self, statements: str) -> Optional[str]:
+        """Wysyła polecenia do sesji i czyta jeden wiersz wyniku (None gdy sesja się zakończyła)."""
+        try:
+            self.proc.stdin.write(statements.encode() + b"\n")
+            await self.proc.stdin.drain()
+            line = await asyncio.wait_for(self.proc.stdout.readline(), MARIADB_START_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return line.decode(errors="replace").strip() or None
+
+    async def dump_transactions(self) -> Optional[int]:
+        """Liczba otwartych transakcji połączeń użytkownika bazy nawiązanych po założeniu blokady."""
+        line = await self.query(
+            "SELECT COUNT(*) FROM information_schema.INNODB_TRX t "
+            "JOIN information_schema.PROCESSLIST p ON p.ID = t.trx_mysql_thread_id "
+            f"WHERE p.ID > {self.last_connection} AND p.USER = '{self.db['user']}';"
+        )
+        return int(line) if line is not None and line.isdigit() else None
+
+    async def error(self) -> str:
+        """Komunikat błędu sesji, która zakończyła się sama (pusty, gdy nadal działa)."""
+        try:
+            await asyncio.wait_for(self.proc.wait(), 1)
+        except asyncio.TimeoutError:
+            return ""
+        return (await self.proc.stderr.read()).decode(errors="replace").strip()
+
+    async def unlock(self) -> None:
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        try:
+            self.proc.stdin.write(b"UNLOCK TABLES;\n")
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), MARIADB_START_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionResetError, BrokenPipeError):
+            self.proc.kill()
+            await self.proc.wait()
+
+
+async def wait_workers_started(lock: MariaDBLockSession, workers: List[asyncio.Future]) -> None:
+    """Czeka aż każdy działający proces dumpa ma na serwerze otwartą transakcję."""
+    while True:
+        transactions = await lock.dump_transactions()
+        if transactions is None:
+            raise RuntimeError(f"nie udało się sprawdzić transakcji procesów dumpa w INNODB_TRX "
+                               f"(wymagane uprawnienie PROCESS) {await lock.error()}".rstrip())
+        if transactions >= sum(not worker.done() for worker in workers):
+            return
+        await asyncio.sleep(MARIADB_TRX_POLL_INTERVAL)
+
+
+async def backup_mariadb_parallel(db: Dict[str, Any]) -> bool:
+    """Backup MariaDB z jednym spójnym snapshotem i równoległym dumpem tabel do osobnych plików."""
+    if encryption_pass(db):
+        logging.error(f"Szyfrowanie nie jest obsługiwane dla trybu równoległego (baza {db['database']})")
+        return False
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_dir = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}.mydump")
+    data_dir = os.path.join(backup_dir, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    env = mariadb_env(db)
+    started_at = time.monotonic()
+
+    try:
+        output = await run_query_async(mariadb_cmd(db, "client", [
+            "--batch", "--skip-column-names", "-e",
+            "SELECT TABLE_NAME, COALESCE(DATA_LENGTH, 0) + COALESCE(INDEX_LENGTH, 0) "
+            f"FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db['database']}' AND TABLE_TYPE = 'BASE TABLE'"
+        ]), env)
+        if output is None:
+            raise RuntimeError("nie udało się pobrać listy tabel")
+        excluded = set(db.get("exclude_tables", []))
+        tables = [(name, int(size)) for name, size in (line.split("\t") for line in output.splitlines() if line)
+                  if name not in excluded]
+        ignore_tables = [f"--ignore-table={db['database']}.{table}" for table in sorted(excluded)]
+
+        # Schemat bez indeksów wtórnych (szybsze ładowanie) + indeksy/FK do nałożenia po danych
+        schema = await run_query_async(mariadb_cmd(db, "dump", [
+            "--no-data", "--skip-triggers", "--single-transaction"
+        ] + ignore_tables + [db['database']]), env)
+        routines = await run_query_async(mariadb_cmd(db, "dump", [
+            "--no-data", "--no-create-info", "--routines", "--triggers", "--single-transaction"
+        ] + ignore_tables + [db['database']]), env)
+        if schema is None or routines is None:
+            raise RuntimeError("nie udało się wykonać dumpa schematu")
+        schema_pre, schema_post = split_schema(schema)
+        with open(os.path.join(backup_dir, "schema-pre.sql"), "w", encoding="utf-8") as f:
+            f.write(schema_pre)
+        with open(os.path.join(backup_dir, "schema-post.sql"), "w", encoding="utf-8") as f:
+            f.write("\n".join(schema_post) + ("\n" if schema_post else ""))
+        with open(os.path.join(backup_dir, "routines.sql"), "w", encoding="utf-8") as f:
+            f.write(routines)
+
+        # Tabele z exclude_table_data mają tylko schemat
+        exclude_data = set(db.get("exclude_table_data", []))
+        groups = balance_tables([table for table in tables if table[0] not in exclude_data], int(db.get("jobs", 4)))
+        logging.info(f"Backup MariaDB bazy {db['database']} do katalogu {backup_dir} "
+                     f"({len(tables)} tabel, {len(groups)} procesów)")
+
+        lock = MariaDBLockSession(db)
+        lock_started = time.monotonic()
+        if not await lock.lock():
+            await lock.unlock()
+            raise RuntimeError("nie udało się uzyskać FLUSH TABLES WITH READ LOCK")
+
+        # Wszystkie procesy otwierają transakcję gdy zapis jest zablokowany => jeden spójny snapshot
+        workers = [asyncio.ensure_future(run_table_dump_worker(db, group, data_dir)) for group in groups]
+        started = False
+        try:
+            await asyncio.wait_for(wait_workers_started(lock, workers), MARIADB_START_TIMEOUT)
+            started = True
+        except asyncio.TimeoutError:
+            raise RuntimeError("procesy dumpa nie wystartowały w wymaganym czasie")
+        finally:
+            if not started:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            await lock.unlock()
+        lock_seconds = time.monotonic() - lock_started
+        logging.info(f"Snapshot MariaDB bazy {db['database']} ustalony, blokada zapisu trwała {lock_seconds:.2f}s")
+
+        results = await asyncio.gather(*workers, return_exceptions=True)
+        if not all(result is True for result in results):
+            raise RuntimeError("co najmniej jeden proces dumpa tabel zakończył się błędem")
+
+        metadata = {
+            "database": db['database'],
+            "timestamp": timestamp,
+            "tables": [{"name": name, "size": size} for name, size in tables],
+            "groups": groups,
+            "compression": get_compression(db),
+            "lock_seconds": round(lock_seconds, 3),
+            "duration_seconds": round(time.monotonic() - started_at, 3),
+        }
+        with open(os.path.join(backup_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+    except Exception as e:
+        logging.error(f"Błąd podczas równoległego backupu bazy {db['database']}: {e}")
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        return False
+
+    logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar: {dir_size(backup_dir)} bajtów")
+    await register_backup(db, backup_dir)
+    return True
+
+
+async def restore_mariadb_parallel(db: Dict[str, Any], backup_dir: str, tables: Optional[List[str]] = None) -> bool:
+    """Przywraca układ .mydump: schemat, dane równolegle, potem indeksy/FK i procedury.
+
+    Z listą tables przywracane są tylko te tabele (bez procedur i triggerów z routines.sql).
+    """
+    with open(os.path.join(backup_dir, "metadata.json"), "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    if tables:
+        missing = sorted(set(tables) - {table["name"] for table in metadata["tables"]})
+        if missing:
+            logging.error(f"Backup {backup_dir} nie zawiera tabel: {', '.join(missing)}")
+            return False
+    env = mariadb_env(db)
+    client = mariadb_cmd(db, "client", mariadb_fast_session_args(db) + [db['database']])
+    limit = asyncio.Semaphore(max(1, int(db.get("restore_jobs", db.get("jobs", 4)))))
+
+    async def load_file(path: str, filters: Optional[List[List[str]]] = None) -> bool:
+        async with limit:
+            decompress = decompress_cmd(path)
+            if decompress:
+                return await run_pipeline_async([decompress] + (filters or []) + [client], env)
+            with open(path, "rb") as f:
+                return await run_pipeline_async((filters or []) + [client], env, stdin_file=f)
+
+    async def run_statement(statement: str) -> bool:
+        async with limit:
+            return await run_cmd_async(mariadb_cmd(db, "client", [db['database'], "-e", statement]), env)
+
+    data_dir = os.path.join(backup_dir, "data")
+    sizes = {table["name"]: table["size"] for table in metadata["tables"]}
+    # Największe tabele najpierw, żeby nie zostały na koniec jako jedyne ładowane
+    data_files = sorted(os.listdir(data_dir), key=lambda name: sizes.get(name[:name.rindex(".sql")], 0), reverse=True)
+    if tables:
+        data_files = [name for name in data_files if name[:name.rindex(".sql")] in tables]
+
+    phases = []
+    started = time.monotonic()
+    if not await load_file(os.path.join(backup_dir, "schema-pre.sql"),
+                           [mariadb_table_filter_cmd(tables)] if tables else None):
+        return False
+    phases.append(("schemat", time.monotonic() - started))
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(load_file(os.path.join(data_dir, name)) for name in data_files))
+    if not all(results):
+        return False
+    phases.append(("dane", time.monotonic() - started))
+
+    started = time.monotonic()
+    with open(os.path.join(backup_dir, "schema-post.sql"), "r", encoding="utf-8") as f:
+        statements = [line for line in f.read().splitlines() if line.strip()]
+    if tables:
+        statements = [line for line in statements if line.startswith(tuple(f"ALTER TABLE `{table}` " for table in tables))]
+    results = await asyncio.gather(*(run_statement(statement) for statement in statements))
+    if not all(results):
+        return False
+    phases.append(("indeksy", time.monotonic() - started))
+
+    if not tables:
+        started = time.monotonic()
+        if not await load_file(os.path.join(backup_dir, "routines.sql")):
+            return False
+        phases.append(("procedury", time.monotonic() - started))
+
+    if fast_restore_settings(db):
+        started = time.monotonic()
+        if not await analyze_database(db, env):
+            return False
+        phases.append(("analyze", time.monotonic() - started))
+
+    log_phases(db, phases)
+    return True
+
+
+def pg_jobs(db: Dict[str, Any], key: str = "jobs") -> int:
+    """Liczba równoległych procesów pg_dump/pg_restore dla formatu katalogowego."""
+    return max(1, int(db.get(key, db.get("jobs", os.cpu_count() or 1))))
+
+
+def pg_directory_compress_args(db: Dict[str, Any]) -> List[str]:
+    """Format katalogowy kompresuje każdy plik osobno - mapujemy na to ustawienie compression."""
+    compression = get_compression(db)
+    if not compression:
+        return []
+    if compression["method"] == "zstd":
+        # Wymaga pg_dump 16+
+        return [f"--compress=zstd:{compression['level']}"]
+    return [f"--compress={compression['level']}"]
+
+
+def pg_snapshot_args(db: Dict[str, Any]) -> List[str]:
+    """Snapshot wyeksportowany przez grupę serwera (group_by_server), jeśli baza go dostała."""
+    return ["--snapshot", db["snapshot"]] if db.get("snapshot") else []
+
+
+async def backup_postgresql_directory(db: Dict[str, Any], env: Dict[str, str]) -> bool:
+    """Backup PostgreSQL w formacie katalogowym z równoległymi procesami pg_dump (-j)."""
+    if encryption_pass(db):
+        logging.error(f"Szyfrowanie nie jest obsługiwane dla formatu katalogowego (baza {db['database']})")
+        return False
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_dir = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}.dir")
+    jobs = pg_jobs(db)
+    dump_args = [
+        "-U", db.get('user', 'postgres'),
+        "-F", "d",  # format katalogowy - wymagany dla -j
+        "-j", str(jobs),
+        "-b",
+    ] + pg_directory_compress_args(db) + table_exclusion_args(db) + pg_snapshot_args(db)
+
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        container = db['docker_container']
+        container_dir = f"/tmp/db_backup_{db['database']}_{timestamp}"
+        logging.info(f"Backup PostgreSQL bazy {db['database']} do katalogu {backup_dir} ({jobs} procesów, Docker exec)")
+        try:
+            success = await run_cmd_async([
+                "docker", "exec", container,
+                "pg_dump", "-h", "localhost", "-p", str(db['port']),
+            ] + dump_args + ["-f", container_dir, db['database']], env)
+            if success:
+                # Strumieniowe kopiowanie katalogu z kontenera (tar przez docker cp)
+                os.makedirs(backup_dir, exist_ok=True)
+                success = await run_pipeline_async([
+                    ["docker", "cp", f"{container}:{container_dir}", "-"],
+                    ["tar", "-x", "-C", backup_dir, "--strip-components=1"],
+                ])
+        finally:
+            await run_cmd_async(["docker", "exec", container, "rm", "-rf", container_dir])
+    else:
+        logging.info(f"Backup PostgreSQL bazy {db['database']} do katalogu {backup_dir} ({jobs} procesów)")
+        success = await run_cmd_async([
+            "pg_dump", "-h", db['host'], "-p", str(db['port']),
+        ] + dump_args + ["-f", backup_dir, db['database']], env)
+
+    if success:
+        logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar: {dir_size(backup_dir)} bajtów")
+        await register_backup(db, backup_dir)
+        return True
+
+    logging.error(f"Błąd podczas backupu bazy {db['database']}")
+    if os.path.isdir(backup_dir):
+        shutil.rmtree(backup_dir)
+    return False
+
+
+def restore_postgresql_directory(db: Dict[str, Any], backup_dir: str, env: Dict[str, str]) -> bool:
+    """Przywraca backup w formacie katalogowym równoległym pg_restore -j."""
+    jobs = pg_jobs(db, "restore_jobs")
+    restore_args = [
+        "-U", db.get('user', 'postgres'),
+        "-d", db['database'],
+        "-j", str(jobs),
+        "--clean",
+        "--if-exists",
+    ]
+    # Przy docker exec przekazujemy do kontenera PGOPTIONS profilu fast_restore
+    docker_env = ["-e", "PGOPTIONS"] if "PGOPTIONS" in env else []
+
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        container = db['docker_container']
+        container_dir = f"/tmp/db_restore_{os.path.basename(os.path.normpath(backup_dir))}"
+        logging.info(f"Przywracanie PostgreSQL z katalogu {backup_dir} ({jobs} procesów, Docker exec)")
+        try:
+            # pg_restore -j wymaga dostępu do plików - kopiujemy katalog strumieniowo do kontenera
+            success = (
+                run_pipeline([["docker", "exec", container, "mkdir", "-p", container_dir]])
+                and run_pipeline([
+                    ["tar", "-c", "-C", backup_dir, "."],
+                    ["docker", "cp", "-", f"{container}:{container_dir}"],
+                ])
+                and run_pipeline([[
+                    "docker", "exec"] + docker_env + [container,
+                    "pg_restore", "-h", "localhost", "-p", str(db['port']),
+                ] + restore_args + [container_dir]], env)
+            )
+        finally:
+            run_pipeline([["docker", "exec", container, "rm", "-rf", container_dir]])
+        return success
+
+    logging.info(f"Przywracanie PostgreSQL z katalogu {backup_dir} ({jobs} procesów)")
+    return run_pipeline([[
+        "pg_restore", "-h", db['host'], "-p", str(db['port']),
+    ] + restore_args + [backup_dir]], env)
+
+
+def dir_size(path: str) -> int:
+    """Łączny rozmiar plików w katalogu."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            total += os.path.getsize(os.path.join(root, filename))
+    return total
+
+
+async def backup_postgresql(db: Dict[str, Any]) -> bool:
+    """Wykonuje backup bazy PostgreSQL."""
+    if not validate_db_config(db):
+        return False
+    
+    try:
+        os.makedirs(db['backup_path'], exist_ok=True)
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db.get('password', '')
+
+        if db.get("wal_archive"):
+            return await backup_postgresql_continuous(db, env)
+
+        if db.get("pg_format") == "directory":
+            return await backup_postgresql_directory(db, env)
+
+        # Używamy rozszerzenia .dump dla formatu binarnego
+        backup_file = backup_file_path(db, ".dump")
+
+        # Sprawdź czy używać docker exec
+        if db.get('use_docker_exec') and db.get('docker_container'):
+            cmd = [
+                "docker", "exec", "-i",
+                db['docker_container'],
+                "pg_dump",
+                "-h", "localhost",  # w kontenerze używamy localhost
+                "-p", str(db['port']),
+            ]
             logging.info(f"Backup PostgreSQL bazy {db['database']} do pliku {backup_file} (używając Docker exec)")
-            
-            # Dla docker exec, przekierujemy stdout do pliku
-            with open(backup_file, "wb") as f:
-                result = subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE, env=env, timeout=3600)
-            
-            if result.returncode == 0:
-                file_size = os.path.getsize(backup_file)
-                logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar pliku: {file_size} bajtów")
-                cleanup_old_backups(db['backup_path'], db['database'])
-                return True
-            else:
-                logging.error(f"Błąd podczas backupu bazy {db['database']}: {result.stderr.decode()}")
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)
-                return False
         else:
             # Standardowe wywołanie pg_dump na hoście
             cmd = [
                 "pg_dump",
                 "-h", db['host'],
                 "-p", str(db['port']),
-                "-U", db.get('user', 'postgres'),
-                "-F", "c",  # format custom (binary)
-                "-b",       # include blobs
-                "-v",       # verbose
-                "-f", backup_file,
-                db['database']
             ]
+            logging.info(f"Backup PostgreSQL bazy {db['database']} do pliku {backup_file}")
+
+        cmd += [
+            "-U", db.get('user', 'postgres'),
+            "-F", "c",  # format custom (binary)
+            "-b",       # include blobs
+            "-v",       # verbose
+        ]
+        if get_compression(db):
+            # Kompresję robi zewnętrzny kompresor, nie kompresujemy podwójnie
+            cmd += ["-Z", "0"]
+        cmd += table_exclusion_args(db) + pg_snapshot_args(db)
+        cmd.append(db['database'])
+
+        # Dump trafia na stdout, a stamtąd (opcjonalnie przez kompresor) do pliku
+        success = await write_dump(db, cmd, backup_file, env)
+        return await finish_backup(db, backup_file, success)
+    except Exception as e:
+        logging.error(f"Wyjątek podczas backupu PostgreSQL: {e}")
+        return False
+
+
+def restore_postgresql(db: Dict[str, Any], backup_file: str, tables: Optional[List[str]] = None) -> bool:
+    """Przywraca bazę PostgreSQL (lub tylko wybrane tabele) z pliku backup."""
+    if not validate_db_config(db):
+        return False
+    
+    if not is_remote(backup_file) and not os.path.exists(backup_file):
+        logging.error(f"Plik backup {backup_file} nie istnieje")
+        return False
+    
+    env = os.environ.copy()
+    env['PGPASSWORD'] = db.get('password', '')
+    fast = fast_restore_settings(db) is not None
+    if fast:
+        pg_fast_session_env(db, env, [])
+
+    if os.path.isdir(backup_file) and tables:
+        logging.error("Przywracanie wybranych tabel nie jest obsługiwane dla formatu katalogowego - "
+                      "użyj pg_restore -l/-L bezpośrednio na katalogu")
+        return False
+
+    if os.path.isdir(backup_file):
+        phases: List[Tuple[str, float]] = []
+        with fast_restore_profile(db, env):
+            success = timed_phase(phases, "przywracanie", lambda: restore_postgresql_directory(db, backup_file, env))
+            if success and fast:
+                success = timed_phase(phases, "analyze", lambda: asyncio.run(analyze_database(db, env)))
+                log_phases(db, phases)
+        if success:
+            logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
+            restart_after_restore(db)
+            return True
+        logging.error(f"Błąd podczas przywracania bazy {db['database']}")
+        return False
+
+    logging.info(f"Przywracanie PostgreSQL z pliku {backup_file} do bazy {db['database']}")
+
+    # Sprawdź czy używać docker exec
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        cmd = [
+            "docker", "exec", "-i",
+            db['docker_container'],
+            "pg_restore",
+            "-h", "localhost",  # w kontenerze używamy localhost
+            "-p", str(db['port']),
+        ]
+        logging.info(f"Przywracanie PostgreSQL używając Docker exec")
+    else:
+        # Standardowe wywołanie pg_restore na hoście
+        cmd = [
+            "pg_restore",
+            "-h", db['host'],
+            "-p", str(db['port']),
+        ]
+
+    cmd += [
+        "-U", db.get('user', 'postgres'),
+        "-d", db['database'],
+        "-v"
+    ]
+    if fast:
+        cmd = pg_fast_session_env(db, env, cmd)
+
+    # Wybrane tabele: pg_restore -L z ich obiektami ze spisu archiwum (--clean usuwa tylko je)
+    with pg_restore_list(db, backup_file, tables) if tables else nullcontext() as list_file:
+        if tables:
+            if list_file is None:
+                return False
+            logging.info(f"Przywracanie tabel {', '.join(tables)} z {backup_file}")
+            cmd += ["-L", list_file]
+
+        # Archiwum (po dekompresji) przekazujemy przez stdin
+        phases = []
+        with fast_restore_profile(db, env):
+            if fast and not is_remote(backup_file) and not read_backup_cmds(db, backup_file):
+                # Zwykły plik można czytać kilka razy - każda sekcja osobno: schemat, dane, indeksy/FK
+                success = all(
+                    timed_phase(phases, name, lambda section=section, extra=extra: restore_from_file(
+                        db, cmd + [f"--section={section}"] + extra, backup_file, env))
+                    for section, name, extra in (("pre-data", "schemat", ["--clean", "--if-exists"]),
+                                                 ("data", "dane", []), ("post-data", "indeksy", []))
+                )
+            else:
+                # Strumień (dekompresja/odszyfrowanie/S3) czytamy raz - pg_restore i tak ładuje dane przed indeksami
+                success = timed_phase(phases, "przywracanie",
+                                      lambda: restore_from_file(db, cmd + ["--clean", "--if-exists"], backup_file, env))
+            if success and fast:
+                success = timed_phase(phases, "analyze", lambda: asyncio.run(analyze_database(db, env)))
+                log_phases(db, phases)
+
+    if success:
+        logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
+        restart_after_restore(db)
+        return True
+    logging.error(f"Błąd podczas przywracania bazy {db['database']}")
+    return False
+
+
+def wal_archive_settings(db: Dict[str, Any]) -> Dict[str, Any]:
+    """Ustawienia trybu ciągłego (base backup + archiwum WAL) z wartościami domyślnymi."""
+    settings = db.get("wal_archive") or {}
+    if settings is True:
+        settings = {}
+    return {
+        "base_backup_days": settings.get("base_backup_days", 7),
+        "keep_base_backups": settings.get("keep_base_backups", 2),
+        "slot": settings.get("slot", "db_backup_restore"),
+    }
+
+
+def pitr_paths(db: Dict[str, Any]) -> Tuple[str, str]:
+    """Katalogi base backupów i segmentów WAL (poza katalogiem backupów i ich retencją)."""
+    root = os.path.join(db['backup_path'], f"{db['database']}.pitr")
+    return os.path.join(root, "base"), os.path.join(root, "wal")
+
+
+def list_base_backups(base_dir: str) -> List[Dict[str, Any]]:
+    """Metadane base backupów posortowane od najstarszego."""
+    if not os.path.isdir(base_dir):
+        return []
+    backups = []
+    for filename in os.listdir(base_dir):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(base_dir, filename), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["metadata_file"] = os.path.join(base_dir, filename)
+        backups.append(metadata)
+    return sorted(backups, key=lambda backup: backup["finished"])
+
+
+def wal_segment(filename: str) -> Optional[str]:
+    """Numer segmentu WAL (log + segment, bez linii czasu) lub None dla innych plików."""
+    name = filename[:24]
+    if len(name) != 24 or any(c not in "0123456789ABCDEF" for c in name):
+        return None
+    return name[8:]
+
+
+def apply_wal_retention(db: Dict[str, Any]) -> None:
+    """Zostawia keep_base_backups najnowszych base backupów i WAL potrzebny do ich odtworzenia."""
+    base_dir, wal_dir = pitr_paths(db)
+    backups = list_base_backups(base_dir)
+    keep = max(1, wal_archive_settings(db)["keep_base_backups"])
+    for backup in backups[:-keep]:
+        backup_file = os.path.join(base_dir, backup["file"])
+        for path in (backup_file, backup_file + CHECKSUM_SUFFIX, backup["metadata_file"]):
+            if os.path.exists(path):
+                os.remove(path)
+        logging.info(f"Usunięto stary base backup: {backup['file']}")
+    if not backups or not os.path.isdir(wal_dir):
+        return
+
+    oldest_needed = wal_segment(backups[-keep:][0]["start_wal"])
+    removed = 0
+    for filename in os.listdir(wal_dir):
+        segment = wal_segment(filename)
+        if segment is not None and segment < oldest_needed and not filename.endswith(".history"):
+            os.remove(os.path.join(wal_dir, filename))
+            removed += 1
+    if removed:
+        logging.info(f"Usunięto {removed} segmentów WAL starszych niż {backups[-keep:][0]['start_wal']}")
+
+
+async def backup_postgresql_base(db: Dict[str, Any], env: Dict[str, str]) -> bool:
+    """Base backup całego klastra (pg_basebackup -F t -X fetch na stdout, kompresja w locie)."""
+    base_dir, _ = pitr_paths(db)
+    os.makedirs(base_dir, exist_ok=True)
+    start_wal = await run_query_async(
+        pg_query_cmd(db, "SELECT pg_walfile_name(pg_current_wal_lsn())"), env, timeout=60
+    )
+    if not start_wal or not start_wal.strip():
+        logging.error(f"Nie udało się odczytać bieżącego segmentu WAL dla bazy {db['name']}")
+        return False
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    compression = get_compression(db)
+    filename = f"base_{timestamp}.tar" + (COMPRESSION_EXTENSIONS[compression["method"]] if compression else "")
+    if encryption_pass(db):
+        filename += ENCRYPTION_EXTENSION
+    backup_file = os.path.join(base_dir, filename)
+    args = ["-p", str(db['port']), "-U", db.get('user', 'postgres'),
+            "-D", "-", "-F", "t", "-X", "fetch", "-c", "fast", "-P"]
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        cmd = ["docker", "exec", "-i", db['docker_container'], "pg_basebackup", "-h", "localhost"] + args
+    else:
+        cmd = ["pg_basebackup", "-h", db['host']] + args
+
+    started = datetime.now()
+    logging.info(f"Base backup PostgreSQL ({db['name']}) do pliku {backup_file}")
+    if not await write_dump(db, cmd, backup_file, env, remote=False):
+        logging.error(f"Błąd podczas base backupu ({db['name']})")
+        if os.path.exists(backup_file):
+            os.remove(backup_file)
+        return False
+
+    with open(os.path.join(base_dir, f"base_{timestamp}.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "file": filename,
+            "start_wal": start_wal.strip(),
+            "started": started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+        }, f, indent=2)
+    logging.info(f"Base backup zakończony sukcesem. Rozmiar pliku: {os.path.getsize(backup_file)} bajtów")
+    apply_wal_retention(db)
+    return True
+
+
+async def backup_postgresql_continuous(db: Dict[str, Any], env: Dict[str, str]) -> bool:
+    """Tryb ciągły: base backup co base_backup_days, pomiędzy nimi wystarcza archiwum WAL."""
+    base_dir, wal_dir = pitr_paths(db)
+    backups = list_base_backups(base_dir)
+    settings = wal_archive_settings(db)
+    if backups:
+        age_days = (datetime.now() - datetime.fromisoformat(backups[-1]["finished"])).total_seconds() / 86400
+        if age_days < settings["base_backup_days"]:
+            if not os.path.isdir(wal_dir) or not os.listdir(wal_dir):
+                logging.warning(f"Archiwum WAL {wal_dir} jest puste - czy działa 'wal-receive {db['name']}'?")
+            logging.info(f"Ostatni base backup ({db['name']}) ma {age_days:.1f} dni - wystarcza archiwum WAL")
+            apply_wal_retention(db)
+            return True
+    return await backup_postgresql_base(db, env)
+
+
+async def wal_receive(db: Dict[str, Any]) -> None:
+    """Ciągłe strumieniowanie WAL przez pg_receivewal do archiwum (wznawiane po błędach)."""
+    _, wal_dir = pitr_paths(db)
+    os.makedirs(wal_dir, exist_ok=True)
+    settings = wal_archive_settings(db)
+    env = os.environ.copy()
+    env['PGPASSWORD'] = db.get('password', '')
+    # pg_receivewal zapisuje pliki segmentów, więc zawsze działa na hoście ze skryptem
+    base = ["pg_receivewal", "-h", db['host'], "-p", str(db['port']), "-U", db.get('user', 'postgres'),
+            "--slot", settings["slot"]]
+    if not await run_cmd_async(base + ["--create-slot", "--if-not-exists"], env):
+        logging.error(f"Nie udało się utworzyć slotu replikacji {settings['slot']}")
+        return
+
+    cmd = base + ["-D", wal_dir, "--no-loop"]
+    compression = get_compression(db)
+    if compression:
+        # pg_receivewal kompresuje segmenty tylko gzipem
+        cmd += ["-Z", str(min(9, compression["level"]))]
+    dump_timeout.set(None)
+    while True:
+        await run_pipeline_async([cmd], env)
+        logging.warning(f"pg_receivewal zakończył działanie, ponowne uruchomienie za {WAL_RECEIVE_RETRY}s")
+        await asyncio.sleep(WAL_RECEIVE_RETRY)
+
+
+def restore_pitr(db: Dict[str, Any], target: str, data_dir: str) -> bool:
+    """Przygotowuje katalog danych klastra do odtworzenia na wskazany czas (lub 'latest').
+
+    Rozpakowuje base backup, kopiuje potrzebne segmenty WAL do katalogu danych
+    i ustawia recovery - odtwarzanie wykonuje serwer PostgreSQL uruchomiony na tym katalogu.
+    """
+    base_dir, wal_dir = pitr_paths(db)
+    target_time = None if target == "latest" else datetime.fromisoformat(target)
+    candidates = [backup for backup in list_base_backups(base_dir)
+                  if target_time is None or datetime.fromisoformat(backup["finished"]) <= target_time]
+    if not candidates:
+        logging.error(f"Brak base backupu zakończonego przed {target} dla bazy {db['name']}")
+        return False
+    backup = candidates[-1]
+    if os.path.isdir(data_dir) and os.listdir(data_dir):
+        logging.error(f"Katalog docelowy {data_dir} nie jest pusty")
+        return False
+    os.makedirs(data_dir, exist_ok=True)
+
+    backup_file = os.path.join(base_dir, backup["file"])
+    logging.info(f"Rozpakowuję base backup {backup_file} do {data_dir}")
+    read_cmds = read_backup_cmds(db, backup_file)
+    if read_cmds:
+        success = run_pipeline(read_cmds + [["tar", "-x", "-C", data_dir]])
+    else:
+        success = run_pipeline([["tar", "-x", "-C", data_dir, "-f", backup_file]])
+    if not success:
+        return False
+
+    # restore_command wykonywany jest w katalogu danych - archiwum WAL kopiujemy do środka,
+    # więc katalog działa też po podmontowaniu do kontenera
+    archive_dir = os.path.join(data_dir, "pg_wal_archive")
+    os.makedirs(archive_dir, exist_ok=True)
+    oldest_needed = wal_segment(backup["start_wal"])
+    copied = 0
+    for filename in sorted(os.listdir(wal_dir)) if os.path.isdir(wal_dir) else []:
+        segment = wal_segment(filename)
+        if not filename.endswith(".history") and (segment is None or segment < oldest_needed):
+            continue
+        # Niedokończony segment jest potrzebny do odtworzenia najnowszych zmian
+        shutil.copy2(os.path.join(wal_dir, filename), os.path.join(archive_dir, filename.replace(".partial", "")))
+        copied += 1
+
+    with open(os.path.join(data_dir, "recovery.signal"), "w", encoding="utf-8"):
+        pass
+    settings = [
+        "restore_command = 'if [ -f pg_wal_archive/%f.gz ]; then gzip -dc pg_wal_archive/%f.gz > %p; "
+        "else cp pg_wal_archive/%f %p; fi'",
+        "recovery_target_action = 'promote'",
+    ]
+    if target_time is not None:
+        settings.append(f"recovery_target_time = '{target_time.astimezone().isoformat(sep=' ')}'")
+    with open(os.path.join(data_dir, "postgresql.auto.conf"), "a", encoding="utf-8") as f:
+        f.write("\n# db_backup_restore.py restore-pitr\n" + "\n".join(settings) + "\n")
+
+    logging.info(f"Katalog {data_dir} przygotowany (base backup {backup['file']}, {copied} plików WAL, "
+                 f"cel: {target}). Uruchom PostgreSQL na tym katalogu danych, by odtworzyć bazę; "
+                 f"po zakończeniu odtwarzania można usunąć {archive_dir}")
+    return True
+
+
+def mongo_auth_args(db: Dict[str, Any]) -> List[str]:
+    """Parametry uwierzytelniania dla narzędzi MongoDB."""
+    args = []
+    if db.get("user"):
+        args.extend(["--username", db['user']])
+    if db.get("password"):
+        args.extend(["--password", db['password']])
+    return args
+
+
+def mongo_cmd(db: Dict[str, Any], tool: str, args: List[str]) -> List[str]:
+    """Buduje polecenie mongodump/mongorestore na hoście lub przez docker exec."""
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        return ["docker", "exec", "-i", db['docker_container'], tool,
+                "--host", f"localhost:{db['port']}"] + args + mongo_auth_args(db)
+    return [tool, "--host", f"{db['host']}:{db['port']}"] + args + mongo_auth_args(db)
+
+
+def mongo_archive_mode(db: Dict[str, Any]) -> bool:
+    """Tryb jednego strumienia --archive (wymuszany też przez kompresję)."""
+    return db.get("mongo_mode") == "archive" or get_compression(db) is not None
+
+
+async def backup_mongodb(db: Dict[str, Any]) -> bool:
+    """Wykonuje backup bazy MongoDB."""
+    if not validate_db_config(db):
+        return False
+    
+    try:
+        os.makedirs(db['backup_path'], exist_ok=True)
+
+        if mongo_archive_mode(db):
+            # Jeden strumień --archive zamiast wielu małych plików; można go skompresować w locie
+            backup_file = backup_file_path(db, ".archive")
+            cmd = mongo_cmd(db, "mongodump", [
+                "--db", db['database'],
+                "--archive",
+                f"--numParallelCollections={int(db.get('jobs', 4))}"
+            ] + table_exclusion_args(db))
+
+            logging.info(f"Backup MongoDB bazy {db['database']} do pliku {backup_file}")
+            success = await write_dump(db, cmd, backup_file)
+            return await finish_backup(db, backup_file, success)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_dir = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}")
+
+        os.makedirs(backup_dir, exist_ok=True)
+
+        cmd = [
+            "mongodump",
+            "--host", f"{db['host']}:{db['port']}",
+            "--db", db['database'],
+            "--out", backup_dir
+        ] + table_exclusion_args(db) + mongo_auth_args(db)
+
+        logging.info(f"Backup MongoDB bazy {db['database']} do katalogu {backup_dir}")
+        
+        if await run_cmd_async(cmd):
+            # Sprawdź czy backup się powiódł sprawdzając zawartość katalogu
+            db_backup_path = os.path.join(backup_dir, db['database'])
+            if os.path.exists(db_backup_path) and os.listdir(db_backup_path):
+                logging.info(f"Backup bazy {db['database']} zakończony sukcesem.")
+                await register_backup(db, backup_dir)
+                return True
+            else:
+                logging.error(f"Backup MongoDB nie zawiera danych dla bazy {db['database']}")
+                return False
+        return False
+    except Exception as e:
+        logging.error(f"Wyjątek podczas backupu MongoDB: {e}")
+        return False
+
+
+def restore_mongodb(db: Dict[str, Any], backup_dir: str, tables: Optional[List[str]] = None) -> bool:
+    """Przywraca bazę MongoDB (lub tylko wybrane kolekcje) z katalogu backup lub pliku archiwum."""
+    if not validate_db_config(db):
+        return False
+    
+    if not is_remote(backup_dir) and not os.path.exists(backup_dir):
+        logging.error(f"Katalog backup {backup_dir} nie istnieje")
+        return False
+
+    if is_remote(backup_dir) or os.path.isfile(backup_dir):
+        # Archiwum mongodump --archive (opcjonalnie skompresowane)
+        logging.info(f"Przywracanie MongoDB z archiwum {backup_dir} do bazy {db['database']}")
+        source = db.get("source_database", db['database'])
+        collections = mongo_archive_collections(db, backup_dir) if tables else None
+        if tables and collections is None:
+            logging.warning(f"Nie udało się odczytać listy kolekcji archiwum {backup_dir} - nie sprawdzam nazw")
+        elif collections is not None:
+            missing = sorted(set(tables) - collections)
+            if missing:
+                logging.error(f"Archiwum {backup_dir} nie zawiera kolekcji: {', '.join(missing)}")
+                return False
+        includes = [f"{source}.{collection}" for collection in tables] if tables else [f"{source}.*"]
+        cmd = mongo_cmd(db, "mongorestore", [
+            arg for namespace in includes for arg in ("--nsInclude", namespace)
+        ] + [
+            "--nsFrom", f"{source}.*",
+            "--nsTo", f"{db['database']}.*",
+            "--drop",
+            "--archive",
+            f"--numParallelCollections={int(db.get('restore_jobs', db.get('jobs', 4)))}",
+            f"--numInsertionWorkersPerCollection={int(db.get('insertion_workers', 4))}"
+        ])
+
+        if restore_from_file(db, cmd, backup_dir):
+            logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
+            restart_after_restore(db)
+            return True
+        return False
+    
+    logging.info(f"Przywracanie MongoDB z katalogu {backup_dir} do bazy {db['database']}")
+
+    # Sprawdź czy katalog zawiera dane dla konkretnej bazy
+    db_backup_path = os.path.join(backup_dir, db.get("source_database", db['database']))
+    if not os.path.exists(db_backup_path):
+        logging.error(f"Brak danych backup dla bazy {db['database']} w katalogu {backup_dir}")
+        return False
+
+    if tables:
+        # Każda kolekcja ma własny plik <kolekcja>.bson
+        for collection in tables:
+            collection_file = os.path.join(db_backup_path, collection + ".bson")
+            if not os.path.isfile(collection_file):
+                logging.error(f"Backup {backup_dir} nie zawiera kolekcji {collection}")
+                return False
+            if not run_cmd([
+                "mongorestore",
+                "--host", f"{db['host']}:{db['port']}",
+                "--db", db['database'],
+                "--collection", collection,
+                "--drop",
+                collection_file
+            ] + mongo_auth_args(db)):
+                return False
+        logging.info(f"Przywracanie kolekcji {', '.join(tables)} zakończone sukcesem.")
+        return True
+
+    cmd = [
+        "mongorestore",
+        "--host", f"{db['host']}:{db['port']}",
+        "--db", db['database'],
+        "--drop",
+        db_backup_path
+    ] + mongo_auth_args(db)
+
+    if run_cmd(cmd):
+        logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
+        restart_after_restore(db)
+        return True
+    return False
+
+
+PG_CHANGE_MARKER_QUERY = (
+    # Liczniki krotek wykrywają zmiany danych, xmin wierszy pg_class - DDL i TRUNCATE
+    "SELECT (SELECT COALESCE(sum(n_tup_ins + n_tup_upd + n_tup_del), 0) FROM pg_stat_user_tables)"
+    " || ':' || (SELECT md5(string_agg(oid::text || '.' || xmin::text, ',' ORDER BY oid)) FROM pg_class)"
+)
+
+
+def pg_session_cmd(db: Dict[str, Any]) -> List[str]:
+    """Polecenie psql czytające zapytania ze stdin - sesja otwarta tak długo, jak stdin."""
+    args = ["-U", db.get('user', 'postgres'), "-d", db['database'], "-X", "-q", "-At", "-v", "ON_ERROR_STOP=1"]
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        return ["docker", "exec", "-i", db['docker_container'], "psql", "-h", "localhost", "-p", str(db['port'])] + args
+    return ["psql", "-h", db['host'], "-p", str(db['port'])] + args
+
+
+def pg_query_cmd(db: Dict[str, Any], query: str) -> List[str]:
+    """Polecenie psql zwracające surowy wynik zapytania."""
+    args = ["-U", db.get('user', 'postgres'), "-d", db['database'], "-At", "-c", query]
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        return ["docker", "exec", db['docker_container'], "psql", "-h", "localhost", "-p", str(db['port'])] + args
+    return ["psql", "-h", db['host'], "-p", str(db['port'])] + args
+
+
+async def pg_change_marker(db: Dict[str, Any]) -> Optional[str]:
+    env = os.environ.copy()
+    env['PGPASSWORD'] = db.get('password', '')
+    output = await run_query_async(pg_query_cmd(db, PG_CHANGE_MARKER_QUERY), env, timeout=60)
+    if not output or not output.strip():
+        return None
+    return f"pg:{output.strip()}"
+
+
+async def mariadb_change_marker(db: Dict[str, Any]) -> Optional[str]:
+    """Pozycja binlogu (cały serwer), a gdy binlog jest wyłączony - sumy kontrolne tabel bazy."""
+    env = mariadb_env(db)
+    output = await run_query_async(mariadb_cmd(db, "client", [
+        "--batch", "--skip-column-names", "-e", "SHOW MASTER STATUS"
+    ]), env, timeout=60)
+    if output is None:
+        return None
+    fields = output.split("\t")
+    if len(fields) >= 2 and fields[0].strip():
+        return f"binlog:{fields[0]}:{fields[1].strip()}"
+
+    tables = await run_query_async(mariadb_cmd(db, "client", [
+        "--batch", "--skip-column-names", "-e",
+        f"SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = '{db['database']}' ORDER BY TABLE_NAME"
+    ]), env, timeout=60)
+    if not tables:
+        return None
+    names = ", ".join(f"`{name}`" for name in tables.splitlines() if name)
+    checksums = await run_query_async(mariadb_cmd(db, "client", [
+        "--batch", "--skip-column-names", db['database'], "-e", f"CHECKSUM TABLE {names}"
+    ]), env)
+    if checksums is None:
+        return None
+    return "checksum:" + hashlib.sha256(checksums.encode()).hexdigest()
+
+
+async def mongodb_change_marker(db: Dict[str, Any]) -> Optional[str]:
+    """Znacznik czasu ostatniego wpisu oplogu dla bazy (tylko replica set)."""
+    database = db['database']
+    script = (
+        "const o = db.getSiblingDB('local').oplog.rs"
+        f".find({{ns: {{$regex: '^{database}\\\\.'}}}}).sort({{$natural: -1}}).limit(1).toArray();"
+        " print(o.length ? o[0].ts.toString() : '')"
+    )
+    output = await run_query_async(mongo_cmd(db, "mongosh", ["--quiet", "--eval", script]), timeout=60)
+    # Bez oplogu (standalone) lub gdy wpisy bazy wypadły z oplogu nie da się stwierdzić braku zmian
+    return f"oplog:{output.strip()}" if output and output.strip() else None
+
+
+CHANGE_MARKER_FUNCTIONS = {
+    "postgresql": pg_change_marker,
+    "mariadb": mariadb_change_marker,
+    "mongodb": mongodb_change_marker,
+}
+
+
+def load_state() -> Dict[str, Any]:
+    """Wczytuje stan ostatnich backupów (znaczniki zmian)."""
+    if not os.path.exists(STATE_FILE):
+        return {}
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Nie udało się wczytać pliku stanu {STATE_FILE}: {e}")
+        return {}
+
+
+def save_state(state: Dict[str, Any]) -> None:
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file, STATE_FILE)
+
+
+async def check_unchanged(db: Dict[str, Any], state: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+    """Sprawdza znacznik zmian bazy. Zwraca (czy_pominąć, bieżący_znacznik)."""
+    try:
+        marker = await CHANGE_MARKER_FUNCTIONS[db["type"].lower()](db)
+    except Exception as e:
+        logging.warning(f"Nie udało się odczytać znacznika zmian bazy {db['name']}: {e}")
+        return False, None
+    if marker is None:
+        logging.info(f"Brak znacznika zmian dla bazy {db['name']} - wykonuję pełny backup")
+        return False, None
+    previous = state.get(db["name"], {}).get("marker")
+    return marker == previous and find_catalog_backup(db) is not None, marker
+
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    database TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    created TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    checksum TEXT,
+    format TEXT NOT NULL,
+    duration REAL,
+    remote TEXT
+);
+CREATE INDEX IF NOT EXISTS backups_name_created ON backups (name, created);
+CREATE TABLE IF NOT EXISTS verifications (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    backup_path TEXT NOT NULL,
+    verified TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    restore_seconds REAL,
+    tables INTEGER,
+    row_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS verifications_name_verified ON verifications (name, verified);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    started TEXT NOT NULL,
+    duration REAL NOT NULL,
+    size INTEGER,
+    success INTEGER NOT NULL,
+    skipped INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_name_started ON runs (name, started);
+CREATE TABLE IF NOT EXISTS group_runs (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    started TEXT NOT NULL,
+    databases TEXT NOT NULL,
+    snapshot_seconds REAL,
+    lsn_start TEXT,
+    lsn_end TEXT,
+    duration REAL NOT NULL,
+    success INTEGER NOT NULL
+);
+"""
+
+BACKUP_FORMATS = {
+    ".sql": "sql",
+    ".dump": "pg_custom",
+    ".dir": "pg_directory",
+    ".mydump": "mariadb_parallel",
+    ".archive": "mongo_archive",
+    "": "mongo_directory",
+}
+
+
+def open_catalog() -> sqlite3.Connection:
+    """Otwiera katalog backupów (SQLite), tworząc schemat przy pierwszym użyciu."""
+    conn = sqlite3.connect(CATALOG_FILE)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(CATALOG_SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(backups)")}
+    if "remote" not in columns:
+        # Katalog sprzed wprowadzenia kopii zdalnych
+        conn.execute("ALTER TABLE backups ADD COLUMN remote TEXT")
+    return conn
+
+
+def parse_backup_name(database: str, filename: str) -> Optional[Tuple[datetime, str]]:
+    """Czas i format backupu z nazwy <baza>_<YYYYmmdd_HHMMSS><rozszerzenie> (None dla obcych plików)."""
+    match = re.fullmatch(re.escape(database) + r"_(\d{8}_\d{6})((?:\.\w+)*)", filename)
+    if not match:
+        return None
+    extension = match.group(2)
+    if extension.endswith(ENCRYPTION_EXTENSION):
+        extension = extension[:-len(ENCRYPTION_EXTENSION)]
+    method = compression_of_file(extension)
+    if method:
+        extension = extension[:-len(COMPRESSION_EXTENSIONS[method])]
+    if extension not in BACKUP_FORMATS:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S"), BACKUP_FORMATS[extension]
+
+
+def path_checksum(path: str) -> str:
+    """SHA-256 pliku backupu albo (dla katalogów) wszystkich plików w ustalonej kolejności."""
+    digest = hashlib.sha256()
+    if os.path.isfile(path):
+        files = [(os.path.basename(path), path)]
+    else:
+        files = sorted((os.path.relpath(os.path.join(root, name), path), os.path.join(root, name))
+                       for root, _, names in os.walk(path) for name in names)
+    for relative, file_path in files:
+        if os.path.isdir(path):
+            digest.update(relative.encode() + b"\0")
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def import_existing_backups(conn: sqlite3.Connection, db: Dict[str, Any]) -> None:
+    """Jednorazowo dopisuje do katalogu backupy sprzed jego wprowadzenia (dokładne dopasowanie nazwy)."""
+    if conn.execute("SELECT 1 FROM backups WHERE name = ? LIMIT 1", (db['name'],)).fetchone():
+        return
+    if not os.path.isdir(db['backup_path']):
+        return
+    for filename in os.listdir(db['backup_path']):
+        parsed = parse_backup_name(db['database'], filename)
+        if parsed is None:
+            continue
+        path = os.path.abspath(os.path.join(db['backup_path'], filename))
+        size = dir_size(path) if os.path.isdir(path) else os.path.getsize(path)
+        conn.execute(
+            "INSERT OR IGNORE INTO backups (name, database, path, created, size, format) VALUES (?, ?, ?, ?, ?, ?)",
+            (db['name'], db['database'], path, parsed[0].isoformat(), size, parsed[1])
+        )
+    conn.commit()
+
+
+SCHEMA_EXTENSIONS = {"postgresql": ".schema.dump", "mariadb": ".schema.sql"}
+
+
+def schema_artifact_path(db: Dict[str, Any], backup_path: str) -> Optional[str]:
+    """Ścieżka pliku samego schematu towarzyszącego backupowi (ten sam znacznik czasu)."""
+    extension = SCHEMA_EXTENSIONS.get(db["type"].lower())
+    match = re.match(re.escape(db['database']) + r"_\d{8}_\d{6}", os.path.basename(backup_path))
+    if extension is None or not match:
+        return None
+    return os.path.join(os.path.dirname(backup_path), match.group(0) + extension)
+
+
+async def write_schema_artifact(db: Dict[str, Any], backup_path: str) -> None:
+    """Osobny, szybki dump samego schematu (do ćwiczeń przywracania), gdy włączono schema_artifact."""
+    artifact = schema_artifact_path(db, backup_path)
+    if artifact is None:
+        logging.info(f"Plik schematu nie jest obsługiwany dla bazy {db['name']} ({db['type']})")
+        return
+
+    if db["type"].lower() == "postgresql":
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db.get('password', '')
+        if db.get('use_docker_exec') and db.get('docker_container'):
+            cmd = ["docker", "exec", "-i", db['docker_container'], "pg_dump", "-h", "localhost"]
+        else:
+            cmd = ["pg_dump", "-h", db['host']]
+        cmd += ["-p", str(db['port']), "-U", db.get('user', 'postgres'), "-F", "c", "--schema-only"]
+        cmd += table_exclusion_args(db) + pg_snapshot_args(db) + [db['database']]
+    else:
+        env = mariadb_env(db)
+        cmd = mariadb_cmd(db, "dump", ["--no-data", "--routines", "--triggers", "--single-transaction"]
+                          + [arg for arg in table_exclusion_args(db) if arg.startswith("--ignore-table=")]
+                          + [db['database']])
+
+    with open(artifact, "wb") as f:
+        success = await run_pipeline_async([cmd], env, stdout_file=f)
+    if success:
+        logging.info(f"Zapisano schemat bazy {db['database']} do pliku {artifact}")
+    else:
+        # Brak pliku schematu nie unieważnia samego backupu
+        logging.warning(f"Nie udało się zapisać schematu bazy {db['database']}")
+        os.remove(artifact)
+
+
+# --- Spis tabel backupu i przywracanie wybranych tabel ---
+#
+# <backup>.toc.json obok pliku backupu:
+#   PostgreSQL (.dump) - wynik pg_restore -l i przynależność indeksów/sekwencji do tabel
+#   MariaDB (.sql)     - przesunięcia sekcji tabel, zbierane w trakcie zapisu niezakodowanego dumpa
+# Formaty katalogowe mają własny spis (toc.dat, metadata.json, pliki kolekcji), a kolekcje
+# archiwum MongoDB są sprawdzane przy przywracaniu w samym archiwum (mongorestore --dryRun).
+
+# Linie rozpoczynające sekcje dumpa mariadb-dump (wzorce ERE dla grep/awk)
+MARIADB_SECTION_REGEX = "^-- (Table structure for table|Temporary table structure for view|Final view structure for view) `"
+MARIADB_END_REGEX = "^-- Dumping (routines|events) for database "
+MARIADB_FOOTER_LINE = "/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;"
+# Nagłówek dumpa, sekcje wybranych tabel i końcowe przywrócenie ustawień sesji;
+# gdy dump nie zawiera którejś z tabel, filtr kończy się błędem
+MARIADB_TABLE_FILTER = (
+    '$0 ~ section { name = $0; sub(/^[^`]*`/, "", name); sub(/`$/, "", name);'
+    ' keep = index(tables, "|" name "|") > 0; started = 1; if (keep) seen[name] = 1 }'
+    ' $0 ~ end { keep = 0; started = 1 }'
+    ' $0 == footer { keep = 1 }'
+    ' !started || keep\n'
+    ' END { n = split(tables, wanted, "|"); for (i = 1; i <= n; i++) if (wanted[i] != "" && !(wanted[i] in seen))'
+    ' missing = missing " " wanted[i];'
+    ' if (missing != "") { print "dump nie zawiera tabel:" missing > "/dev/stderr"; exit 3 } }'
+)
+
+PG_RELATIONS_QUERY = (
+    # pg_restore -l nie pokazuje, do której tabeli należą indeksy i sekwencje
+    "SELECT n.nspname || '.' || c.relname || '|' || t.relname FROM pg_index i"
+    " JOIN pg_class c ON c.oid = i.indexrelid JOIN pg_class t ON t.oid = i.indrelid"
+    " JOIN pg_namespace n ON n.oid = c.relnamespace"
+    " WHERE n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg_toast%'"
+    " UNION ALL SELECT n.nspname || '.' || s.relname || '|' || t.relname FROM pg_depend d"
+    " JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S' JOIN pg_class t ON t.oid = d.refobjid"
+    " JOIN pg_namespace n ON n.oid = s.relnamespace"
+    " WHERE d.classid = 'pg_class'::regclass AND d.refclassid = 'pg_class'::regclass AND d.deptype IN ('a', 'i')"
+)
+PG_TOC_MULTIWORD_TYPES = ("SEQUENCE OWNED BY", "SEQUENCE SET", "TABLE DATA", "FK CONSTRAINT", "ROW SECURITY",
+                          "MATERIALIZED VIEW DATA", "MATERIALIZED VIEW", "DEFAULT ACL")
+
+
+def read_backup_output(db: Dict[str, Any], cmd: List[str], backup_file: str,
+                       env: Optional[Dict[str, str]] = None, partial_read: bool = False) -> Optional[str]:
+    """Wyjście polecenia czytającego (zdekompresowany) backup ze stdin."""
+    with tempfile.TemporaryFile() as output:
+        if not restore_from_file(db, cmd, backup_file, env, stdout_file=output, partial_read=partial_read):
+            return None
+        output.seek(0)
+        return output.read().decode(errors="replace")
+
+
+def pg_table_of_contents(db: Dict[str, Any], backup_file: str) -> Optional[Dict[str, Any]]:
+    """Spis obiektów archiwum custom (pg_restore -l czyta tylko początek strumienia)."""
+    if db.get('use_docker_exec') and db.get('docker_container'):
+        cmd = ["docker", "exec", "-i", db['docker_container'], "pg_restore", "-l"]
+    else:
+        cmd = ["pg_restore", "-l"]
+    env = os.environ.copy()
+    env['PGPASSWORD'] = db.get('password', '')
+    entries = read_backup_output(db, cmd, backup_file, env, partial_read=True)
+    if entries is None:
+        return None
+    source = {**db, "database": db.get("source_database", db['database'])}
+    relations = asyncio.run(run_query_async(pg_query_cmd(source, PG_RELATIONS_QUERY), env, timeout=60))
+    if relations is None:
+        logging.warning(f"Nie udało się pobrać indeksów i sekwencji bazy {source['database']} - "
+                        "przy przywracaniu tabel zostaną pominięte")
+    return {
+        "format": "pg_custom",
+        "entries": [line for line in entries.splitlines() if line and not line.startswith(";")],
+        "relations": dict(line.split("|", 1) for line in (relations or "").splitlines() if "|" in line),
+    }
+
+
+def parse_pg_toc_line(line: str) -> Optional[Tuple[str, str, str]]:
+    """(typ, schemat, nazwa) z linii pg_restore -l, np. '215; 1259 16390 TABLE public t1 postgres'."""
+    match = re.match(r"\d+; \d+ \d+ (.*)$", line)
+    if not match:
+        return None
+    rest = match.group(1)
+    kind = next((kind for kind in PG_TOC_MULTIWORD_TYPES if rest.startswith(kind + " ")), rest.split(" ", 1)[0])
+    # Ostatnie pole to właściciel
+    fields = rest[len(kind) + 1:].rsplit(" ", 1)[0].split(" ", 1)
+    if len(fields) != 2:
+        return None
+    return kind, fields[0], fields[1]
+
+
+def pg_toc_entry_table(kind: str, schema: str, tag: str, relations: Dict[str, str]) -> Optional[str]:
+    """Nazwa tabeli, do której należy obiekt spisu (None dla pozostałych obiektów)."""
+    if kind in ("TABLE", "TABLE DATA", "ROW SECURITY"):
+        return tag
+    if kind in ("CONSTRAINT", "FK CONSTRAINT", "TRIGGER", "DEFAULT", "POLICY", "RULE"):
+        # Nazwa to "<tabela> <obiekt>"
+        return tag.split(" ", 1)[0]
+    if kind in ("INDEX", "SEQUENCE", "SEQUENCE SET", "SEQUENCE OWNED BY"):
+        return relations.get(f"{schema}.{tag}")
+    if kind in ("ACL", "COMMENT") and tag.startswith(("TABLE ", "COLUMN ")):
+        return tag.split(" ", 1)[1].split(".", 1)[0]
+    return None
+
+
+def pg_select_toc(toc: Dict[str, Any], tables: List[str]) -> Optional[List[str]]:
+    """Linie spisu dla pg_restore -L: wybrane tabele z danymi, indeksami, ograniczeniami i sekwencjami."""
+    requested = {tuple(table.split(".", 1)) if "." in table else ("public", table) for table in tables}
+    selected, found = [], set()
+    for line in toc["entries"]:
+        entry = parse_pg_toc_line(line)
+        if entry is None:
+            continue
+        kind, schema, tag = entry
+        table = pg_toc_entry_table(kind, schema, tag, toc.get("relations", {}))
+        if (schema, table) in requested:
+            selected.append(line)
+            if kind == "TABLE":
+                found.add((schema, table))
+    missing = [".".join(table) for table in sorted(requested - found)]
+    if missing:
+        logging.error(f"Spis backupu nie zawiera tabel: {', '.join(missing)}")
+        return None
+    return selected
+
+
+class MariadbDumpIndex:
+    """Zbiera linie znaczników sekcji z danych zapisywanych do pliku dumpa (update() jak w hashlib).
+
+    Spis powstaje w tym samym przebiegu co zapis i suma kontrolna, bez ponownego czytania pliku.
+    """
+    MARKERS = (b"\n-- ", b"\n/*!40103 ")
+    MAX_LINE = 4096
+
+    def __init__(self):
+        self.digest: Any = None
+        self.carry = b"\n"  # Pierwsza linia pliku też "następuje po" znaku nowej linii
+        self.offset = -1  # Pozycja w pliku pierwszego bajtu carry
+        self.lines: Dict[int, str] = {}
+
+    def chained(self, digest: Any) -> "MariadbDumpIndex":
+        self.digest = digest
+        return self
+
+    def update(self, chunk: bytes) -> None:
+        self.digest.update(chunk)
+        data = self.carry + chunk
+        # Ogon porcji może zawierać początek znacznika - zostaje na kolejną porcję
+        keep = max(len(data) - max(map(len, self.MARKERS)) + 1, 0)
+        for marker in self.MARKERS:
+            start = data.find(marker)
+            while start != -1:
+                end = data.find(b"\n", start + 1)
+                if end == -1:
+                    # Niepełna linia znacznika; dłuższe linie to nie nagłówki sekcji
+                    if len(data) - start <= self.MAX_LINE:
+                        keep = min(keep, start)
+                    break
+                self.lines[self.offset + start + 1] = data[start + 1:end].decode(errors="replace")
+                start = data.find(marker, end)
+        self.offset += keep
+        self.carry = data[keep:]
+
+    def table_of_contents(self) -> Optional[Dict[str, Any]]:
+        return mariadb_toc_from_lines(sorted(self.lines.items()))
+
+
+def mariadb_toc_from_lines(lines: List[Tuple[int, str]]) -> Optional[Dict[str, Any]]:
+    """Spis sekcji tabel z linii znaczników (przesunięcie, tekst); None gdy dump nie ma sekcji tabel."""
+    toc: Dict[str, Any] = {"format": "mariadb_sql", "header_end": None, "footer": None, "tables": {}}
+    current: Optional[List[int]] = None
+    for offset, text in lines:
+        section = re.match(MARIADB_SECTION_REGEX, text)
+        if not (section or re.match(MARIADB_END_REGEX, text) or text == MARIADB_FOOTER_LINE):
+            continue
+        if toc["header_end"] is None:
+            toc["header_end"] = offset
+        if current is not None:
+            current[1] = offset
+            current = None
+        if section:
+            # Widok ma dwie sekcje: tymczasową tabelę i końcową definicję
+            current = [offset, None]
+            toc["tables"].setdefault(text[text.index("`") + 1:text.rindex("`")], []).append(current)
+        elif text == MARIADB_FOOTER_LINE:
+            toc["footer"] = offset
+    return toc if toc["tables"] else None
+
+
+def write_mariadb_table_of_contents(db: Dict[str, Any], backup_file: str, index: MariadbDumpIndex) -> None:
+    """Zapisuje spis sekcji zebrany podczas dumpa; dump bez znaczników sekcji zostaje bez spisu."""
+    if not db.get("table_of_contents", True):
+        return
+    toc = index.table_of_contents()
+    if toc is None:
+        logging.warning(f"Dump {backup_file} nie zawiera znaczników sekcji tabel - pomijam spis tabel")
+        return
+    with open(backup_file + TOC_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(toc, f, indent=2)
+    logging.info(f"Zapisano spis tabel backupu do pliku {backup_file + TOC_SUFFIX}")
+
+
+def mariadb_table_filter_cmd(tables: List[str]) -> List[str]:
+    """Filtr strumienia dumpa zostawiający nagłówek, sekcje wybranych tabel i stopkę."""
+    return ["awk", "-v", f"section={MARIADB_SECTION_REGEX}", "-v", f"end={MARIADB_END_REGEX}",
+            "-v", f"footer={MARIADB_FOOTER_LINE}", "-v", "tables=|" + "|".join(tables) + "|",
+            MARIADB_TABLE_FILTER]
+
+
+def mongo_archive_collections(db: Dict[str, Any], backup_file: str) -> Optional[set]:
+    """Kolekcje bazy zapisane w archiwum (mongorestore --dryRun -v wypisuje przestrzenie nazw na stderr)."""
+    source = db.get("source_database", db['database'])
+    cmd = mongo_cmd(db, "mongorestore", ["--archive", "--dryRun", "-v", "--nsInclude", f"{source}.*"])
+    output = read_backup_output(db, ["sh", "-c", '"$@" 2>&1', "sh"] + cmd, backup_file)
+    if output is None:
+        return None
+    namespaces = re.findall(r"(?:archive prelude|found collection) (\S+)", output)
+    collections = {namespace[len(source) + 1:] for namespace in namespaces if namespace.startswith(source + ".")}
+    return collections or None
+
+
+TOC_BUILDERS = {
+    "pg_custom": pg_table_of_contents,
+}
+
+
+async def write_table_of_contents(db: Dict[str, Any], backup_path: str, backup_format: str) -> None:
+    """Zapisuje <backup>.toc.json (spis tabel do przywracania wybranych tabel)."""
+    builder = TOC_BUILDERS.get(backup_format)
+    if builder is None or not db.get("table_of_contents", True):
+        return
+    toc = await asyncio.to_thread(builder, db, backup_path)
+    if toc is None:
+        # Brak spisu nie unieważnia backupu - przy przywracaniu zostanie odtworzony z pliku
+        logging.warning(f"Nie udało się zapisać spisu tabel backupu {backup_path}")
+        return
+    with open(backup_path + TOC_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(toc, f, indent=2)
+    logging.info(f"Zapisano spis tabel backupu do pliku {backup_path + TOC_SUFFIX}")
+
+
+def load_table_of_contents(backup_file: str) -> Optional[Dict[str, Any]]:
+    """Spis tabel zapisany obok backupu (None dla kopii zdalnych i starszych backupów)."""
+    if is_remote(backup_file) or not os.path.isfile(backup_file + TOC_SUFFIX):
+        return None
+    with open(backup_file + TOC_SUFFIX, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def pg_restore_list(db: Dict[str, Any], backup_file: str, tables: List[str]):
+    """Plik listy dla pg_restore -L z obiektami wybranych tabel (w kontenerze przy docker exec).
+
+    Zwraca ścieżkę widoczną dla pg_restore albo None, gdy tabel nie ma w backupie.
+    """
+    toc = load_table_of_contents(backup_file) or pg_table_of_contents(db, backup_file)
+    selected = pg_select_toc(toc, tables) if toc else None
+    if selected is None:
+        yield None
+        return
+    with tempfile.NamedTemporaryFile("w", suffix=".list", encoding="utf-8") as f:
+        f.write("\n".join(selected) + "\n")
+        f.flush()
+        if not (db.get('use_docker_exec') and db.get('docker_container')):
+            yield f.name
+            return
+        container_path = f"/tmp/db_restore_{db['database']}_{os.getpid()}.list"
+        if not run_pipeline([["docker", "cp", f.name, f"{db['docker_container']}:{container_path}"]]):
+            yield None
+            return
+        try:
+            yield container_path
+        finally:
+            run_pipeline([["docker", "exec", db['docker_container'], "rm", "-f", container_path]])
+
+
+def copy_ranges_to_pipe(path: str, ranges: List[List[Optional[int]]], fd: int, errors: List[Exception]) -> None:
+    """Przepisuje wybrane zakresy bajtów pliku do deskryptora potoku (wątek pomocniczy przywracania)."""
+    try:
+        with open(path, "rb") as f, os.fdopen(fd, "wb") as pipe:
+            for start, end in ranges:
+                f.seek(start)
+                remaining = None if end is None else end - start
+                while remaining is None or remaining > 0:
+                    chunk = f.read(SINK_CHUNK_SIZE if remaining is None else min(SINK_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    pipe.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+    except Exception as e:
+        errors.append(e)
+
+
+def restore_mariadb_tables(db: Dict[str, Any], backup_file: str, tables: List[str],
+                           client: List[str], env: Dict[str, str]) -> bool:
+    """Przywraca wybrane tabele z dumpa .sql.
+
+    Ze spisem i niezakodowanym plikiem czytane są tylko sekcje tych tabel, w pozostałych
+    przypadkach strumień dumpa przechodzi przez filtr awk.
+    """
+    toc = load_table_of_contents(backup_file)
+    if toc is None:
+        logging.info(f"Brak spisu tabel dla {backup_file} - filtruję cały dump")
+        return restore_from_file(db, client, backup_file, env, filters=[mariadb_table_filter_cmd(tables)])
+    missing = [table for table in tables if table not in toc["tables"]]
+    if missing:
+        logging.error(f"Backup {backup_file} nie zawiera tabel: {', '.join(missing)}")
+        return False
+    if read_backup_cmds(db, backup_file):
+        return restore_from_file(db, client, backup_file, env, filters=[mariadb_table_filter_cmd(tables)])
+
+    sections = sorted(section for table in tables for section in toc["tables"][table])
+    ranges = [[0, toc["header_end"]]] + sections + ([[toc["footer"], None]] if toc["footer"] is not None else [])
+    logging.info(f"Przywracanie tabel {', '.join(tables)}: {len(sections)} sekcji z {backup_file}")
+    read_fd, write_fd = os.pipe()
+    errors: List[Exception] = []
+    reader = threading.Thread(target=copy_ranges_to_pipe, args=(backup_file, ranges, write_fd, errors), daemon=True)
+    reader.start()
+    success = run_pipeline([client], env, stdin_file=read_fd)
+    reader.join()
+    if errors:
+        logging.error(f"Błąd odczytu {backup_file}: {errors[0]}")
+        return False
+    return success
+
+
+async def register_backup(db: Dict[str, Any], path: str) -> None:
+    """Zapisuje udany backup w katalogu (czas, rozmiar, suma kontrolna, format, czas trwania) i stosuje retencję."""
+    parsed = parse_backup_name(db['database'], os.path.basename(path))
+    if parsed is None:
+        logging.error(f"Nierozpoznana nazwa backupu {path} - pomijam rejestrację w katalogu")
+        return
+    if db.get("schema_artifact"):
+        await write_schema_artifact(db, path)
+    created, backup_format = parsed
+    await write_table_of_contents(db, path, backup_format)
+    size = dir_size(path) if os.path.isdir(path) else os.path.getsize(path)
+    checksum_file = path + CHECKSUM_SUFFIX
+    if os.path.isfile(checksum_file):
+        # Suma policzona w locie przez write_dump
+        with open(checksum_file, "r", encoding="utf-8") as f:
+            checksum = f.read().split()[0]
+    else:
+        # Liczone w wątku, żeby nie wstrzymywać pozostałych równoległych backupów
+        checksum = await asyncio.to_thread(path_checksum, path)
+    remote = None
+    if remote_settings(db):
+        if os.path.isdir(path):
+            logging.warning(f"Backup katalogowy {path} nie jest wysyłany do S3 - użyj formatu jednoplikowego")
+        elif not os.path.exists(path + UPLOAD_STATE_SUFFIX):
+            remote = remote_url(db, remote_key(db, path))
+    with closing(open_catalog()) as conn:
+        import_existing_backups(conn, db)
+        conn.execute(
+            "INSERT OR REPLACE INTO backups (name, database, path, created, size, checksum, format, duration, remote) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (db['name'], db['database'], os.path.abspath(path), created.isoformat(), size, checksum,
+             backup_format, (datetime.now() - created).total_seconds(), remote)
+        )
+        conn.commit()
+    if remote_settings(db):
+        await upload_pending(db)
+    cleanup_old_backups(db)
+    if remote_settings(db):
+        await asyncio.to_thread(apply_remote_retention, db)
+
+
+def cleanup_old_backups(db: Dict[str, Any]) -> None:
+    """Usuwa backupy ponad keep_backups najnowszych według katalogu (bez skanowania katalogów).
+
+    Wpis backupu z kopią zdalną zostaje w katalogu - usuwa go dopiero retencja zdalna.
+    """
+    keep = int(db.get("keep_backups", DEFAULT_KEEP_BACKUPS))
+    removed = 0
+    try:
+        with closing(open_catalog()) as conn:
+            old_backups = conn.execute(
+                "SELECT id, path, remote FROM backups WHERE name = ? ORDER BY created DESC LIMIT -1 OFFSET ?",
+                (db['name'], keep)
+            ).fetchall()
+            for backup in old_backups:
+                file_path = backup["path"]
+                if backup["remote"] and not os.path.exists(file_path):
+                    continue
+                try:
+                    if os.path.isfile(file_path + UPLOAD_STATE_SUFFIX):
+                        discard_upload(db, file_path)
+                    schema_file = schema_artifact_path(db, file_path)
+                    if schema_file and os.path.isfile(schema_file):
+                        os.remove(schema_file)
+                    for sidecar in (file_path + CHECKSUM_SUFFIX, file_path + TOC_SUFFIX):
+                        if os.path.isfile(sidecar):
+                            os.remove(sidecar)
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+                        logging.info(f"Usunięto stary plik backup: {file_path}")
+                    elif os.path.isdir(file_path):
+                        shutil.rmtree(file_path)
+                        logging.info(f"Usunięto stary katalog backup: {file_path}")
+                    if not backup["remote"]:
+                        conn.execute("DELETE FROM backups WHERE id = ?", (backup["id"],))
+                    removed += 1
+                except Exception as e:
+                    logging.error(f"Błąd podczas usuwania {file_path}: {e}")
+            conn.commit()
+
+        if removed:
+            logging.info(f"Usunięto {removed} starych backupów dla bazy {db['name']}")
+    except Exception as e:
+        logging.error(f"Błąd podczas czyszczenia starych backupów dla bazy {db['name']}: {e}")
+
+
+def catalog_backups(db: Dict[str, Any]) -> List[sqlite3.Row]:
+    """Backupy bazy z katalogu, od najnowszego."""
+    with closing(open_catalog()) as conn:
+        import_existing_backups(conn, db)
+        return conn.execute(
+            "SELECT * FROM backups WHERE name = ? ORDER BY created DESC", (db['name'],)
+        ).fetchall()
+
+
+def find_catalog_backup(db: Dict[str, Any], at: Optional[datetime] = None) -> Optional[str]:
+    """Ścieżka najnowszego istniejącego backupu (opcjonalnie wykonanego nie później niż 'at').
+
+    Gdy pliku lokalnego już nie ma, zwracany jest adres jego kopii w S3.
+    """
+    for backup in catalog_backups(db):
+        if at is not None and datetime.fromisoformat(backup["created"]) > at:
+            continue
+        if os.path.exists(backup["path"]):
+            return backup["path"]
+        if backup["remote"]:
+            return backup["remote"]
+        logging.warning(f"Backup {backup['path']} z katalogu nie istnieje na dysku")
+    return None
+
+
+# --- Kopia zdalna w S3 (AWS S3, MinIO i inne zgodne serwery) ---
+#
+# Obiekty: <prefix>/<name>/<plik backupu>, wysyłane w częściach multipart w trakcie dumpa.
+# Niedokończone wysyłanie zostawia <backup>.upload.json i jest wznawiane z pliku lokalnego.
+
+
+class RemoteError(Exception):
+    """Błąd zwrócony przez serwer S3 (kod HTTP i kod błędu S3)."""
+
+    def __init__(self, status: int, code: str, message: str = ""):
+        super().__init__(f"HTTP {status} {code} {message}".strip())
+        self.status = status
+        self.code = code
+
+
+def xml_find_text(body: bytes, tag: str) -> Optional[str]:
+    """Tekst pierwszego elementu o podanej nazwie (w dowolnej przestrzeni nazw)."""
+    element = ET.fromstring(body).find(f".//{{*}}{tag}")
+    return element.text if element is not None else None
+
+
+class S3Client:
+    """Minimalny klient S3 na bibliotece standardowej: podpis AWS SigV4, adresowanie ścieżkowe."""
+
+    def __init__(self, settings: Dict[str, Any]):
+        endpoint = urlsplit(settings.get("endpoint_url", "https://s3.amazonaws.com"))
+        self.secure = endpoint.scheme == "https"
+        self.host = endpoint.netloc
+        self.bucket = settings["bucket"]
+        self.region = settings.get("region", "us-east-1")
+        self.access_key = settings.get("access_key", "")
+        self.secret_key = settings.get("secret_key") or os.environ.get(settings.get("secret_key_env", ""), "")
+
+    @staticmethod
+    def query_string(query: Dict[str, Any]) -> str:
+        return "&".join(f"{quote(key, safe='-_.~')}={quote(str(value), safe='-_.~')}"
+                        for key, value in sorted(query.items()))
+
+    def sign(self, method: str, path: str, query: Dict[str, Any], payload_hash: str) -> Dict[str, str]:
+        """Nagłówki żądania z podpisem AWS Signature Version 4."""
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        day = amz_date[:8]
+        headers = {"host": self.host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date}
+        signed_headers = ";".join(sorted(headers))
+        canonical_request = "\n".join([
+            method, quote(path, safe="/-_.~"), self.query_string(query),
+            "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)), signed_headers, payload_hash,
+        ])
+        scope = f"{day}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        key = ("AWS4" + self.secret_key).encode()
+        for part in (day, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={signed_headers}, Signature={signature}")
+        return headers
+
+    def request(self, method: str, key: str, query: Optional[Dict[str, Any]] = None, body: bytes = b"",
+                stream: bool = False) -> Tuple[http.client.HTTPResponse, bytes]:
+        """Wykonuje żądanie, ponawiając je przy błędach sieci i 5xx.
+
+        Ze stream=True zwraca otwartą odpowiedź (treść czyta wywołujący), inaczej całą treść.
+        """
+        query = query or {}
+        path = f"/{self.bucket}/{key}"
+        target = quote(path, safe="/-_.~") + (f"?{self.query_string(query)}" if query else "")
+        payload_hash = hashlib.sha256(body).hexdigest()
+        connection_class = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+        for attempt in range(1, REMOTE_RETRIES + 1):
+            conn = connection_class(self.host, timeout=REMOTE_TIMEOUT)
+            try:
+                conn.request(method, target, body=body, headers=self.sign(method, path, query, payload_hash))
+                response = conn.getresponse()
+                if response.status < 300 and stream:
+                    return response, b""
+                content = response.read()
+                conn.close()
+                if response.status < 300:
+                    # CompleteMultipartUpload potrafi zgłosić błąd w treści odpowiedzi 200
+                    if content.lstrip().startswith(b"<?xml") and ET.fromstring(content).tag.endswith("Error"):
+                        raise RemoteError(response.status, xml_find_text(content, "Code") or "Error")
+                    return response, content
+                code = xml_find_text(content, "Code") if content else None
+                error = RemoteError(response.status, code or response.reason,
+                                    (xml_find_text(content, "Message") or "") if content else "")
+                if response.status < 500 or attempt == REMOTE_RETRIES:
+                    raise error
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if attempt == REMOTE_RETRIES:
+                    raise
+                error = e
+            logging.warning(f"S3 {method} {key}: {error} - ponawiam ({attempt}/{REMOTE_RETRIES})")
+            time.sleep(2 ** attempt)
+
+    def create_upload(self, key: str) -> str:
+        _, content = self.request("POST", key, {"uploads": ""})
+        return xml_find_text(content, "UploadId")
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        response, _ = self.request("PUT", key, {"partNumber": number, "uploadId": upload_id}, data)
+        return response.getheader("ETag")
+
+    def list_parts(self, key: str, upload_id: str) -> Dict[int, Tuple[str, int]]:
+        """Części już przyjęte przez serwer: numer -> (ETag, rozmiar)."""
+        parts: Dict[int, Tuple[str, int]] = {}
+        query = {"uploadId": upload_id}
+        while True:
+            _, content = self.request("GET", key, query)
+            root = ET.fromstring(content)
+            for part in root.iterfind(".//{*}Part"):
+                parts[int(part.findtext("{*}PartNumber"))] = (part.findtext("{*}ETag"), int(part.findtext("{*}Size")))
+            if root.findtext("{*}IsTruncated") != "true":
+                return parts
+            query = {"uploadId": upload_id, "part-number-marker": root.findtext("{*}NextPartNumberMarker")}
+
+    def complete_upload(self, key: str, upload_id: str, parts: Dict[int, str]) -> None:
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in sorted(parts.items())
+        ) + "</CompleteMultipartUpload>"
+        self.request("POST", key, {"uploadId": upload_id}, body.encode())
+
+    def abort_upload(self, key: str, upload_id: str) -> None:
+        self.request("DELETE", key, {"uploadId": upload_id})
+
+    def delete_object(self, key: str) -> None:
+        self.request("DELETE", key)
+
+    def get_object(self, key: str) -> http.client.HTTPResponse:
+        return self.request("GET", key, stream=True)[0]
+
+
+def remote_settings(db: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Ustawienia kopii zdalnej bazy (None gdy wyłączona)."""
+    remote = db.get("remote")
+    return remote if isinstance(remote, dict) and remote.get("bucket") else None
+
+
+def remote_part_size(settings: Dict[str, Any]) -> int:
+    return max(int(float(settings.get("part_size_mb", REMOTE_PART_SIZE_MB)) * 1024 * 1024), REMOTE_MIN_PART_SIZE)
+
+
+def remote_key(db: Dict[str, Any], backup_file: str) -> str:
+    """Klucz obiektu: <prefix>/<name>/<nazwa pliku backupu>."""
+    prefix = remote_settings(db).get("prefix", "").strip("/")
+    return "/".join(part for part in (prefix, db['name'], os.path.basename(backup_file)) if part)
+
+
+def remote_url(db: Dict[str, Any], key: str) -> str:
+    return f"s3://{remote_settings(db)['bucket']}/{key}"
+
+
+def is_remote(path: str) -> bool:
+    return path.startswith("s3://")
+
+
+def remote_client(db: Dict[str, Any], url: str) -> Tuple[S3Client, str]:
+    """Klient S3 i klucz obiektu dla adresu s3://<bucket>/<klucz> (dane dostępowe z ustawień bazy)."""
+    settings = remote_settings(db)
+    if settings is None:
+        raise ValueError(f"Backup {url} jest w S3, a baza {db['name']} nie ma ustawienia 'remote'")
+    bucket, _, key = url[len("s3://"):].partition("/")
+    return S3Client({**settings, "bucket": bucket}), key
+
+
+def save_upload_state(state_file: str, state: Dict[str, Any]) -> None:
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+
+class RemoteUpload:
+    """Wysyłanie dumpa do S3 równolegle z jego powstawaniem (części multipart w puli wątków).
+
+    W pamięci jest najwyżej parallel_parts części. Wysłane części zapisywane są w
+    <backup>.upload.json; po błędzie reszta danych nie jest już wysyłana, a upload
+    dokończy później upload_pending na podstawie pliku lokalnego.
+    """
+
+    def __init__(self, db: Dict[str, Any], backup_file: str):
+        settings = remote_settings(db)
+        self.client = S3Client(settings)
+        self.part_size = remote_part_size(settings)
+        self.parallel = int(settings.get("parallel_parts", REMOTE_PARALLEL_PARTS))
+        self.state_file = backup_file + UPLOAD_STATE_SUFFIX
+        self.state = {"key": remote_key(db, backup_file), "upload_id": None, "part_size": self.part_size, "parts": {}}
+        self.buffer = bytearray()
+        self.pending: collections.deque = collections.deque()
+        self.executor = ThreadPoolExecutor(self.parallel)
+        self.parts_sent = 0
+        self.failed = False
+
+    def fail(self, error: Exception) -> None:
+        if not self.failed:
+            logging.warning(f"Wysyłanie {self.state['key']} do S3 przerwane ({error}) - zostanie wznowione z pliku lokalnego")
+        self.failed = True
+
+    async def start(self) -> None:
+        # Stan zapisany przed utworzeniem uploadu - wznowienie zadziała nawet gdy S3 jest niedostępne
+        save_upload_state(self.state_file, self.state)
+        try:
+            self.state["upload_id"] = await asyncio.to_thread(self.client.create_upload, self.state["key"])
+            save_upload_state(self.state_file, self.state)
+        except Exception as e:
+            self.fail(e)
+
+    async def write(self, chunk: bytes) -> None:
+        if self.failed:
+            return
+        self.buffer += chunk
+        while len(self.buffer) >= self.part_size and not self.failed:
+            data = bytes(self.buffer[:self.part_size])
+            del self.buffer[:self.part_size]
+            await self.send(data)
+
+    async def send(self, data: bytes) -> None:
+        while len(self.pending) >= self.parallel and not self.failed:
+            await self.collect()
+        if self.failed:
+            return
+        self.parts_sent += 1
+        future = self.executor.submit(self.client.upload_part, self.state["key"], self.state["upload_id"],
+                                      self.parts_sent, data)
+        self.pending.append((self.parts_sent, asyncio.wrap_future(future)))
+
+    async def collect(self) -> None:
+        number, future = self.pending.popleft()
+        try:
+            self.state["parts"][str(number)] = await future
+            save_upload_state(self.state_file, self.state)
+        except Exception as e:
+            self.fail(e)
+
+    async def finish(self) -> None:
+        """Wysyła ostatnią część i zamyka upload (przy błędzie zostawia stan do wznowienia)."""
+        try:
+            if self.buffer or self.parts_sent == 0:
+                await self.send(bytes(self.buffer))
+            self.buffer.clear()
+            while self.pending:
+                await self.collect()
+            if self.failed:
+                return
+            parts = {int(number): etag for number, etag in self.state["parts"].items()}
+            await asyncio.to_thread(self.client.complete_upload, self.state["key"], self.state["upload_id"], parts)
+            os.remove(self.state_file)
+            logging.info(f"Wysłano backup do S3: {self.state['key']} ({len(parts)} części)")
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def abort(self) -> None:
+        """Porzuca upload nieudanego dumpa (wysłane części są usuwane z serwera)."""
+        self.failed = True
+        self.buffer.clear()
+        await asyncio.gather(*(future for _, future in self.pending), return_exceptions=True)
+        self.pending.clear()
+        self.executor.shutdown(wait=False)
+        if self.state["upload_id"]:
+            try:
+                await asyncio.to_thread(self.client.abort_upload, self.state["key"], self.state["upload_id"])
+            except Exception as e:
+                logging.warning(f"Nie udało się porzucić uploadu {self.state['key']}: {e}")
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+
+def resume_upload(db: Dict[str, Any], backup_file: str) -> str:
+    """Dokańcza przerwane wysyłanie: brakujące części czytane są z pliku lokalnego. Zwraca adres s3://."""
+    state_file = backup_file + UPLOAD_STATE_SUFFIX
+    with open(state_file, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    settings = remote_settings(db)
+    client = S3Client(settings)
+    key, part_size = state["key"], state["part_size"]
+    size = os.path.getsize(backup_file)
+    count = max(1, -(-size // part_size))
+
+    def part_length(number: int) -> int:
+        return part_size if number < count else size - (count - 1) * part_size
+
+    parts: Dict[int, str] = {}
+    if state["upload_id"]:
+        try:
+            parts = {number: etag for number, (etag, length) in client.list_parts(key, state["upload_id"]).items()
+                     if number <= count and length == part_length(number)}
+        except RemoteError as e:
+            if e.status != 404:
+                raise
+            # Upload wygasł lub został porzucony po stronie serwera - zaczynamy od nowa
+            state["upload_id"] = None
+    if not state["upload_id"]:
+        state["upload_id"] = client.create_upload(key)
+        state["parts"] = {}
+        save_upload_state(state_file, state)
+
+    missing = [number for number in range(1, count + 1) if number not in parts]
+    logging.info(f"Wznawiam wysyłanie {key}: {count - len(missing)}/{count} części jest już w S3")
+
+    def upload(number: int) -> Tuple[int, str]:
+        with open(backup_file, "rb") as f:
+            f.seek((number - 1) * part_size)
+            data = f.read(part_size)
+        return number, client.upload_part(key, state["upload_id"], number, data)
+
+    with ThreadPoolExecutor(int(settings.get("parallel_parts", REMOTE_PARALLEL_PARTS))) as pool:
+        for number, etag in pool.map(upload, missing):
+            parts[number] = etag
+            state["parts"][str(number)] = etag
+            save_upload_state(state_file, state)
+    client.complete_upload(key, state["upload_id"], parts)
+    os.remove(state_file)
+    logging.info(f"Wysłano backup do S3: {key} ({count} części)")
+    return remote_url(db, key)
+
+
+def discard_upload(db: Dict[str, Any], backup_file: str) -> None:
+    """Porzuca niedokończone wysyłanie usuwanego backupu."""
+    state_file = backup_file + UPLOAD_STATE_SUFFIX
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("upload_id") and remote_settings(db):
+            S3Client(remote_settings(db)).abort_upload(state["key"], state["upload_id"])
+    except Exception as e:
+        logging.warning(f"Nie udało się porzucić uploadu dla {backup_file}: {e}")
+    os.remove(state_file)
+
+
+async def upload_pending(db: Dict[str, Any]) -> None:
+    """Wznawia przerwane wysyłanie backupów bazy i zapisuje adresy kopii zdalnych w katalogu."""
+    if not os.path.isdir(db['backup_path']):
+        return
+    for filename in sorted(os.listdir(db['backup_path'])):
+        if not filename.endswith(UPLOAD_STATE_SUFFIX):
+            continue
+        backup_file = os.path.join(db['backup_path'], filename[:-len(UPLOAD_STATE_SUFFIX)])
+        # Katalog backupów może być wspólny dla kilku baz
+        if parse_backup_name(db['database'], os.path.basename(backup_file)) is None:
+            continue
+        if not os.path.isfile(backup_file):
+            discard_upload(db, backup_file)
+            continue
+        try:
+            url = await asyncio.to_thread(resume_upload, db, backup_file)
+        except Exception as e:
+            logging.error(f"Nie udało się wznowić wysyłania {backup_file} do S3: {e}")
+            continue
+        with closing(open_catalog()) as conn:
+            conn.execute("UPDATE backups SET remote = ? WHERE path = ?", (url, os.path.abspath(backup_file)))
+            conn.commit()
 
-            logging.info(f"Backup PostgreSQL bazy {db['database']} do pliku {backup_file}")
-            
-            if run_cmd(cmd, env):
-                file_size = os.path.getsize(backup_file)
-                logging.info(f"Backup bazy {db['database']} zakończony sukcesem. Rozmiar pliku: {file_size} bajtów")
-                cleanup_old_backups(db['backup_path'], db['database'])
-                return True
+
+def apply_remote_retention(db: Dict[str, Any]) -> None:
+    """Usuwa z S3 kopie ponad keep_backups z ustawień remote (domyślnie jak lokalne keep_backups)."""
+    settings = remote_settings(db)
+    keep = int(settings.get("keep_backups", db.get("keep_backups", DEFAULT_KEEP_BACKUPS)))
+    with closing(open_catalog()) as conn:
+        old_backups = conn.execute(
+            "SELECT id, path, remote FROM backups WHERE name = ? AND remote IS NOT NULL "
+            "ORDER BY created DESC LIMIT -1 OFFSET ?",
+            (db['name'], keep)
+        ).fetchall()
+        for backup in old_backups:
+            try:
+                client, key = remote_client(db, backup["remote"])
+                client.delete_object(key)
+                logging.info(f"Usunięto starą kopię zdalną: {backup['remote']}")
+            except Exception as e:
+                logging.error(f"Błąd podczas usuwania {backup['remote']}: {e}")
+                continue
+            if os.path.exists(backup["path"]):
+                conn.execute("UPDATE backups SET remote = NULL WHERE id = ?", (backup["id"],))
             else:
-                # Usuń niepełny plik backup
-                if os.path.exists(backup_file):
-                    os.remove(backup_file)
-                return False
+                conn.execute("DELETE FROM backups WHERE id = ?", (backup["id"],))
+        conn.commit()
+
+
+def download_to_pipe(client: S3Client, key: str, fd: int, errors: List[Exception]) -> None:
+    """Przepisuje obiekt S3 do deskryptora potoku (wątek pomocniczy przywracania)."""
+    try:
+        with os.fdopen(fd, "wb") as pipe:
+            response = client.get_object(key)
+            with closing(response):
+                while chunk := response.read(SINK_CHUNK_SIZE):
+                    pipe.write(chunk)
     except Exception as e:
-        logging.error(f"Wyjątek podczas backupu PostgreSQL: {e}")
-        return False
+        errors.append(e)
 
 
-def restore_postgresql(db: Dict[str, Any], backup_file: str) -> bool:
-    """Przywraca bazę PostgreSQL z pliku backup."""
-    if not validate_db_config(db):
-        return False
-    
-    if not os.path.exists(backup_file):
-        logging.error(f"Plik backup {backup_file} nie istnieje")
+def restore_from_remote(db: Dict[str, Any], cmd: List[str], url: str,
+                        env: Optional[Dict[str, str]] = None, stdout_file: Optional[Any] = None,
+                        filters: Optional[List[List[str]]] = None, partial_read: bool = False) -> bool:
+    """Strumieniuje backup z S3 prosto na stdin potoku przywracania, bez pliku tymczasowego."""
+    client, key = remote_client(db, url)
+    cmds = read_backup_cmds(db, url, from_stdin=True) + (filters or []) + [cmd]
+    logging.info(f"Przywracanie strumieniowe z {url}")
+    read_fd, write_fd = os.pipe()
+    errors: List[Exception] = []
+    downloader = threading.Thread(target=download_to_pipe, args=(client, key, write_fd, errors), daemon=True)
+    downloader.start()
+    success = run_pipeline(cmds, env, stdin_file=read_fd, stdout_file=stdout_file, partial_read=partial_read)
+    downloader.join()
+    if errors and not (partial_read and success and isinstance(errors[0], BrokenPipeError)):
+        logging.error(f"Błąd pobierania {url}: {errors[0]}")
         return False
-    
-    env = os.environ.copy()
-    env['PGPASSWORD'] = db.get('password', '')
+    return success
 
-    logging.info(f"Przywracanie PostgreSQL z pliku {backup_file} do bazy {db['database']}")
 
-    # Sprawdź czy używać docker exec
-    if db.get('use_docker_exec') and db.get('docker_container'):
-        cmd = [
-            "docker", "exec", "-i",
-            db['docker_container'],
-            "pg_restore",
-            "-h", "localhost",  # w kontenerze używamy localhost
-            "-p", str(db['port']),
-            "-U", db.get('user', 'postgres'),
-            "-d", db['database'],
-            "--clean",
-            "--if-exists",
-            "-v"
-        ]
-        
-        logging.info(f"Przywracanie PostgreSQL używając Docker exec")
-        
-        # Dla docker exec, przekażemy plik przez stdin
-        with open(backup_file, "rb") as f:
-            result = subprocess.run(cmd, stdin=f, stderr=subprocess.PIPE, env=env, timeout=3600)
-        
-        if result.returncode == 0:
-            logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
-            restart_container(db.get("docker_container"))
-            return True
-        else:
-            logging.error(f"Błąd podczas przywracania bazy {db['database']}: {result.stderr.decode()}")
-            return False
-    else:
-        # Standardowe wywołanie pg_restore na hoście
-        cmd = [
-            "pg_restore",
-            "-h", db['host'],
-            "-p", str(db['port']),
-            "-U", db.get('user', 'postgres'),
-            "-d", db['database'],
-            "--clean",
-            "--if-exists",
-            "-v",
-            backup_file
-        ]
+def load_run_history(conn: sqlite3.Connection, db: Dict[str, Any]) -> List[sqlite3.Row]:
+    """Ostatnie HISTORY_RUNS wykonanych (niepominiętych) backupów bazy, od najnowszego."""
+    return conn.execute(
+        "SELECT * FROM runs WHERE name = ? AND skipped = 0 ORDER BY started DESC LIMIT ?",
+        (db['name'], HISTORY_RUNS)
+    ).fetchall()
 
-        if run_cmd(cmd, env):
-            logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
-            restart_container(db.get("docker_container"))
-            return True
-        return False
 
+def expected_duration(history: List[sqlite3.Row]) -> Optional[float]:
+    """Typowy czas backupu (mediana udanych przebiegów) lub None bez historii."""
+    durations = [run["duration"] for run in history if run["success"]]
+    return statistics.median(durations) if durations else None
 
-def backup_mongodb(db: Dict[str, Any]) -> bool:
-    """Wykonuje backup bazy MongoDB."""
-    if not validate_db_config(db):
-        return False
-    
-    try:
-        os.makedirs(db['backup_path'], exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = os.path.join(db['backup_path'], f"{db['database']}_{timestamp}")
 
-        os.makedirs(backup_dir, exist_ok=True)
+def adaptive_timeout(db: Dict[str, Any], history: List[sqlite3.Row]) -> float:
+    """Timeout z historii: TIMEOUT_MARGIN x najdłuższy udany przebieg, podwajany po każdym kolejnym błędzie."""
+    if "timeout" in db:
+        return db["timeout"]
+    durations = [run["duration"] for run in history if run["success"]]
+    if not durations:
+        return DEFAULT_TIMEOUT
+    timeout = max(MIN_ADAPTIVE_TIMEOUT, TIMEOUT_MARGIN * max(durations))
+    # Baza, która urosła ponad margines, nie może zawodzić co noc z tym samym timeoutem
+    for run in history:
+        if run["success"]:
+            break
+        timeout *= 2
+    return min(timeout, MAX_ADAPTIVE_TIMEOUT)
 
-        cmd = [
-            "mongodump",
-            "--host", f"{db['host']}:{db['port']}",
-            "--db", db['database'],
-            "--out", backup_dir
-        ]
 
-        if db.get("user"):
-            cmd.extend(["--username", db['user']])
-        if db.get("password"):
-            cmd.extend(["--password", db['password']])
+def detect_anomalies(history: List[sqlite3.Row], duration: float, size: Optional[int]) -> List[str]:
+    """Porównuje przebieg z medianą historii - nagły wzrost czasu lub zmiana rozmiaru o ANOMALY_FACTOR."""
+    anomalies = []
+    usual_duration = expected_duration(history)
+    if usual_duration and usual_duration >= ANOMALY_MIN_SECONDS and duration > ANOMALY_FACTOR * usual_duration:
+        anomalies.append(f"czas {duration:.0f}s, zwykle {usual_duration:.0f}s")
+    sizes = [run["size"] for run in history if run["success"] and run["size"]]
+    if size and sizes:
+        usual_size = statistics.median(sizes)
+        if size > ANOMALY_FACTOR * usual_size or size * ANOMALY_FACTOR < usual_size:
+            anomalies.append(f"rozmiar {size} bajtów, zwykle {usual_size:.0f} bajtów")
+    return anomalies
 
-        logging.info(f"Backup MongoDB bazy {db['database']} do katalogu {backup_dir}")
-        
-        if run_cmd(cmd):
-            # Sprawdź czy backup się powiódł sprawdzając zawartość katalogu
-            db_backup_path = os.path.join(backup_dir, db['database'])
-            if os.path.exists(db_backup_path) and os.listdir(db_backup_path):
-                logging.info(f"Backup bazy {db['database']} zakończony sukcesem.")
-                cleanup_old_backups(db['backup_path'], db['database'])
-                return True
-            else:
-                logging.error(f"Backup MongoDB nie zawiera danych dla bazy {db['database']}")
-                return False
-        return False
-    except Exception as e:
-        logging.error(f"Wyjątek podczas backupu MongoDB: {e}")
-        return False
 
+def record_run(db: Dict[str, Any], started: datetime, result: Dict[str, Any]) -> Optional[int]:
+    """Zapisuje przebieg backupu w historii; zwraca rozmiar backupu zarejestrowanego w tym przebiegu."""
+    with closing(open_catalog()) as conn:
+        size = None
+        if result["success"] and not result.get("skipped"):
+            row = conn.execute(
+                "SELECT size FROM backups WHERE name = ? AND created >= ? ORDER BY created DESC LIMIT 1",
+                (db['name'], started.replace(microsecond=0).isoformat())
+            ).fetchone()
+            size = row["size"] if row else None
+        conn.execute(
+            "INSERT INTO runs (name, started, duration, size, success, skipped) VALUES (?, ?, ?, ?, ?, ?)",
+            (db['name'], started.isoformat(timespec="seconds"), result["duration"], size,
+             int(result["success"]), int(bool(result.get("skipped"))))
+        )
+        conn.commit()
+    return size
 
-def restore_mongodb(db: Dict[str, Any], backup_dir: str) -> bool:
-    """Przywraca bazę MongoDB z katalogu backup."""
-    if not validate_db_config(db):
-        return False
-    
-    if not os.path.exists(backup_dir):
-        logging.error(f"Katalog backup {backup_dir} nie istnieje")
-        return False
-    
-    logging.info(f"Przywracanie MongoDB z katalogu {backup_dir} do bazy {db['database']}")
 
-    # Sprawdź czy katalog zawiera dane dla konkretnej bazy
-    db_backup_path = os.path.join(backup_dir, db['database'])
-    if not os.path.exists(db_backup_path):
-        logging.error(f"Brak danych backup dla bazy {db['database']} w katalogu {backup_dir}")
-        return False
+PG_VERIFY_QUERY = (
+    # Dokładna liczba wierszy każdej tabeli jednym zapytaniem
+    "SELECT table_schema || '.' || table_name || E'\\t' || "
+    "(xpath('/row/c/text()', query_to_xml(format('SELECT count(*) AS c FROM %I.%I', table_schema, table_name), "
+    "false, true, '')))[1]::text FROM information_schema.tables "
+    "WHERE table_schema NOT IN ('pg_catalog', 'information_schema') AND table_type = 'BASE TABLE'"
+)
 
-    cmd = [
-        "mongorestore",
-        "--host", f"{db['host']}:{db['port']}",
-        "--db", db['database'],
-        "--drop",
-        db_backup_path
-    ]
 
-    if db.get("user"):
-        cmd.extend(["--username", db['user']])
-    if db.get("password"):
-        cmd.extend(["--password", db['password']])
+def parse_table_counts(output: Optional[str]) -> Optional[Dict[str, int]]:
+    """Wynik zapytania weryfikującego w postaci 'tabela<TAB>liczba_wierszy' na linię."""
+    if output is None:
+        return None
+    counts = {}
+    for line in output.splitlines():
+        if "\t" in line:
+            table, rows = line.rsplit("\t", 1)
+            counts[table] = int(rows.strip() or 0)
+    return counts
 
-    if run_cmd(cmd):
-        logging.info(f"Przywracanie bazy {db['database']} zakończone sukcesem.")
-        restart_container(db.get("docker_container"))
-        return True
-    return False
 
+async def scratch_query(db: Dict[str, Any], query: str) -> Optional[str]:
+    """Zapytanie administracyjne na serwerze bazy (tworzenie/usuwanie bazy tymczasowej)."""
+    db_type = db["type"].lower()
+    if db_type == "postgresql":
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db.get('password', '')
+        return await run_query_async(pg_query_cmd({**db, "database": "postgres"}, query), env, timeout=600)
+    if db_type == "mariadb":
+        return await run_query_async(mariadb_cmd(db, "client", ["-e", query]), mariadb_env(db), timeout=600)
+    return await run_query_async(mongo_cmd(db, "mongosh", ["--quiet", "--eval", query]), timeout=600)
+
+
+async def create_scratch_database(scratch: Dict[str, Any]) -> bool:
+    db_type = scratch["type"].lower()
+    if db_type == "postgresql":
+        return await scratch_query(scratch, f'CREATE DATABASE "{scratch["database"]}"') is not None
+    if db_type == "mariadb":
+        return await scratch_query(scratch, f"CREATE DATABASE `{scratch['database']}`") is not None
+    # MongoDB tworzy bazę przy pierwszym zapisie
+    return True
+
+
+async def drop_scratch_database(scratch: Dict[str, Any]) -> None:
+    db_type = scratch["type"].lower()
+    if db_type == "postgresql":
+        output = await scratch_query(scratch, f'DROP DATABASE IF EXISTS "{scratch["database"]}" WITH (FORCE)')
+    elif db_type == "mariadb":
+        output = await scratch_query(scratch, f"DROP DATABASE IF EXISTS `{scratch['database']}`")
+    else:
+        output = await scratch_query(scratch, f"db.getSiblingDB('{scratch['database']}').dropDatabase()")
+    if output is None:
+        logging.error(f"Nie udało się usunąć tymczasowej bazy {scratch['database']} - usuń ją ręcznie")
+
+
+async def scratch_table_counts(scratch: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """Lista tabel/kolekcji przywróconej bazy z dokładną liczbą wierszy."""
+    db_type = scratch["type"].lower()
+    if db_type == "postgresql":
+        env = os.environ.copy()
+        env['PGPASSWORD'] = scratch.get('password', '')
+        return parse_table_counts(await run_query_async(pg_query_cmd(scratch, PG_VERIFY_QUERY), env))
+
+    if db_type == "mariadb":
+        env = mariadb_env(scratch)
+        tables = await run_query_async(mariadb_cmd(scratch, "client", [
+            "--batch", "--skip-column-names", "-e",
+            f"SELECT TABLE_NAME FROM information_schema.TABLES "
+            f"WHERE TABLE_SCHEMA = '{scratch['database']}' AND TABLE_TYPE = 'BASE TABLE'"
+        ]), env)
+        names = [name for name in (tables or "").splitlines() if name]
+        if tables is None or not names:
+            return None if tables is None else {}
+        query = " UNION ALL ".join(f"SELECT '{name}', COUNT(*) FROM `{name}`" for name in names)
+        return parse_table_counts(await run_query_async(mariadb_cmd(scratch, "client", [
+            "--batch", "--skip-column-names", scratch['database'], "-e", query
+        ]), env))
+
+    script = (
+        f"const d = db.getSiblingDB('{scratch['database']}');"
+        " d.getCollectionNames().forEach(c => print(c + '\\t' + d.getCollection(c).countDocuments({})))"
+    )
+    return parse_table_counts(await run_query_async(mongo_cmd(scratch, "mongosh", ["--quiet", "--eval", script])))
 
-def cleanup_old_backups(backup_path: str, database_name: str, max_backups: int = 3) -> None:
-    """Usuwa stare pliki backup, zachowując tylko najnowsze pliki."""
+
+def record_verification(db: Dict[str, Any], backup_path: str, result: Dict[str, Any]) -> None:
+    with closing(open_catalog()) as conn:
+        conn.execute(
+            "INSERT INTO verifications (name, backup_path, verified, success, restore_seconds, tables, row_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (db['name'], backup_path, datetime.now().isoformat(timespec="seconds"), int(result["success"]),
+             result["restore_seconds"], result["tables"], result["rows"])
+        )
+        conn.commit()
+
+
+async def verify_restore(db: Dict[str, Any]) -> Dict[str, Any]:
+    """Przywraca najnowszy backup bazy do tymczasowej bazy, sprawdza ją i usuwa."""
+    result = {"name": db["name"], "success": False, "restore_seconds": None, "tables": None, "rows": None}
+    backup_path = find_catalog_backup(db)
+    if backup_path is None:
+        logging.error(f"Weryfikacja {db['name']}: brak backupu w katalogu")
+        return result
+
+    scratch = {
+        **db,
+        "database": f"{db['database']}_verify_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "source_database": db['database'],
+        "restart_after_restore": False,
+    }
+    # Weryfikacja nie zmienia ustawień serwera produkcyjnego - zostają tylko ustawienia sesji
+    fast = fast_restore_settings(db)
+    if fast:
+        scratch["fast_restore"] = {**fast, "server_settings": False}
+    logging.info(f"Weryfikacja {db['name']}: przywracanie {backup_path} do tymczasowej bazy {scratch['database']}")
     try:
-        if not os.path.exists(backup_path):
-            return
-        
-        # Znajdź wszystkie pliki backup dla tej bazy danych
-        backup_files = []
-        for filename in os.listdir(backup_path):
-            if filename.startswith(f"{database_name}_") and (filename.endswith('.sql') or filename.endswith('.dump')):
-                file_path = os.path.join(backup_path, filename)
-                if os.path.isfile(file_path):
-                    backup_files.append((file_path, os.path.getmtime(file_path)))
-        
-        # Dla MongoDB - sprawdź katalogi backup
-        for dirname in os.listdir(backup_path):
-            if dirname.startswith(f"{database_name}_") and os.path.isdir(os.path.join(backup_path, dirname)):
-                dir_path = os.path.join(backup_path, dirname)
-                backup_files.append((dir_path, os.path.getmtime(dir_path)))
-        
-        # Sortuj według daty modyfikacji (najnowsze pierwsze)
-        backup_files.sort(key=lambda x: x[1], reverse=True)
-        
-        # Usuń stare pliki/katalogi (zachowaj tylko max_backups najnowszych)
-        files_to_remove = backup_files[max_backups:]
-        
-        for file_path, _ in files_to_remove:
+        if not await create_scratch_database(scratch):
+            logging.error(f"Weryfikacja {db['name']}: nie udało się utworzyć bazy {scratch['database']}")
+            return result
+        started = time.monotonic()
+        # Funkcje przywracania są synchroniczne (własna pętla asyncio) - uruchamiamy je w wątku
+        restored = await asyncio.to_thread(RESTORE_FUNCTIONS[db["type"].lower()], scratch, backup_path)
+        result["restore_seconds"] = round(time.monotonic() - started, 1)
+        if restored:
+            counts = await scratch_table_counts(scratch)
+            if counts:
+                result.update(success=True, tables=len(counts), rows=sum(counts.values()))
+            else:
+                logging.error(f"Weryfikacja {db['name']}: przywrócona baza nie zawiera tabel")
+    finally:
+        await drop_scratch_database(scratch)
+
+    record_verification(db, backup_path, result)
+    if result["success"]:
+        logging.info(f"Weryfikacja {db['name']}: OK, przywracanie {result['restore_seconds']}s, "
+                     f"{result['tables']} tabel, {result['rows']} wierszy")
+    else:
+        logging.error(f"Weryfikacja {db['name']}: błąd przywracania backupu {backup_path}")
+    return result
+
+
+async def run_verifications(config: Dict[str, Any], names: List[str]) -> List[Dict[str, Any]]:
+    """Weryfikuje backupy wybranych (lub wszystkich) baz równolegle z limitem max_verify_parallel."""
+    limit = asyncio.Semaphore(config.get("concurrency", {}).get("max_verify_parallel", DEFAULT_MAX_VERIFY_PARALLEL))
+    databases = [db for db in config.get("databases", [])
+                 if (not names or db.get("name") in names) and validate_db_config(db)]
+
+    async def run_one(db: Dict[str, Any]) -> Dict[str, Any]:
+        async with limit:
             try:
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                    logging.info(f"Usunięto stary plik backup: {file_path}")
-                elif os.path.isdir(file_path):
-                    import shutil
-                    shutil.rmtree(file_path)
-                    logging.info(f"Usunięto stary katalog backup: {file_path}")
+                return await verify_restore(db)
             except Exception as e:
-                logging.error(f"Błąd podczas usuwania {file_path}: {e}")
-        
-        if files_to_remove:
-            logging.info(f"Usunięto {len(files_to_remove)} starych backupów dla bazy {database_name}")
-        
-    except Exception as e:
-        logging.error(f"Błąd podczas czyszczenia starych backupów dla bazy {database_name}: {e}")
+                logging.error(f"Wyjątek podczas weryfikacji bazy {db['name']}: {e}")
+                return {"name": db["name"], "success": False}
+
+    return await asyncio.gather(*(run_one(db) for db in databases if not db.get("wal_archive")))
+
+
+def readiness_cmd(db: Dict[str, Any]) -> List[str]:
+    """Polecenie sprawdzające czy serwer bazy przyjmuje połączenia."""
+    db_type = db["type"].lower()
+    in_docker = db.get('use_docker_exec') and db.get('docker_container')
+    prefix = ["docker", "exec", db['docker_container']] if in_docker else []
+    host = "localhost" if in_docker else db['host']
+
+    if db_type == "postgresql":
+        return prefix + ["pg_isready", "-h", host, "-p", str(db['port']), "-d", db['database']]
+    if db_type == "mariadb":
+        if in_docker:
+            return prefix + ["mariadb-admin", "-h", host, "-P", str(db['port']),
+                             "-u", db['user'], f"-p{db.get('password', '')}", "ping"]
+        return ["mysqladmin", f"--host={host}", f"--port={db['port']}", f"--user={db['user']}", "ping"]
+    return prefix + ["mongosh", "--quiet", "--host", f"{host}:{db['port']}",
+                     "--eval", "db.adminCommand('ping').ok"] + mongo_auth_args(db)
 
 
-def restart_container(container_name: Optional[str]) -> bool:
-    """Restartuje kontener Docker jeśli podano nazwę."""
+def wait_until_ready(db: Dict[str, Any]) -> bool:
+    """Czeka aż serwer bazy odpowie na sprawdzenie gotowości (pg_isready / ping)."""
+    timeout = db.get("readiness_timeout", DEFAULT_READINESS_TIMEOUT)
+    cmd = readiness_cmd(db)
+    env = mariadb_env(db)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, env=env, timeout=READINESS_INTERVAL * 5)
+            if result.returncode == 0:
+                return True
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            pass
+        time.sleep(READINESS_INTERVAL)
+    return False
+
+
+def restart_container(container_name: Optional[str], db: Optional[Dict[str, Any]] = None) -> bool:
+    """Restartuje kontener Docker jeśli podano nazwę.
+
+    Jeśli podano konfigurację bazy, czeka na gotowość serwera zamiast zakładać ją po restarcie.
+    """
     if not container_name:
         logging.info("Brak kontenera docker do restartu")
         return True
     
     logging.info(f"Restartuje kontener dockerowy: {container_name}")
     cmd = ["docker", "restart", container_name]
+    started = time.monotonic()
     
-    if run_cmd(cmd):
-        logging.info(f"Kontener {container_name} został zrestartowany.")
-        return True
-    else:
+    if not run_cmd(cmd):
         logging.error(f"Nie udało się zrestartować kontenera {container_name}.")
         return False
 
+    if db is None:
+        logging.info(f"Kontener {container_name} został zrestartowany.")
+        return True
+
+    if wait_until_ready(db):
+        logging.info(f"Kontener {container_name} został zrestartowany i jest gotowy po {time.monotonic() - started:.1f}s")
+        return True
+    logging.error(f"Kontener {container_name} nie osiągnął gotowości w ciągu "
+                  f"{db.get('readiness_timeout', DEFAULT_READINESS_TIMEOUT)}s od restartu")
+    return False
+
+
+def restart_after_restore(db: Dict[str, Any]) -> bool:
+    """Restart kontenera po przywróceniu bazy (domyślnie włączony, "restart_after_restore": false wyłącza)."""
+    if not db.get("restart_after_restore", True):
+        return True
+    return restart_container(db.get("docker_container"), db)
+
 
 def find_db(config: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
     """Znajduje konfigurację bazy danych po nazwie."""
@@ -584,12 +3397,30 @@ def find_db(config: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+def pop_option(args: List[str], name: str) -> List[str]:
+    """Usuwa z argumentów wszystkie wystąpienia '<name> <wartość>' i zwraca wartości (pusta gdy jej brak)."""
+    values = []
+    while name in args:
+        index = args.index(name)
+        values.extend(args[index + 1:index + 2] or [""])
+        del args[index:index + 2]
+    return values
+
+
 def print_usage() -> None:
     """Wyświetla informacje o sposobie użycia skryptu."""
     print("Sposób użycia:")
-    print("  python db_backup_restore.py backup                                    # wykona backup wszystkich baz z konfiguracji")
+    print("  python db_backup_restore.py backup [name ...]                        # wykona backup wszystkich (lub wybranych) baz z konfiguracji")
     print("  python db_backup_restore.py restore <name> <backup_file_or_dir>      # przywraca bazę o podanej nazwie z podanego backupu")
-    print("  python db_backup_restore.py list                                     # wyświetla listę dostępnych baz")
+    print("  python db_backup_restore.py restore <name> --latest                  # przywraca najnowszy backup z katalogu")
+    print("  python db_backup_restore.py restore <name> --at <czas>               # przywraca najnowszy backup wykonany do podanego czasu")
+    print("  python db_backup_restore.py restore <name> <backup> --table <tabela>  # przywraca tylko wybrane tabele (opcja powtarzalna)")
+    print("  python db_backup_restore.py restore <name> <backup> --into <baza>     # przywraca do innej, istniejącej bazy")
+    print("  python db_backup_restore.py verify-restore [name ...]                # przywraca najnowsze backupy do tymczasowych baz i je sprawdza")
+    print("  python db_backup_restore.py upload [name ...]                        # wznawia przerwane wysyłanie backupów do S3")
+    print("  python db_backup_restore.py list [name]                              # wyświetla listę dostępnych baz lub backupów bazy")
+    print("  python db_backup_restore.py wal-receive <name>                       # ciągłe archiwizowanie WAL (PostgreSQL)")
+    print("  python db_backup_restore.py restore-pitr <name> <czas|latest> <dir>  # przygotowuje katalog danych do odtworzenia na podany czas")
     print()
     
     # Próba wczytania konfiguracji aby pokazać dostępne bazy
@@ -602,9 +3433,21 @@ def print_usage() -> None:
         print("Nie można wczytać listy baz z konfiguracji.")
 
 
-def list_databases() -> None:
-    """Wyświetla listę dostępnych baz danych."""
+def list_databases(name: Optional[str] = None) -> None:
+    """Wyświetla listę dostępnych baz danych (z podaną nazwą - listę jej backupów z katalogu)."""
     config = load_config()
+    if name is not None:
+        db = find_db(config, name)
+        if not db:
+            print(f"Nie znaleziono bazy o nazwie '{name}' w konfiguracji.")
+            sys.exit(1)
+        print(f"Backupy bazy {name}:")
+        for backup in catalog_backups(db):
+            duration = f"{backup['duration']:.1f}s" if backup['duration'] is not None else "-"
+            location = backup['path'] if os.path.exists(backup['path']) or not backup['remote'] else backup['remote']
+            print(f"  {backup['created']}  {backup['format']:<16} {backup['size']:>14} B  {duration:>9}  {location}")
+        return
+
     print("Dostępne bazy danych:")
     print("-" * 50)
     
@@ -616,8 +3459,351 @@ def list_databases() -> None:
         print(f"Ścieżka backupów: {db.get('backup_path', 'N/A')}")
         if db.get('docker_container'):
             print(f"Kontener Docker: {db['docker_container']}")
+        if validate_db_config(db):
+            backups = catalog_backups(db)
+            if backups:
+                print(f"Backupy: {len(backups)}, ostatni: {backups[0]['created']} ({backups[0]['size']} bajtów)")
+            else:
+                print("Backupy: brak")
         print("-" * 50)
 
+
+BACKUP_FUNCTIONS = {
+    "mariadb": backup_mariadb,
+    "postgresql": backup_postgresql,
+    "mongodb": backup_mongodb,
+}
+
+RESTORE_FUNCTIONS = {
+    "mariadb": restore_mariadb,
+    "postgresql": restore_postgresql,
+    "mongodb": restore_mongodb,
+}
+
+
+def server_key(db: Dict[str, Any]) -> Tuple[str, str]:
+    """Klucz serwera bazy - bazy w tym samym kontenerze/hoście dzielą limit równoległości."""
+    return (str(db.get("host", "")), str(db.get("docker_container") or ""))
+
+
+# --- Grupy serwera (concurrency.group_by_server) ---
+#
+# Na początku przebiegu grupa otwiera po jednej sesji psql na bazę i eksportuje w nich snapshoty
+# jednocześnie (pg_export_snapshot). pg_dump każdej bazy dostaje swój snapshot przez --snapshot,
+# więc zawartość dumpów odpowiada chwili eksportu, niezależnie od tego, kiedy dump wystartuje.
+# Snapshot PostgreSQL obejmuje jedną bazę, dlatego wspólny jest moment, nie sam snapshot;
+# okno eksportu i pozycje WAL trafiają do tabeli group_runs.
+
+PG_CURRENT_LSN = "CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END"
+GROUP_SESSION_TIMEOUT = 60
+
+
+def pg_lsn_value(lsn: str) -> int:
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class ServerGroup:
+    """Bazy PostgreSQL jednego serwera archiwizowane ze snapshotów eksportowanych w jednej chwili."""
+
+    def __init__(self, key: Tuple[str, str], databases: List[Dict[str, Any]]):
+        self.key = key
+        self.label = key[1] or key[0]
+        self.databases = databases
+        self.lock = asyncio.Lock()
+        self.exported = False
+        self.pending = {db["name"] for db in databases}  # Bazy, których dump jeszcze się nie zakończył
+        self.global_limit: Optional[asyncio.Semaphore] = None  # Slot globalny zajęty przez grupę
+        self.sessions: Dict[str, asyncio.subprocess.Process] = {}  # Nazwa -> sesja trzymająca snapshot
+        self.snapshots: Dict[str, str] = {}
+        self.started: Optional[float] = None
+        self.started_at: Optional[datetime] = None
+        self.ended: Optional[float] = None
+        self.lsn_start: Optional[str] = None
+        self.lsn_end: Optional[str] = None
+        self.snapshot_seconds: Optional[float] = None
+
+    @asynccontextmanager
+    async def slot(self, db: Dict[str, Any], global_limit: asyncio.Semaphore):
+        """Slot dumpa bazy grupy - zwraca konfigurację ze snapshotem, na końcu zamyka sesję bazy."""
+        try:
+            yield await self.prepare(db, global_limit)
+        finally:
+            await self.release(db)
+
+    async def prepare(self, db: Dict[str, Any], global_limit: asyncio.Semaphore) -> Dict[str, Any]:
+        """Konfiguracja bazy ze snapshotem grupy; pierwsze wywołanie eksportuje snapshoty wszystkich baz.
+
+        Grupa zajmuje jeden slot globalny i pomija max_per_server: wszystkie dumpy startują zaraz po
+        eksporcie, więc sesje nie czekają bezczynnie w transakcji na kolejkę serwera.
+        """
+        async with self.lock:
+            if not self.exported:
+                self.exported = True
+                await global_limit.acquire()
+                self.global_limit = global_limit
+                await self.export_snapshots()
+        snapshot = self.snapshots.get(db["name"])
+        if snapshot is None:
+            logging.warning(f"Grupa serwera {self.label}: brak snapshotu dla bazy {db['database']} - "
+                            f"dump bez wspólnego snapshotu")
+            return db
+        return {**db, "snapshot": snapshot}
+
+    async def export_snapshots(self) -> None:
+        self.started, self.started_at = time.monotonic(), datetime.now()
+        # Najpierw połączenia (poza transakcją), potem eksport we wszystkich sesjach naraz
+        sessions = await asyncio.gather(*(self.open_session(db) for db in self.databases))
+        connected = [(db, proc) for db, proc in zip(self.databases, sessions) if proc is not None]
+        exporting = time.monotonic()
+        answers = await asyncio.gather(*(self.ask(proc, (
+            "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY;\n"
+            f"SELECT pg_export_snapshot() || '|' || {PG_CURRENT_LSN};\n"
+        )) for _, proc in connected))
+        self.snapshot_seconds = time.monotonic() - exporting
+
+        lsns = []
+        for (db, proc), answer in zip(connected, answers):
+            if answer is None or "|" not in answer:
+                await self.close_session(proc, db)
+                continue
+            self.snapshots[db["name"]], lsn = answer.split("|", 1)
+            self.sessions[db["name"]] = proc
+            lsns.append(lsn)
+        if lsns:
+            self.lsn_start, self.lsn_end = min(lsns, key=pg_lsn_value), max(lsns, key=pg_lsn_value)
+            logging.info(f"Grupa serwera {self.label}: {len(lsns)}/{len(self.databases)} snapshotów "
+                         f"w {self.snapshot_seconds:.3f}s (WAL {self.lsn_start}..{self.lsn_end})")
+
+    async def open_session(self, db: Dict[str, Any]) -> Optional[asyncio.subprocess.Process]:
+        # Każda baza łączy się własnym użytkownikiem, więc i własnym hasłem
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db.get('password', '')
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *pg_session_cmd(db), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, env=env, start_new_session=True
+            )
+        except FileNotFoundError:
+            logging.error("Nie znaleziono programu psql")
+            return None
+        if await self.ask(proc, "SELECT 1;\n") != "1":
+            await self.close_session(proc, db)
+            return None
+        return proc
+
+    async def ask(self, proc: asyncio.subprocess.Process, statements: str) -> Optional[str]:
+        """Wysyła polecenia do sesji i czyta jeden wiersz odpowiedzi (None gdy sesja się zakończyła)."""
+        try:
+            proc.stdin.write(statements.encode())
+            await proc.stdin.drain()
+            line = await asyncio.wait_for(proc.stdout.readline(), GROUP_SESSION_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        return line.decode(errors="replace").strip() or None
+
+    async def close_session(self, proc: asyncio.subprocess.Process, db: Dict[str, Any]) -> None:
+        """Kończy sesję (transakcja jest wycofywana); błąd sesji trafia do logu."""
+        if proc.stdin and not proc.stdin.is_closing():
+            proc.stdin.close()
+        try:
+            await asyncio.wait_for(proc.wait(), GROUP_SESSION_TIMEOUT)
+        except asyncio.TimeoutError:
+            await terminate_processes([proc])
+        if proc.returncode:
+            stderr = (await proc.stderr.read()).decode(errors="replace").strip()
+            logging.error(f"Grupa serwera {self.label}: sesja bazy {db['database']} zakończona błędem: {stderr}")
+
+    async def snapshot_lost(self, db: Dict[str, Any]) -> bool:
+        """Czy snapshot użyty przez dump bazy już nie istnieje (np. idle_in_transaction_session_timeout)."""
+        if not db.get("snapshot"):
+            return False
+        proc = self.sessions.get(db["name"])
+        return proc is None or await self.ask(proc, "SELECT 1;\n") != "1"
+
+    async def release(self, db: Dict[str, Any]) -> None:
+        """Zamyka sesję trzymającą snapshot bazy po zakończeniu (lub pominięciu) jej dumpa."""
+        self.ended = time.monotonic()
+        self.pending.discard(db["name"])
+        proc = self.sessions.pop(db["name"], None)
+        if proc is not None:
+            await self.close_session(proc, db)
+        if not self.pending and self.global_limit is not None:
+            self.global_limit.release()
+            self.global_limit = None
+
+    async def finish(self, results: List[Dict[str, Any]]) -> None:
+        """Zamyka pozostałe sesje i zapisuje przebieg grupy (okno snapshotów, pozycje WAL, czas) w katalogu."""
+        for db in self.databases:
+            await self.release(db)
+        if not self.snapshots:
+            return
+        names = {db["name"] for db in self.databases}
+        success = all(result["success"] for result in results if result["name"] in names)
+        duration = self.ended - self.started
+        logging.info(f"Grupa serwera {self.label}: okno snapshotów {self.snapshot_seconds:.3f}s "
+                     f"(WAL {self.lsn_start}..{self.lsn_end}), czas {duration:.1f}s")
+        with closing(open_catalog()) as conn:
+            conn.execute(
+                "INSERT INTO group_runs (server, started, databases, snapshot_seconds, lsn_start, lsn_end, "
+                "duration, success) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.label, self.started_at.isoformat(timespec="seconds"), ",".join(sorted(self.snapshots)),
+                 self.snapshot_seconds, self.lsn_start, self.lsn_end, duration, int(success))
+            )
+            conn.commit()
+
+
+def server_groups(config: Dict[str, Any]) -> Dict[str, ServerGroup]:
+    """Grupy baz PostgreSQL tego samego serwera (nazwa bazy -> grupa), gdy włączono group_by_server."""
+    if not config.get("concurrency", {}).get("group_by_server"):
+        return {}
+    by_server: Dict[Tuple[str, str], List[Dict[str, Any]]] = collections.defaultdict(list)
+    for db in config.get("databases", []):
+        # Niepoprawne wpisy kończą się błędem walidacji w run_one, nie otwieramy dla nich sesji
+        if all(field in db for field in REQUIRED_DB_FIELDS) and db["type"].lower() == "postgresql" \
+                and not db.get("wal_archive"):
+            by_server[server_key(db)].append(db)
+    groups = {}
+    for key, databases in by_server.items():
+        if len(databases) > 1:
+            group = ServerGroup(key, databases)
+            groups.update({db["name"]: group for db in databases})
+    return groups
+
+
+@asynccontextmanager
+async def server_slot(db: Dict[str, Any], server_limit: asyncio.Semaphore, global_limit: asyncio.Semaphore):
+    """Slot dumpa bazy spoza grup - najpierw limit serwera, potem globalny, żeby nie blokować
+    globalnego slotu czekając na serwer."""
+    async with server_limit, global_limit:
+        yield db
+
+
+async def run_backups(config: Dict[str, Any],
+                      progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Wykonuje backup wszystkich baz równolegle z globalnym limitem i limitem na serwer.
+
+    Najdłuższe (według historii) backupy startują pierwsze, timeouty wynikają z historii.
+    Bazy grupy serwera (group_by_server) startują razem w jednym slocie globalnym, ze snapshotów
+    wyeksportowanych w jednej chwili.
+    Opcjonalny progress(nazwa, stan) dostaje start i wynik backupu każdej bazy.
+    Zwraca listę wyników (nazwa, sukces, czas trwania, anomalie) w kolejności konfiguracji.
+    """
+    concurrency = config.get("concurrency", {})
+    state = load_state()
+    global_limit = asyncio.Semaphore(concurrency.get("max_parallel", DEFAULT_MAX_PARALLEL))
+    per_server = concurrency.get("max_per_server", DEFAULT_MAX_PER_SERVER)
+    server_limits: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+    groups = server_groups(config)
+    databases = config.get("databases", [])
+    with closing(open_catalog()) as conn:
+        histories = [load_run_history(conn, db) if validate_db_config(db) else [] for db in databases]
+
+    async def run_one(db: Dict[str, Any], history: List[sqlite3.Row]) -> Dict[str, Any]:
+        result = {"name": db.get("name", "N/A"), "success": False, "duration": 0.0, "anomalies": []}
+        group = groups.get(result["name"])
+        if not validate_db_config(db):
+            if group is not None:
+                await group.release(db)
+            return result
+        timeout = adaptive_timeout(db, history)
+        dump_timeout.set(timeout)
+        current_database.set(result["name"])
+
+        backup_func = BACKUP_FUNCTIONS[db["type"].lower()]
+        if group is not None:
+            slot = group.slot(db, global_limit)
+        else:
+            slot = server_slot(db, server_limits.setdefault(server_key(db), asyncio.Semaphore(per_server)), global_limit)
+        async with slot as db:
+            started = time.monotonic()
+            started_at = datetime.now()
+            marker = None
+            if db.get("skip_unchanged"):
+                # Znacznik pobierany przed dumpem - zmiany w trakcie dumpa wymuszą kolejny backup
+                skip, marker = await check_unchanged(db, state)
+                if skip:
+                    result.update(success=True, skipped=True, duration=time.monotonic() - started)
+                    logging.info(f"Baza {result['name']} nie zmieniła się od ostatniego backupu - pomijam")
+                    record_run(db, started_at, result)
+                    return result
+            expected = expected_duration(history)
+            expected_info = f"~{expected:.0f}s" if expected is not None else "brak historii"
+            if progress:
+                progress(result["name"], {"state": "running", "started": started_at.isoformat(timespec="seconds"),
+                                          "expected_seconds": expected, "timeout": timeout})
+            logging.info(f"Rozpoczynam backup bazy: {result['name']} (oczekiwany czas: {expected_info}, timeout: {timeout:.0f}s)")
+            try:
+                result["success"] = await backup_func(db)
+                if not result["success"] and group is not None and await group.snapshot_lost(db):
+                    logging.warning(f"Grupa serwera {group.label}: snapshot bazy {result['name']} utracony - "
+                                    f"ponawiam dump bez wspólnego snapshotu")
+                    db = {key: value for key, value in db.items() if key != "snapshot"}
+                    result["success"] = await backup_func(db)
+            except Exception as e:
+                logging.error(f"Wyjątek podczas backupu bazy {result['name']}: {e}")
+            result["duration"] = time.monotonic() - started
+            if result["success"] and marker is not None:
+                state[result["name"]] = {"marker": marker, "timestamp": datetime.now().isoformat(timespec="seconds")}
+
+        size = record_run(db, started_at, result)
+        if result["success"]:
+            result["anomalies"] = detect_anomalies(history, result["duration"], size)
+            for anomaly in result["anomalies"]:
+                logging.warning(f"Anomalia backupu bazy {result['name']}: {anomaly}")
+
+        status = "sukces" if result["success"] else "błąd"
+        logging.info(f"Backup bazy {result['name']} zakończony ({status}) w {result['duration']:.1f}s")
+        if progress:
+            outcome = "skipped" if result.get("skipped") else "success" if result["success"] else "failed"
+            progress(result["name"], {"state": outcome, "duration": round(result["duration"], 1),
+                                      "anomalies": result["anomalies"]})
+        return result
+
+    # Najdłuższe backupy najpierw (LPT), bazy bez historii traktowane jak najdłuższe
+    order = sorted(range(len(databases)), reverse=True,
+                   key=lambda i: expected_duration(histories[i]) or float("inf"))
+    tasks = {i: asyncio.ensure_future(run_one(databases[i], histories[i])) for i in order}
+    results = [await tasks[i] for i in range(len(databases))]
+    for group in dict.fromkeys(groups.values()):
+        await group.finish(results)
+    save_state(state)
+    return results
+
+
+def backup_databases(config: Dict[str, Any],
+                     progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Backup baz z konfiguracji, restart wybranych kontenerów i podsumowanie w logu."""
+    total_count = len(config.get("databases", []))
+    containers_to_restart: Dict[str, Dict[str, Any]] = {}  # Kontener -> baza do sprawdzenia gotowości
+    
+    results = asyncio.run(run_backups(config, progress))
+    success_count = sum(1 for result in results if result["success"])
+
+    for db, result in zip(config.get("databases", []), results):
+        # Restart po backupie tylko dla baz, które jawnie tego wymagają
+        if result["success"] and not result.get("skipped") and db.get("docker_container") and db.get("restart_after_backup"):
+            containers_to_restart.setdefault(db["docker_container"], db)
+    
+    # Restartuj wybrane kontenery po zakończeniu backupów, czekając na gotowość serwera
+    for container_name, db in containers_to_restart.items():
+        restart_container(container_name, db)
+            
+    logging.info(f"Backupy zakończone. Pomyślnie: {success_count}/{total_count}")
+    skipped = [result["name"] for result in results if result.get("skipped")]
+    if skipped:
+        logging.info(f"Pominięte (bez zmian): {', '.join(skipped)}")
+    failed = [result["name"] for result in results if not result["success"]]
+    if failed:
+        logging.error(f"Nieudane backupy: {', '.join(failed)}")
+    anomalies = [f"{result['name']} ({'; '.join(result['anomalies'])})" for result in results if result.get("anomalies")]
+    if anomalies:
+        logging.warning(f"Anomalie: {', '.join(anomalies)}")
+    if containers_to_restart:
+        logging.info(f"Zrestartowano kontenery: {', '.join(containers_to_restart)}")
+    return results
+
+
 def main() -> None:
     """Główna funkcja programu."""
     if len(sys.argv) < 2:
@@ -627,57 +3813,32 @@ def main() -> None:
     command = sys.argv[1].lower()
     
     if command == "list":
-        list_databases()
+        list_databases(sys.argv[2] if len(sys.argv) > 2 else None)
         return
 
     config = load_config()
 
     if command == "backup":
-        success_count = 0
-        total_count = len(config.get("databases", []))
-        containers_to_restart = set()  # Zbiór unikalnych kontenerów do restartu
-        
-        for db in config.get("databases", []):
-            logging.info(f"Rozpoczynam backup bazy: {db.get('name', 'N/A')}")
-            
-            if not validate_db_config(db):
-                continue
-                
-            db_type = db["type"].lower()
-            success = False
-            
-            if db_type == "mariadb":
-                success = backup_mariadb(db)
-            elif db_type == "postgresql":
-                success = backup_postgresql(db)
-            elif db_type == "mongodb":
-                success = backup_mongodb(db)
-            else:
-                logging.error(f"Nieobsługiwany typ bazy: {db_type}")
-                continue
-            
-            if success:
-                success_count += 1
-                # Dodaj kontener do listy do restartu (jeśli istnieje)
-                if db.get("docker_container"):
-                    containers_to_restart.add(db["docker_container"])
-        
-        # Restartuj wszystkie kontenery po zakończeniu backupów
-        for container_name in containers_to_restart:
-            restart_container(container_name)
-                
-        logging.info(f"Backupy zakończone. Pomyślnie: {success_count}/{total_count}")
-        if containers_to_restart:
-            logging.info(f"Zrestartowano kontenery: {', '.join(containers_to_restart)}")
+        lock = acquire_backup_lock()
+        if lock is None:
+            logging.error(f"Inny backup jest w toku (blokada {LOCK_FILE}) - przerywam.")
+            sys.exit(1)
+        with lock:
+            backup_databases(select_databases(config, sys.argv[2:]))
         
     elif command == "restore":
-        if len(sys.argv) != 4:
-            print("Błąd: restore wymaga 2 argumentów: <name> <backup_file_or_dir>")
+        args = sys.argv[2:]
+        tables = pop_option(args, "--table")
+        into = pop_option(args, "--into")
+        if len(args) not in (2, 3) or (len(args) == 3) != (args[1] == "--at") or len(into) > 1 \
+                or "" in tables + into:
+            print("Błąd: restore wymaga argumentów: <name> <backup_file_or_dir> | --latest | --at <czas> "
+                  "[--table <tabela> ...] [--into <baza>]")
             print_usage()
             sys.exit(1)
             
-        db_name = sys.argv[2]
-        backup_source = sys.argv[3]
+        db_name = args[0]
+        backup_source = args[1]
         
         db = find_db(config, db_name)
         if not db:
@@ -686,23 +3847,42 @@ def main() -> None:
             for available_db in config.get("databases", []):
                 print(f"  - {available_db.get('name', 'N/A')}")
             sys.exit(1)
+
+        if backup_source in ("--latest", "--at"):
+            try:
+                at = datetime.fromisoformat(args[2]) if backup_source == "--at" else None
+            except ValueError:
+                logging.error(f"Nieprawidłowy czas '{args[2]}' - oczekiwany format ISO, np. 2024-05-01T03:00")
+                sys.exit(1)
+            backup_source = find_catalog_backup(db, at)
+            if backup_source is None:
+                logging.error(f"Brak backupu bazy '{db_name}' w katalogu" + (f" sprzed {at}" if at else ""))
+                sys.exit(1)
+            logging.info(f"Wybrano backup z katalogu: {backup_source}")
             
-        if not os.path.exists(backup_source):
+        if not is_remote(backup_source) and not os.path.exists(backup_source):
             logging.error(f"Plik lub katalog backupu '{backup_source}' nie istnieje.")
             sys.exit(1)
 
         if not validate_db_config(db):
             sys.exit(1)
 
+        if into:
+            # Przywracanie do innej, istniejącej bazy na tym samym serwerze
+            db = {**db, "database": into[0], "source_database": db['database']}
+        if tables or into:
+            # Pozostałe bazy serwera działają dalej - bez restartu kontenera
+            db = {**db, "restart_after_restore": False}
+
         db_type = db["type"].lower()
         success = False
         
         if db_type == "mariadb":
-            success = restore_mariadb(db, backup_source)
+            success = restore_mariadb(db, backup_source, tables)
         elif db_type == "postgresql":
-            success = restore_postgresql(db, backup_source)
+            success = restore_postgresql(db, backup_source, tables)
         elif db_type == "mongodb":
-            success = restore_mongodb(db, backup_source)
+            success = restore_mongodb(db, backup_source, tables)
         else:
             logging.error(f"Nieobsługiwany typ bazy: {db_type}")
             sys.exit(1)
@@ -713,6 +3893,50 @@ def main() -> None:
             logging.error("Przywracanie zakończone błędem.")
             sys.exit(1)
 
+    elif command == "verify-restore":
+        results = asyncio.run(run_verifications(config, sys.argv[2:]))
+        success_count = sum(1 for result in results if result["success"])
+        logging.info(f"Weryfikacje zakończone. Pomyślnie: {success_count}/{len(results)}")
+        for result in results:
+            if result["success"]:
+                logging.info(f"  {result['name']}: RTO {result['restore_seconds']}s, "
+                             f"{result['tables']} tabel, {result['rows']} wierszy")
+            else:
+                logging.error(f"  {result['name']}: BŁĄD")
+        if success_count != len(results):
+            sys.exit(1)
+
+    elif command == "upload":
+        lock = acquire_backup_lock()
+        if lock is None:
+            logging.error(f"Inny backup jest w toku (blokada {LOCK_FILE}) - przerywam.")
+            sys.exit(1)
+        with lock:
+            for db in select_databases(config, sys.argv[2:])["databases"]:
+                if remote_settings(db):
+                    asyncio.run(upload_pending(db))
+
+    elif command in ("wal-receive", "restore-pitr"):
+        expected = 3 if command == "wal-receive" else 5
+        if len(sys.argv) != expected:
+            print(f"Błąd: nieprawidłowa liczba argumentów dla {command}")
+            print_usage()
+            sys.exit(1)
+
+        db = find_db(config, sys.argv[2])
+        if not db or db.get("type", "").lower() != "postgresql" or not db.get("wal_archive"):
+            logging.error(f"Baza '{sys.argv[2]}' nie jest bazą PostgreSQL z włączonym 'wal_archive'.")
+            sys.exit(1)
+
+        if command == "wal-receive":
+            try:
+                asyncio.run(wal_receive(db))
+            except KeyboardInterrupt:
+                logging.info("Zatrzymano archiwizowanie WAL.")
+        elif not restore_pitr(db, sys.argv[3], sys.argv[4]):
+            logging.error("Przygotowanie odtwarzania zakończone błędem.")
+            sys.exit(1)
+
     else:
         print(f"Nieznana komenda: {command}")
         print_usage()
@@ -0,0 +1,184 @@
+import argparse
+import importlib.util
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+# Load update-exif-date-from-name.py (the dashes make it impossible to import by name)
+_spec = importlib.util.spec_from_file_location(
+    "update_exif_date_from_name",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "update-exif-date-from-name.py"))
+exif_dates = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(exif_dates)
+
+def legacy_extract_date_from_filename(filename, filepath=None):
+    """Previous implementation (patterns rebuilt and searched on every call), kept as the reference."""
+    patterns = [
+        (r'(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})(?:-\d+)?',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'LrMobile.*_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})\d{3}',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'lv_\d+_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'PicsArt_(\d{13})', lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
+        (r'afterfocus_(\d{13})', lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
+        (r'ePicsArt_(\d{13})', lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
+        (r'received_(\d{13})', lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
+        (r'(\d{13})', lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
+        (r'(\d{4})-(\d{2})-(\d{2})', lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
+        (r'(\d{4})(\d{2})(\d{2})', lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
+        (r'(\d{2})-(\d{2})-(\d{4})', lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
+        (r'(\d{2})(\d{2})(\d{4})', lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
+        (r'.*?(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2}).*',
+         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))),
+        (r'.*?(\d{4})(\d{2})(\d{2}).*', lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
+        (r'(\d+)_zoo_(\d{2})_(\d{4})', lambda m: datetime(int(m[2]), int(m[1]), 1)),
+        (r'zoo_(\d{2})_(\d{2})_(\d{4})', lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
+        (r'.*(\d{2})\.(\d{2})\.(\d{4})/', lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
+    ]
+    for text in (filename, filepath) if filepath else (filename,):
+        for pattern, date_func in patterns:
+            match = re.search(pattern, text)
+            if match:
+                try:
+                    return date_func(match.groups())
+                except ValueError:
+                    continue
+    raise ValueError("Invalid date format")
+
+def ms(value):
+    return datetime.fromtimestamp(value / 1000)
+
+# (filename, filepath, expected date or None when the file should be skipped)
+CASES = [
+    ("20151101_145717.jpg", None, datetime(2015, 11, 1, 14, 57, 17)),
+    ("2017-01-14 18.31.48.jpg", None, datetime(2017, 1, 14, 18, 31, 48)),
+    ("2014-07-11 18.49.29-2.jpg", None, datetime(2014, 7, 11, 18, 49, 29)),
+    ("LrMobile0101-2016-024520622738581791_20160218185112909.jpg", None, datetime(2016, 2, 18, 18, 51, 12)),
+    ("lv_7397050064964717829_20240921213845.jpg", None, datetime(2024, 9, 21, 21, 38, 45)),
+    ("PicsArt_1433450401860.jpg", None, ms(1433450401860)),
+    ("afterfocus_1344548876254.jpg", None, ms(1344548876254)),
+    ("ePicsArt_1400094221136.jpg", None, ms(1400094221136)),
+    ("received_1050084378400782.jpeg", None, ms(1050084378400)),
+    ("1433450401860.png", None, ms(1433450401860)),
+    ("scan 2019-05-04.jpg", None, datetime(2019, 5, 4)),
+    ("scan20190504.jpg", None, datetime(2019, 5, 4)),
+    ("scan 04-05-2019.jpg", None, datetime(2019, 5, 4)),
+    ("scan 04052019x.jpg", None, datetime(2019, 5, 4)),
+    ("IMG-20230502-WA0022.jpg", None, datetime(2023, 5, 2)),
+    ("Screenshot_20200101-101010.png", None, datetime(2020, 1, 1)),
+    ("19_zoo_07_2021.jpg", None, datetime(2021, 7, 1)),
+    ("zoo_20_04_2019-72.webp", None, datetime(2019, 4, 20)),
+    # Invalid date in the first matching pattern falls through to the next one
+    ("2015-13-01 scan 20150101.jpg", None, datetime(2015, 1, 1)),
+    ("20151399_145717.jpg", None, None),
+    ("IMG_0001.jpg", None, None),
+    ("DSC_1234.JPG", None, None),
+    ("wakacje.jpg", None, None),
+    # Folder dates
+    ("IMG_0001.jpg", "/photos/moje urodziny 07.03.2009/IMG_0001.jpg", datetime(2009, 3, 7)),
+    ("DSC_1234.JPG", "/photos/Chrzest Marcina 16.04.2016/DSC_1234.JPG", datetime(2016, 4, 16)),
+    ("IMG_0001.jpg", "/photos/2012/wakacje 2012-07-15/IMG_0001.jpg", datetime(2012, 7, 15)),
+    ("IMG_0001.jpg", "/photos/a 01.01.2001/b 02.02.2002/IMG_0001.jpg", datetime(2002, 2, 2)),
+    ("IMG_0001.jpg", "/photos/wakacje/IMG_0001.jpg", None),
+    # Filename date wins over the folder date
+    ("20151101_145717.jpg", "/photos/moje urodziny 07.03.2009/20151101_145717.jpg", datetime(2015, 11, 1, 14, 57, 17)),
+    # LrMobile prefix only in the folder: the filename digits are read as a 13-digit timestamp first
+    ("x_20160218185112909.jpg", "/photos/LrMobile/x_20160218185112909.jpg", ms(2016021818511)),
+    ("IMG_0001.jpg", "/photos/LrMobile export/IMG_0001.jpg", None),
+]
+
+PREFIXES = ["IMG_", "DSC_", "IMG-", "PicsArt_", "lv_", "LrMobile", "received_", "zoo_", "wakacje ", "", "Screenshot_"]
+FOLDERS = ["/photos/wakacje", "/photos/moje urodziny 07.03.2009", "/photos/Chrzest Marcina 16.04.2016",
+           "/photos/2019/2019-08-01 Mazury", "/photos/telefon/Camera", "/photos/LrMobile", "/photos/skany"]
+
+def corpus(count, seed=1):
+    """Synthetic library: mixed filename formats spread over a few hundred folders."""
+    rng = random.Random(seed)
+    files = []
+    for i in range(count):
+        kind = rng.randrange(9)
+        day = datetime(2008, 1, 1).timestamp() + rng.randrange(15 * 365 * 86400)
+        date = datetime.fromtimestamp(day)
+        if kind == 0:
+            name = date.strftime("%Y%m%d_%H%M%S") + ".jpg"
+        elif kind == 1:
+            name = date.strftime("%Y-%m-%d %H.%M.%S") + ".jpg"
+        elif kind == 2:
+            name = f"PicsArt_{int(day * 1000)}.jpg"
+        elif kind == 3:
+            name = f"lv_{rng.randrange(10 ** 18)}_{date.strftime('%Y%m%d%H%M%S')}.jpg"
+        elif kind == 4:
+            name = date.strftime("IMG-%Y%m%d-WA") + f"{rng.randrange(10000):04d}.jpg"
+        elif kind == 5:
+            name = f"{rng.choice(PREFIXES)}{rng.randrange(10000):04d}.jpg"
+        elif kind == 6:
+            name = f"LrMobile{rng.randrange(10 ** 4)}-{date.year}-{rng.randrange(10 ** 18)}_{date.strftime('%Y%m%d%H%M%S')}123.jpg"
+        elif kind == 7:
+            name = f"{rng.randrange(40)}_zoo_{date.strftime('%m_%Y')}.jpg"
+        else:
+            name = f"{rng.choice(PREFIXES)}{rng.choice(['x', 'y', 'foto'])}.jpg"
+        folder = f"{rng.choice(FOLDERS)}/{rng.randrange(50)}"
+        files.append((name, os.path.join(folder, name)))
+    return files
+
+def run(extract, files):
+    results = []
+    for filename, filepath in files:
+        try:
+            results.append(extract(filename, filepath))
+        except ValueError:
+            results.append(None)
+    return results
+
+def check_cases():
+    failures = 0
+    for filename, filepath, expected in CASES:
+        try:
+            result = exif_dates.extract_date_from_filename(filename, filepath)
+        except ValueError:
+            result = None
+        try:
+            legacy = legacy_extract_date_from_filename(filename, filepath)
+        except ValueError:
+            legacy = None
+        status = "ok" if result == expected == legacy else "FAIL"
+        failures += status != "ok"
+        print(f"{status:4} {filepath or filename}: {result} (expected {expected}, legacy {legacy})")
+    return failures
+
+def benchmark(count, repeat):
+    files = corpus(count)
+    legacy_results = run(legacy_extract_date_from_filename, files)
+    results = run(exif_dates.extract_date_from_filename, files)
+    mismatches = sum(a != b for a, b in zip(legacy_results, results))
+    print(f"\n{count} files, {sum(r is None for r in results)} without a date, {mismatches} mismatches against legacy")
+
+    for label, extract in (("legacy", legacy_extract_date_from_filename),
+                           ("compiled", exif_dates.extract_date_from_filename)):
+        best = None
+        for _ in range(repeat):
+            exif_dates._folder_date_steps.cache_clear()
+            started = time.perf_counter()
+            run(extract, files)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:8} {best:.3f}s  ({best / count * 1e6:.2f} us/file)")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correctness table and micro-benchmark for extract_date_from_filename.")
+    parser.add_argument('--files', type=int, default=100000, help="Number of synthetic files in the benchmark")
+    parser.add_argument('--repeat', type=int, default=3, help="Benchmark runs, the best one is reported")
+    args = parser.parse_args()
+
+    failures = check_cases() + benchmark(args.files, args.repeat)
+    if failures:
+        print(f"\n{failures} failures")
+        raise SystemExit(1)
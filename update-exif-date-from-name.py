@@ -1,119 +1,171 @@
 import argparse
+import io
 import os
 from datetime import datetime
+from contextlib import redirect_stdout
+from functools import lru_cache, partial
+from itertools import islice
+from multiprocessing import Pool
 import re
 from PIL import Image
 from PIL.ExifTags import TAGS
 import piexif
-from typing import Optional
+from typing import Callable, NamedTuple, Optional, Tuple
+
+class DatePattern(NamedTuple):
+    """Compiled filename date pattern with a cheap prefilter."""
+    regex: re.Pattern
+    convert: Callable[[Tuple[str, ...]], datetime]
+    min_digits: int  # Shortest run of consecutive digits the pattern needs
+    literals: Tuple[str, ...] = ()  # Substrings that must be present for the pattern to match
+    spans_dirs: bool = False  # Match may start in the folder part and end in the filename
+
+def _datetime(m):
+    return datetime(int(m[0]), int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]))
+
+def _timestamp_ms(m):
+    return datetime.fromtimestamp(int(m[0]) / 1000)
+
+# Patterns are tried in order, the first one that yields a valid date wins
+DATE_PATTERNS = [
+    # Format: 20151101_145717
+    DatePattern(re.compile(r'(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})'), _datetime, 8, ('_',)),
+
+    # Format: 2017-01-14 18.31.48
+    DatePattern(re.compile(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})'), _datetime, 4, ('-', '.')),
+
+    # Format: 2014-07-11 18.49.29-2 (with suffix)
+    DatePattern(re.compile(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})(?:-\d+)?'), _datetime, 4, ('-', '.')),
+
+    # Format: LrMobile0101-2016-024520622738581791_20160218185112909 (extract date from end)
+    DatePattern(re.compile(r'LrMobile.*_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})\d{3}'), _datetime, 17, ('LrMobile',),
+                spans_dirs=True),
+
+    # Format: lv_7397050064964717829_20240921213845 (extract date from end)
+    DatePattern(re.compile(r'lv_\d+_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})'), _datetime, 14, ('lv_',)),
+
+    # Format: PicsArt_1433450401860 (PicsArt with timestamp)
+    DatePattern(re.compile(r'PicsArt_(\d{13})'), _timestamp_ms, 13, ('PicsArt_',)),
+
+    # Format: afterfocus_1344548876254 (afterfocus with timestamp)
+    DatePattern(re.compile(r'afterfocus_(\d{13})'), _timestamp_ms, 13, ('afterfocus_',)),
+
+    # Format: ePicsArt_1400094221136 (ePicsArt with timestamp)
+    DatePattern(re.compile(r'ePicsArt_(\d{13})'), _timestamp_ms, 13, ('ePicsArt_',)),
+
+    # Format: received_1050084378400782 (received with timestamp - handle large numbers)
+    DatePattern(re.compile(r'received_(\d{13})'), _timestamp_ms, 13, ('received_',)),
+
+    # Format: Unix timestamp 13 digits (milliseconds since epoch)
+    DatePattern(re.compile(r'(\d{13})'), _timestamp_ms, 13),
+
+    # Format: YYYY-MM-DD
+    DatePattern(re.compile(r'(\d{4})-(\d{2})-(\d{2})'),
+                lambda m: datetime(int(m[0]), int(m[1]), int(m[2])), 4, ('-',)),
+
+    # Format: YYYYMMDD
+    DatePattern(re.compile(r'(\d{4})(\d{2})(\d{2})'),
+                lambda m: datetime(int(m[0]), int(m[1]), int(m[2])), 8),
+
+    # Format: DD-MM-YYYY
+    DatePattern(re.compile(r'(\d{2})-(\d{2})-(\d{4})'),
+                lambda m: datetime(int(m[2]), int(m[1]), int(m[0])), 4, ('-',)),
+
+    # Format: DDMMYYYY
+    DatePattern(re.compile(r'(\d{2})(\d{2})(\d{4})'),
+                lambda m: datetime(int(m[2]), int(m[1]), int(m[0])), 8),
+
+    # Format: {prefix} 20151101_145717
+    DatePattern(re.compile(r'.*?(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2}).*'), _datetime, 8, ('_',)),
+
+    # Format: IMG-20230502-WA0022
+    DatePattern(re.compile(r'.*?(\d{4})(\d{2})(\d{2}).*'),
+                lambda m: datetime(int(m[0]), int(m[1]), int(m[2])), 8),
+
+    # Format: N_zoo_MM_YYYY (e.g., 19_zoo_07_2021.jpg)
+    DatePattern(re.compile(r'(\d+)_zoo_(\d{2})_(\d{4})'),
+                lambda m: datetime(int(m[2]), int(m[1]), 1), 4, ('_zoo_',)),
+
+    # Format: zoo_DD_MM_YYYY (e.g., zoo_20_04_2019-72.webp)
+    DatePattern(re.compile(r'zoo_(\d{2})_(\d{2})_(\d{4})'),
+                lambda m: datetime(int(m[2]), int(m[1]), int(m[0])), 4, ('zoo_',)),
+
+    # Format: Files in folders with dates like "moje urodziny 07.03.2009/" or "Chrzest Marcina 16.04.2016/"
+    DatePattern(re.compile(r'.*(\d{2})\.(\d{2})\.(\d{4})/'),
+                lambda m: datetime(int(m[2]), int(m[1]), int(m[0])), 4, ('/', '.')),
+]
+
+DIGIT_RUN = re.compile(r'\d+')
+MIN_DIGITS = min(pattern.min_digits for pattern in DATE_PATTERNS)
+
+def _longest_digit_run(text: str) -> int:
+    return max(map(len, DIGIT_RUN.findall(text)), default=0)
+
+def _match_date(pattern: DatePattern, text: str) -> Optional[datetime]:
+    """Date from the first match of the pattern, None if it does not match or the date is invalid."""
+    match = pattern.regex.search(text)
+    if match:
+        try:
+            return pattern.convert(match.groups())
+        except ValueError:
+            pass
+    return None
+
+def _first_date(text: str) -> Optional[datetime]:
+    """Try all patterns in order, skipping the ones the prefilter rules out."""
+    longest = _longest_digit_run(text)
+    if longest < MIN_DIGITS:
+        return None
+    for pattern in DATE_PATTERNS:
+        if longest < pattern.min_digits or not all(literal in text for literal in pattern.literals):
+            continue
+        date = _match_date(pattern, text)
+        if date is not None:
+            return date
+    return None
+
+@lru_cache(maxsize=4096)
+def _folder_date_steps(folder: str) -> tuple:
+    """Fallback steps for files in a folder ("urodziny 07.03.2009/"), computed once per folder.
+
+    Apart from LrMobile, no pattern can match across a "/", so on the full path each of
+    them gives either its match in the folder part or the one already rejected in the
+    filename. The result is the folder date (a datetime) preceded by the patterns that
+    still have to be run on the full path.
+    """
+    longest = _longest_digit_run(folder)
+    steps = []
+    for pattern in DATE_PATTERNS:
+        if not all(literal in folder for literal in pattern.literals):
+            continue
+        if pattern.spans_dirs:
+            steps.append(pattern)
+        elif longest >= pattern.min_digits:
+            date = _match_date(pattern, folder)
+            if date is not None:
+                steps.append(date)
+                break
+    return tuple(steps)
 
 def extract_date_from_filename(filename, filepath=None):
-    # Define regex patterns to match dates in the filename
-    patterns = [
-        # Format: 20151101_145717
-        (r'(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: 2017-01-14 18.31.48
-        (r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: 2014-07-11 18.49.29-2 (with suffix)
-        (r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2})\.(\d{2})\.(\d{2})(?:-\d+)?',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: LrMobile0101-2016-024520622738581791_20160218185112909 (extract date from end)
-        (r'LrMobile.*_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})\d{3}',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: lv_7397050064964717829_20240921213845 (extract date from end)
-        (r'lv_\d+_(\d{4})(\d{2})(\d{2})(\d{2})(\d{2})(\d{2})',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: PicsArt_1433450401860 (PicsArt with timestamp)
-        (r'PicsArt_(\d{13})',
-         lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
-
-        # Format: afterfocus_1344548876254 (afterfocus with timestamp)
-        (r'afterfocus_(\d{13})',
-         lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
-
-        # Format: ePicsArt_1400094221136 (ePicsArt with timestamp)
-        (r'ePicsArt_(\d{13})',
-         lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
-
-        # Format: received_1050084378400782 (received with timestamp - handle large numbers)
-        (r'received_(\d{13})',
-         lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
-
-        # Format: Unix timestamp 13 digits (milliseconds since epoch)
-        (r'(\d{13})',
-         lambda m: datetime.fromtimestamp(int(m[0]) / 1000)),
-
-        # Format: YYYY-MM-DD
-        (r'(\d{4})-(\d{2})-(\d{2})',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
-
-        # Format: YYYYMMDD
-        (r'(\d{4})(\d{2})(\d{2})',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
-
-        # Format: DD-MM-YYYY
-        (r'(\d{2})-(\d{2})-(\d{4})',
-         lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
-
-        # Format: DDMMYYYY
-        (r'(\d{2})(\d{2})(\d{4})',
-         lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
-
-        # Format: {prefix} 20151101_145717
-        (r'.*?(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2}).*',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]),
-                            int(m[3]), int(m[4]), int(m[5]))),
-
-        # Format: IMG-20230502-WA0022
-        (r'.*?(\d{4})(\d{2})(\d{2}).*',
-         lambda m: datetime(int(m[0]), int(m[1]), int(m[2]))),
-
-        # Format: N_zoo_MM_YYYY (e.g., 19_zoo_07_2021.jpg)
-        (r'(\d+)_zoo_(\d{2})_(\d{4})',
-         lambda m: datetime(int(m[2]), int(m[1]), 1)),
-
-        # Format: zoo_DD_MM_YYYY (e.g., zoo_20_04_2019-72.webp)
-        (r'zoo_(\d{2})_(\d{2})_(\d{4})',
-         lambda m: datetime(int(m[2]), int(m[1]), int(m[0]))),
-
-        # Format: Files in folders with dates like "moje urodziny 07.03.2009/" or "Chrzest Marcina 16.04.2016/"
-        (r'.*(\d{2})\.(\d{2})\.(\d{4})/',
-         lambda m: datetime(int(m[2]), int(m[1]), int(m[0])))
-    ]
-    
-    # Check patterns against filename first
-    for pattern, date_func in patterns:
-        match = re.search(pattern, filename)
-        if match:
-            try:
-                date = date_func(match.groups())
-                return date
-            except ValueError:
-                continue
-    
+    """Date from the filename, falling back to the full path (e.g. a dated folder name)."""
+    date = _first_date(filename)
+    if date is not None:
+        return date
+
     # If no match in filename and filepath is provided, check full path
     if filepath:
-        for pattern, date_func in patterns:
-            match = re.search(pattern, filepath)
-            if match:
-                try:
-                    date = date_func(match.groups())
+        folder = filepath[:-len(filename)] if filename and filepath.endswith(filename) else None
+        if folder is not None and (not folder or folder.endswith('/')):
+            for step in _folder_date_steps(folder):
+                date = step if isinstance(step, datetime) else _match_date(step, filepath)
+                if date is not None:
                     return date
-                except ValueError:
-                    continue
-    
+        else:
+            date = _first_date(filepath)
+            if date is not None:
+                return date
+
     raise ValueError("Invalid date format")
 
 def get_exif_date(image_path: str) -> Optional[datetime]:
@@ -228,66 +280,121 @@ def set_exif_date(image_path: str, date: datetime) -> bool:
             print(f"Error setting EXIF date for {image_path}: {str(e2)}")
             return False
 
+BATCH_SIZE = 32  # Files per task sent to a worker process in --jobs mode
+
+def iter_images(folder_path):
+    """Walk the folder tree and yield paths of supported images."""
+    for root, dirs, files in os.walk(folder_path):
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            if is_supported_image_format(file_path):
+                yield file_path
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def process_file(file_path, skip_permission_errors=False, dry_run=False):
+    """Update the EXIF date of one image from its name.
+
+    Returns (outcome, permission_error) where outcome is one of "invalid_date",
+    "permission_skipped", "updated", "failed" or "unchanged". An unexpected error
+    is printed and counted as "failed", with or without --jobs.
+    """
+    try:
+        return _process_file(file_path, skip_permission_errors, dry_run)
+    except Exception as e:
+        print(f"Error processing {file_path}: {str(e)}")
+        return "failed", False
+
+def _process_file(file_path, skip_permission_errors, dry_run):
+    filename = os.path.basename(file_path)
+    permission_error = False
+    try:
+        # Extract date from filename and full path
+        filename_date = extract_date_from_filename(filename, file_path)
+    except ValueError:
+        print(f"Skipping file {filename}: invalid date format")
+        return "invalid_date", permission_error
+
+    # Check write permissions before attempting to read EXIF
+    if not os.access(file_path, os.W_OK):
+        permission_error = True
+        if skip_permission_errors:
+            print(f"Skipping (no write permission): {filename}")
+            return "permission_skipped", permission_error
+        print(f"Warning: No write permission for {filename}")
+
+    # Get EXIF date
+    exif_date = get_exif_date(file_path)
+    # Compare dates and update if necessary
+    if not exif_date or exif_date != filename_date:
+        if dry_run:
+            print(f"Would update EXIF date for {filename}: {filename_date}")
+            return "updated", permission_error
+        print(f"Updating EXIF date for {filename}")
+        if set_exif_date(file_path, filename_date):
+            print(f"Successfully updated EXIF date for {filename}")
+            return "updated", permission_error
+        print(f"Failed to update EXIF date for {filename}")
+        return "failed", permission_error
+
+    print(f"EXIF date already correct for {filename}")
+    return "unchanged", permission_error
+
+def process_batch(batch, skip_permission_errors=False, dry_run=False):
+    """Worker side of --jobs: process a batch, capturing the output of each file so it can be printed in order."""
+    results = []
+    for file_path in batch:
+        output = io.StringIO()
+        with redirect_stdout(output):
+            outcome, permission_error = process_file(file_path, skip_permission_errors, dry_run)
+        results.append((file_path, outcome, permission_error, output.getvalue()))
+    return results
+
+def append_to_skip_list(file_path):
+    """Add a file without a date to today's skip list; only the main process writes to it."""
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    with open(f"{current_date}.txt", "a") as f:
+        f.write(f"{file_path}\n")
+
 # Function to process images in a folder and its subfolders
-def process_images(folder_path, skip_permission_errors=False, dry_run=False):
+def process_images(folder_path, skip_permission_errors=False, dry_run=False, jobs=1):
     permission_errors = []
     processed_count = 0
     updated_count = 0
     skipped_count = 0
-    
-    for root, dirs, files in os.walk(folder_path):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            
-            # Skip unsupported file formats
-            if not is_supported_image_format(file_path):
-                continue
-            
+
+    images = iter_images(folder_path)
+    pool = None
+    if jobs > 1:
+        # Workers return results in submission order, so output and skip list follow the tree walk
+        pool = Pool(jobs)
+        worker = partial(process_batch, skip_permission_errors=skip_permission_errors, dry_run=dry_run)
+        results = (result for batch in pool.imap(worker, iter_batches(images, BATCH_SIZE)) for result in batch)
+    else:
+        results = ((file_path, *process_file(file_path, skip_permission_errors, dry_run), "") for file_path in images)
+
+    try:
+        for file_path, outcome, permission_error, output in results:
+            print(output, end="")
             processed_count += 1
-            
-            try:
-                # Extract date from filename and full path
-                filename_date = extract_date_from_filename(filename, file_path)
-            except ValueError:
-                print(f"Skipping file {filename}: invalid date format")
+            if permission_error:
+                permission_errors.append(file_path)
+            if outcome == "invalid_date":
                 skipped_count += 1
-                # Get the current date
-                current_date = datetime.now().strftime("%Y-%m-%d")
-                # Open the file in append mode and write the path
                 if not dry_run:
-                    with open(f"{current_date}.txt", "a") as f:
-                        f.write(f"{file_path}\n")
-                continue
-
-            # Check write permissions before attempting to read EXIF
-            if not os.access(file_path, os.W_OK):
-                if skip_permission_errors:
-                    print(f"Skipping (no write permission): {filename}")
-                    permission_errors.append(file_path)
-                    skipped_count += 1
-                    continue
-                else:
-                    print(f"Warning: No write permission for {filename}")
-                    permission_errors.append(file_path)
-
-            # Get EXIF date
-            exif_date = get_exif_date(file_path)
-            # Compare dates and update if necessary
-            if not exif_date or exif_date != filename_date:
-                if dry_run:
-                    print(f"Would update EXIF date for {filename}: {filename_date}")
-                    updated_count += 1
-                else:
-                    print(f"Updating EXIF date for {filename}")
-                    if set_exif_date(file_path, filename_date):
-                        print(f"Successfully updated EXIF date for {filename}")
-                        updated_count += 1
-                    else:
-                        print(f"Failed to update EXIF date for {filename}")
-                        skipped_count += 1
-            else:
-                print(f"EXIF date already correct for {filename}")
-    
+                    append_to_skip_list(file_path)
+            elif outcome == "updated":
+                updated_count += 1
+            elif outcome in ("permission_skipped", "failed"):
+                skipped_count += 1
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
     # Print summary
     print(f"\n--- Processing Summary ---")
     print(f"Files processed: {processed_count}")
@@ -311,6 +418,12 @@ def process_images(folder_path, skip_permission_errors=False, dry_run=False):
         
     return updated_count, skipped_count, len(permission_errors)
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
 # Example usage
 if __name__ == "__main__":
     # Set up argument parser
@@ -320,13 +433,15 @@ if __name__ == "__main__":
                         help="Skip files with permission errors instead of warning about them")
     parser.add_argument('--dry-run', action='store_true',
                         help="Show what would be done without actually modifying files")
+    parser.add_argument('--jobs', type=positive_int, default=1,
+                        help="Number of worker processes (default: 1, process files one by one)")
     
     args = parser.parse_args()
     
     if args.dry_run:
         print("DRY RUN MODE: No files will be modified")
     
-    updated, skipped, permission_errors = process_images(args.folder_path, args.skip_permission_errors, args.dry_run)
+    updated, skipped, permission_errors = process_images(args.folder_path, args.skip_permission_errors, args.dry_run, args.jobs)
     
     if permission_errors > 0:
         print(f"\nNote: {permission_errors} files had permission errors.")